@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark do ObstacleDetector
+Compara a análise de setores vetorizada (uint16, redução única) com a
+implementação anterior (float64 + máscara/min por setor) em 640x480 (D435)
+e 1024x768 (L515), e confere que os resultados são idênticos.
+
+Uso: python benchmark_obstacle_detector.py [--frames 200] [--sectors 3]
+"""
+
+import argparse
+import time
+import numpy as np
+
+from robot_autonomous_control import ObstacleDetector
+from benchmark_perception import synthetic_depth
+
+RESOLUTIONS = [(640, 480), (1024, 768)]
+
+
+def legacy_analyze(depth_image, depth_scale, min_dist, max_dist, min_valid, block, default, roi=None):
+    """Implementação anterior (referência): float64 e três passes por setor"""
+    height, width = depth_image.shape
+    depth_meters = depth_image.astype(float) * depth_scale
+    if roi:
+        depth_meters = depth_meters[int(height * roi[0]):int(height * roi[1]), :]
+
+    third = width // 3
+    regions = [depth_meters[:, :third], depth_meters[:, third:2*third], depth_meters[:, 2*third:]]
+
+    result = {}
+    for name, region in zip(('left', 'center', 'right'), regions):
+        valid = region[(region > min_dist) & (region < max_dist)]
+        if len(valid) > min_valid:
+            min_dist_region = float(np.min(valid))
+            result[name] = (min_dist_region < block, min_dist_region)
+        else:
+            result[name] = (False, default)
+    return result
+
+
+def time_per_frame(fn, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    return (time.perf_counter() - start) / len(frames) * 1000.0
+
+
+def check_equivalence(detector, frames, scale):
+    """Confere que a versão vetorizada reproduz a versão anterior"""
+    for frame in frames:
+        new_lidar = detector.analyze_lidar(frame, scale)
+        new_height = detector.analyze_height(frame, scale)
+        old_lidar = legacy_analyze(frame, scale, 0.0, 10.0, 0, detector.safe_distance, 10.0)
+        old_height = legacy_analyze(frame, scale, 0.1, 3.0, 100, 0.8, 3.0, roi=(0.3, 0.7))
+        for new, old in ((new_lidar, old_lidar), (new_height, old_height)):
+            for name in ('left', 'center', 'right'):
+                blocked, distance = old[name]
+                if new[name] != blocked or not np.isclose(new['distances'][name], distance):
+                    return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do ObstacleDetector")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--sectors', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    scale = 0.00025  # escala do L515 (a D435 usa 0.001)
+    detector = ObstacleDetector(num_sectors=args.sectors)
+
+    print("=" * 70)
+    print("  BENCHMARK - ObstacleDetector (ms por frame)")
+    print("=" * 70)
+    print(f"{'resolução':>12} {'etapa':>8} {'anterior':>10} {'vetorizado':>11} {'ganho':>7}")
+
+    for width, height in RESOLUTIONS:
+        frames = [synthetic_depth(width, height, rng) for _ in range(8)]
+        frames = (frames * (args.frames // len(frames) + 1))[:args.frames]
+
+        ok = check_equivalence(detector, frames[:8], scale)
+
+        stages = [
+            ('lidar',
+             lambda f: legacy_analyze(f, scale, 0.0, 10.0, 0, detector.safe_distance, 10.0),
+             lambda f: detector.analyze_lidar(f, scale)),
+            ('height',
+             lambda f: legacy_analyze(f, scale, 0.1, 3.0, 100, 0.8, 3.0, roi=(0.3, 0.7)),
+             lambda f: detector.analyze_height(f, scale)),
+        ]
+        for stage, old_fn, new_fn in stages:
+            old_ms = time_per_frame(old_fn, frames)
+            new_ms = time_per_frame(new_fn, frames)
+            resolution = f"{width}x{height}"
+            print(f"{resolution:>12} {stage:>8} {old_ms:>10.3f} {new_ms:>11.3f} {old_ms / new_ms:>6.1f}x")
+
+        print(f"{'':>12} resultados idênticos à versão anterior: {'✓' if ok else '✗'}")
+
+
+if __name__ == "__main__":
+    main()
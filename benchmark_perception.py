@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+"""
+Benchmark do caminho crítico do sensor_loop
+Mede cada etapa da percepção/streaming com frames sintéticos ou de uma
+sessão gravada (robot_replay), em várias resoluções e números de clientes:
+    detect_objects(_full, _no_morphology), tracker_update, sectors, deproject_image,
+    deproject_pixels (× rs2_deproject_pixel_to_point), box_depths (depth
+    alinhado × mapeado do depth bruto por ColorToDepthMapper), yolo, annotate,
+    jpeg_encode, encode_sequential × encode_pool (duas câmeras por tick,
+    robot_video.EncoderPool), base64, json_per_client, json_once, video_per_client ×
+    video_variants (vídeo por assinatura, cada variante codificada uma vez)
+e o banco de filtros de Kalman (robot_kalman) contra um filterpy por objeto,
+com verificação de equivalência numérica, e a associação detecção ↔ track
+(guloso antigo × húngaro de robot_association) em sequências com IDs reais.
+Com --live-filters, mede também a cadeia de filtros do SDK (robot_filters)
+em frames ao vivo de cada RealSense conectada e o detect_objects sobre o
+depth bruto (com morfologia) × filtrado (sem morfologia).
+Reporta p50/p99 (ms) e throughput (FPS) por etapa e salva em JSON para
+comparar regressões entre commits.
+
+Uso:
+    python benchmark_perception.py --output resultados.json
+    python benchmark_perception.py --session sessoes/corredor --clients 1 3
+    python benchmark_perception.py --compare baseline.json
+    python benchmark_perception.py --live-filters --frames 200
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import subprocess
+import time
+import types
+import numpy as np
+import cv2
+
+from robot_autonomous_control import ObjectTracker, ObstacleDetector
+from robot_association import association_cost, assign
+from robot_capture import BufferPool
+from robot_kalman import KalmanBank
+from robot_geometry import ColorToDepthMapper, DepthProjector, sample_box_depths
+from robot_replay import ReplaySession
+from robot_video import EncoderPool, VideoSubscription, encode_variants, plan_video
+
+try:
+    import pyrealsense2 as rs
+    from robot_filters import DepthFilterChain
+    REALSENSE_AVAILABLE = True
+except ImportError:
+    REALSENSE_AVAILABLE = False
+
+try:
+    from filterpy.kalman import KalmanFilter
+    FILTERPY_AVAILABLE = True
+except ImportError:
+    FILTERPY_AVAILABLE = False
+
+try:
+    from robot_tracking_system import MultiCameraTracker, TrackedObject, MODEL_PATH
+    from ultralytics import YOLO
+    YOLO_AVAILABLE = True
+except Exception:
+    YOLO_AVAILABLE = False
+
+DEFAULT_RESOLUTIONS = ['640x480', '1024x768']
+DEFAULT_CLIENTS = [1, 3]
+DEFAULT_TRACKS = [8, 32, 128]
+DEFAULT_OBJECTS = [5, 20, 50]
+DEPROJECT_PIXELS = 32        # detecções deprojetadas por frame
+# Extrínsecas cor -> depth típicas da D435 (rotation column-major, m)
+SYNTHETIC_EXTRINSICS = {'rotation': [1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0],
+                        'translation': [-0.015, 0.0, 0.0]}
+ASSOCIATION_MAX_DIST = 120   # TRACKER_DIST_THRESHOLD_PIX
+ASSOCIATION_IOU = 0.4        # IOU_MATCH_THRESHOLD
+JPEG_QUALITY = 85
+
+
+def synthetic_depth(width, height, rng):
+    """Profundidade sintética: chão em rampa + caixas + buracos (zeros)"""
+    rows = np.linspace(4000, 600, height, dtype=np.float32)[:, None]
+    depth = np.repeat(rows, width, axis=1)
+    depth += rng.normal(0, 15, size=depth.shape).astype(np.float32)
+    for _ in range(4):
+        x, y = rng.integers(0, width - 80), rng.integers(0, height - 80)
+        depth[y:y+80, x:x+80] = rng.integers(300, 2500)
+    depth[rng.random(depth.shape) < 0.05] = 0
+    return np.clip(depth, 0, 65535).astype(np.uint16)
+
+
+def synthetic_color(width, height, rng):
+    """Imagem colorida sintética com gradiente, retângulos e ruído leve"""
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    color = np.stack([np.broadcast_to(x, (height, width)),
+                      np.broadcast_to(y, (height, width)),
+                      np.full((height, width), 128, np.float32)], axis=2)
+    color += rng.normal(0, 6, size=color.shape).astype(np.float32)
+    image = np.clip(color, 0, 255).astype(np.uint8)
+    for _ in range(6):
+        x1, y1 = int(rng.integers(0, width - 60)), int(rng.integers(0, height - 60))
+        cv2.rectangle(image, (x1, y1), (x1 + 60, y1 + 60), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    return image
+
+
+def synthetic_intrinsics(width, height):
+    """Intrínsecos pinhole com ~69° de campo horizontal (D435)"""
+    focal = width / (2 * np.tan(np.radians(69.0) / 2))
+    return {'width': width, 'height': height, 'fx': focal, 'fy': focal,
+            'ppx': width / 2.0, 'ppy': height / 2.0, 'model': 'distortion.none', 'coeffs': [0.0] * 5}
+
+
+def synthetic_frames(width, height, count, seed=0):
+    rng = np.random.default_rng(seed)
+    unique = [(synthetic_color(width, height, rng), synthetic_depth(width, height, rng), 0.001)
+              for _ in range(min(count, 8))]
+    return [unique[i % len(unique)] for i in range(count)]
+
+
+def session_frames(path, count):
+    """Framesets de uma sessão gravada, agrupados por resolução"""
+    groups = {}
+    for camera in ReplaySession(path, rate='fast', loop=True).cameras():
+        camera.start()
+        frames = []
+        for _ in range(min(count, camera.frames) if camera.frames else 0):
+            color, depth, _ = camera.get_frames()
+            frames.append((np.array(color), np.array(depth), camera.depth_scale))
+        camera.stop()
+        if frames:
+            height, width = frames[0][1].shape
+            groups[f"{camera.name} {width}x{height}"] = frames
+    return groups
+
+
+def measure(fn, items, warmup=3):
+    """Executa fn(item) para cada item e devolve estatísticas de latência"""
+    for item in items[:warmup]:
+        fn(item)
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return latency_stats(samples)
+
+
+def latency_stats(samples):
+    """p50/p99/média (ms) e FPS de uma lista de durações em segundos"""
+    samples_ms = np.array(samples) * 1000.0
+    mean = float(samples_ms.mean())
+    return {
+        'p50_ms': round(float(np.percentile(samples_ms, 50)), 4),
+        'p99_ms': round(float(np.percentile(samples_ms, 99)), 4),
+        'mean_ms': round(mean, 4),
+        'fps': round(1000.0 / mean, 1) if mean > 0 else None,
+        'samples': len(samples)
+    }
+
+
+def synthetic_tracks(width, height, camera_name, count=8, seed=0):
+    """Tracks plausíveis para medir o desenho das anotações"""
+    rng = np.random.default_rng(seed)
+    tracks = []
+    for idx in range(count):
+        x1, y1 = int(rng.integers(0, width - 120)), int(rng.integers(0, height - 120))
+        track = TrackedObject((x1, y1, x1 + 100, y1 + 100), 0, 0.9, 'person', camera_name)
+        track.depth = 1.5
+        track.position_3d = (0.1 * idx, 0.0, 1.5)
+        tracks.append(track)
+    return tracks
+
+
+def run_benchmark(frame_groups, client_counts, use_yolo):
+    results = {}
+    model = YOLO(MODEL_PATH) if use_yolo else None
+
+    for group, frames in frame_groups.items():
+        print(f"\n▶ {group} ({len(frames)} frames)")
+        height, width = frames[0][1].shape
+        stages = {}
+
+        tracker = ObjectTracker()
+        detector = ObstacleDetector()
+        full_resolution = ObjectTracker(decimation=1)
+        no_morphology = ObjectTracker(morphology=False)
+        stages['detect_objects_full'] = measure(lambda f: full_resolution.detect_objects(f[1], f[2]), frames)
+        stages['detect_objects'] = measure(lambda f: tracker.detect_objects(f[1], f[2]), frames)
+        stages['detect_objects_no_morphology'] = measure(lambda f: no_morphology.detect_objects(f[1], f[2]), frames)
+        stages['tracker_update'] = measure(lambda f: tracker.update(f[1], f[2]), frames)
+        stages['sectors'] = measure(lambda f: detector.analyze_height(f[1], f[2]), frames)
+
+        intrinsics = synthetic_intrinsics(width, height)
+        projector = DepthProjector(intrinsics)
+        rng = np.random.default_rng(0)
+        pixels = [(rng.integers(0, width, DEPROJECT_PIXELS), rng.integers(0, height, DEPROJECT_PIXELS))
+                  for _ in frames]
+        depth_pixels = [(u, v, f[1][v, u] * f[2]) for (u, v), f in zip(pixels, frames)]
+        stages['deproject_image'] = measure(lambda f: projector.deproject_image(f[1], f[2]), frames)
+        stages[f'deproject_pixels[{DEPROJECT_PIXELS}]'] = measure(
+            lambda p: projector.deproject_pixels(*p), depth_pixels)
+        if REALSENSE_AVAILABLE:
+            rs_intrinsics = rs.intrinsics()
+            rs_intrinsics.width, rs_intrinsics.height = width, height
+            rs_intrinsics.fx, rs_intrinsics.fy = intrinsics['fx'], intrinsics['fy']
+            rs_intrinsics.ppx, rs_intrinsics.ppy = intrinsics['ppx'], intrinsics['ppy']
+            rs_intrinsics.model = rs.distortion.none
+            rs_intrinsics.coeffs = [0.0] * 5
+            stages[f'deproject_rs2[{DEPROJECT_PIXELS}]'] = measure(
+                lambda p: [rs.rs2_deproject_pixel_to_point(rs_intrinsics, [int(u), int(v)], float(z))
+                           for u, v, z in zip(*p)], depth_pixels)
+
+        # Profundidade das caixas: depth alinhado × só as amostras mapeadas do bruto
+        mapper = ColorToDepthMapper(intrinsics, intrinsics, SYNTHETIC_EXTRINSICS, frames[0][2])
+        boxes = [np.stack([u, v, np.minimum(u + 60, width - 1), np.minimum(v + 60, height - 1)], axis=1)
+                 for u, v in pixels]
+        box_frames = list(zip(frames, boxes))
+        stages[f'box_depths[{DEPROJECT_PIXELS}]'] = measure(
+            lambda fb: sample_box_depths(fb[0][1], fb[0][2], fb[1]), box_frames)
+        stages[f'box_depths_mapped[{DEPROJECT_PIXELS}]'] = measure(
+            lambda fb: sample_box_depths(fb[0][1], fb[0][2], fb[1], mapper=mapper), box_frames)
+
+        if model is not None:
+            stages['yolo'] = measure(lambda f: model(f[0], verbose=False), frames)
+        if YOLO_AVAILABLE:
+            owner = types.SimpleNamespace(trackers=synthetic_tracks(width, height, 'BENCH'))
+            buffers = BufferPool()
+            stages['annotate'] = measure(
+                lambda f: MultiCameraTracker._draw_annotations(
+                    owner, 'BENCH', {'annotated': buffers.copy_of('BENCH', f[0]), 'depth': f[1]}),
+                frames)
+
+        encoded = [cv2.imencode('.jpg', f[0], [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])[1].tobytes()
+                   for f in frames]
+        stages['jpeg_encode'] = measure(
+            lambda f: cv2.imencode('.jpg', f[0], [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]), frames)
+        stages['base64'] = measure(lambda jpg: base64.b64encode(jpg).decode('utf-8'), encoded)
+
+        # Duas câmeras por tick (L515 + D435): em sequência no loop × no pool de threads
+        pool = EncoderPool(workers=2)
+        loop = asyncio.new_event_loop()
+        two_streams = [{'l515': f[0], 'd435': frames[(i + 1) % len(frames)][0]} for i, f in enumerate(frames)]
+        variants = [('l515', None, JPEG_QUALITY), ('d435', None, JPEG_QUALITY)]
+        stages['encode_sequential[2]'] = measure(lambda images: encode_variants(images, variants), two_streams)
+        stages['encode_pool[2]'] = measure(
+            lambda images: loop.run_until_complete(pool.encode(images, variants)), two_streams)
+        loop.close()
+        pool.close()
+
+        tracked = tracker.get_tracked_objects()
+        for clients in client_counts:
+            def legacy_send(jpg, clients=clients):
+                # Comportamento antigo: base64 + json.dumps uma vez por cliente
+                message = {'type': 'sensor_data', 'tracked_objects': tracked,
+                           'camera_image': base64.b64encode(jpg).decode('utf-8')}
+                for _ in range(clients):
+                    json.dumps(message, default=str)
+
+            def serialize_once(jpg):
+                # Protocolo binário: cabeçalho JSON uma vez, bytes JPEG reaproveitados
+                header = {'type': 'sensor_data', 'tracked_objects': tracked,
+                          'binary': [{'stream': 'camera', 'format': 'jpeg', 'size': len(jpg)}]}
+                return [json.dumps(header, default=str), jpg]
+
+            stages[f'json_per_client[{clients}]'] = measure(legacy_send, encoded)
+            stages[f'json_once[{clients}]'] = measure(serialize_once, encoded)
+
+            # Vídeo por assinatura: operador em tamanho cheio, demais clientes
+            # em 320 px; variantes iguais são codificadas uma vez
+            subscriptions = {i: VideoSubscription(width=None if i == 0 else 320,
+                                                  quality=JPEG_QUALITY if i == 0 else 60)
+                             for i in range(clients)}
+
+            def encode_per_client(f):
+                return [encode_variants({'camera': f[0]}, [subscription.variant('camera')])
+                        for subscription in subscriptions.values()]
+
+            def encode_subscribed(f):
+                variants, _ = plan_video(subscriptions, ['camera'], time.time())
+                return encode_variants({'camera': f[0]}, variants)
+
+            stages[f'video_per_client[{clients}]'] = measure(encode_per_client, frames)
+            stages[f'video_variants[{clients}]'] = measure(encode_subscribed, frames)
+
+        stages['jpeg_bytes'] = {'mean': int(np.mean([len(jpg) for jpg in encoded])),
+                                'base64_mean': int(np.mean([len(base64.b64encode(jpg)) for jpg in encoded]))}
+
+        for name, stats in stages.items():
+            if 'p50_ms' in stats:
+                print(f"  {name:<24} p50 {stats['p50_ms']:>8.3f} ms  p99 {stats['p99_ms']:>8.3f} ms  {stats['fps']:>8} FPS")
+        results[group] = stages
+
+    return results
+
+
+def _filterpy_track(cx, cy):
+    """Filtro por objeto equivalente ao usado antes do KalmanBank"""
+    kf = KalmanFilter(dim_x=4, dim_z=2)
+    kf.x = np.array([cx, cy, 0., 0.])
+    kf.F = np.array([[1,0,1,0],[0,1,0,1],[0,0,1,0],[0,0,0,1]])
+    kf.H = np.array([[1,0,0,0],[0,1,0,0]])
+    kf.P *= 50
+    kf.R *= 1
+    kf.Q *= 0.01
+    return kf
+
+
+def run_kalman_benchmark(track_counts, steps=100, seed=0):
+    """predict de todos os tracks + update de metade deles, por frame"""
+    results = {}
+    for count in track_counts:
+        rng = np.random.default_rng(seed)
+        starts = rng.uniform(0, 640, size=(count, 2))
+        velocities = rng.normal(0, 3, size=(count, 2))
+        frames = []
+        for step in range(steps):
+            updated = np.flatnonzero(rng.random(count) < 0.5)
+            z = starts[updated] + velocities[updated] * (step + 1) + rng.normal(0, 1, size=(len(updated), 2))
+            frames.append((updated, z))
+
+        print(f"\n▶ kalman {count} tracks ({steps} frames)")
+        stages = {}
+
+        bank = KalmanBank(capacity=count)
+        slots = np.array([bank.allocate(cx, cy) for cx, cy in starts])
+
+        def bank_step(frame):
+            updated, z = frame
+            bank.predict()
+            bank.update(slots[updated], z)
+
+        stages['kalman_bank'] = measure(bank_step, frames, warmup=0)
+
+        if FILTERPY_AVAILABLE:
+            filters = [_filterpy_track(cx, cy) for cx, cy in starts]
+
+            def filterpy_step(frame):
+                updated, z = frame
+                for kf in filters:
+                    kf.predict()
+                for i, measurement in zip(updated, z):
+                    filters[i].update(measurement)
+
+            stages['kalman_filterpy'] = measure(filterpy_step, frames, warmup=0)
+
+            x_error = max(float(np.abs(bank.x[slots[i]] - kf.x).max()) for i, kf in enumerate(filters))
+            p_error = max(float(np.abs(bank.P[slots[i]] - kf.P).max()) for i, kf in enumerate(filters))
+            stages['kalman_equivalence'] = {'max_abs_x': x_error, 'max_abs_P': p_error,
+                                            'match': bool(x_error < 1e-6 and p_error < 1e-6)}
+            print(f"  equivalência com filterpy: |Δx| {x_error:.2e}  |ΔP| {p_error:.2e}")
+
+        for name, stats in stages.items():
+            if 'p50_ms' in stats:
+                print(f"  {name:<24} p50 {stats['p50_ms']:>8.3f} ms  p99 {stats['p99_ms']:>8.3f} ms  {stats['fps']:>8} FPS")
+        results[f"kalman {count}"] = stages
+    return results
+
+
+def synthetic_sequence(count, steps, width=640, height=480, seed=0):
+    """Objetos em movimento retilíneo (rebatendo nas bordas) com ID real
+
+    Cada frame: lista de (id_real, bbox, classe), com ruído de 3 px,
+    10% de detecções perdidas e ordem embaralhada.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.uniform(30, 80, size=(count, 2))
+    pos = rng.uniform(sizes, (width, height) - sizes, size=(count, 2))
+    vel = rng.normal(0, 6, size=(count, 2))
+    classes = rng.integers(0, 3, size=count)
+    frames = []
+    for _ in range(steps):
+        pos += vel
+        for axis, limit in ((0, width), (1, height)):
+            out = (pos[:, axis] < sizes[:, axis]) | (pos[:, axis] > limit - sizes[:, axis])
+            vel[out, axis] *= -1
+            pos[:, axis] = np.clip(pos[:, axis], sizes[:, axis], limit - sizes[:, axis])
+        noisy = pos + rng.normal(0, 3, size=pos.shape)
+        detections = []
+        for i in rng.permutation(count):
+            if rng.random() < 0.1:
+                continue
+            (cx, cy), (w, h) = noisy[i], sizes[i]
+            detections.append((int(i), (int(cx - w), int(cy - h), int(cx + w), int(cy + h)), int(classes[i])))
+        frames.append(detections)
+    return frames
+
+
+def _greedy_match(bank, tracks, detections):
+    """Associação antiga: track mais próximo de cada detecção, sem exclusividade"""
+    matches = []
+    for d, (_, box, _) in enumerate(detections):
+        cx, cy = (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+        best, best_dist = None, ASSOCIATION_MAX_DIST + 1
+        for t, track in enumerate(tracks):
+            x = bank.x[track['slot']]
+            dist = np.hypot(x[0] - cx, x[1] - cy)
+            if dist < best_dist:
+                best, best_dist = t, dist
+        if best is not None and best_dist < ASSOCIATION_MAX_DIST:
+            matches.append((d, best))
+    matched = {d for d, _ in matches}
+    return matches, [d for d in range(len(detections)) if d not in matched]
+
+
+def _hungarian_match(bank, tracks, detections):
+    boxes = [box for _, box, _ in detections]
+    track_boxes = []
+    for track in tracks:
+        x = bank.x[track['slot']]
+        w, h = track['size']
+        track_boxes.append((x[0] - w, x[1] - h, x[0] + w, x[1] + h))
+    cost = association_cost(boxes, [cls for _, _, cls in detections],
+                            track_boxes, [track['cls'] for track in tracks],
+                            ASSOCIATION_MAX_DIST, ASSOCIATION_IOU)
+    matches, unmatched, _ = assign(cost)
+    return matches, unmatched
+
+
+def replay_association(sequence, match):
+    """Roda o tracking na sequência e mede latência da associação e trocas de ID"""
+    bank = KalmanBank()
+    tracks = []
+    owner = {}         # id real -> id do track que o seguia no frame anterior
+    switches = 0
+    samples = []
+    for detections in sequence:
+        bank.predict()
+        start = time.perf_counter()
+        matches, unmatched = match(bank, tracks, detections) if tracks else ([], list(range(len(detections))))
+        samples.append(time.perf_counter() - start)
+
+        measurements = {}
+        for d, t in matches:
+            gt, box, _ = detections[d]
+            track = tracks[t]
+            measurements[track['slot']] = ((box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0)
+            if gt in owner and owner[gt] != track['id']:
+                switches += 1
+            owner[gt] = track['id']
+        if measurements:
+            bank.update(list(measurements.keys()), list(measurements.values()))
+        for d in unmatched:
+            gt, box, cls = detections[d]
+            slot = bank.allocate((box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0)
+            track = {'id': len(tracks), 'slot': slot, 'cls': cls,
+                     'size': ((box[2] - box[0]) / 2.0, (box[3] - box[1]) / 2.0)}
+            if gt in owner:
+                switches += 1
+            owner[gt] = track['id']
+            tracks.append(track)
+
+    samples_ms = np.array(samples) * 1000.0
+    return {
+        'p50_ms': round(float(np.percentile(samples_ms, 50)), 4),
+        'p99_ms': round(float(np.percentile(samples_ms, 99)), 4),
+        'mean_ms': round(float(samples_ms.mean()), 4),
+        'fps': round(1000.0 / samples_ms.mean(), 1) if samples_ms.mean() > 0 else None,
+        'samples': len(samples),
+        'id_switches': switches,
+        'tracks_created': len(tracks)
+    }
+
+
+def run_association_benchmark(object_counts, steps=100):
+    """Guloso antigo × húngaro com gate de IoU, em sequências com IDs reais"""
+    results = {}
+    for count in object_counts:
+        sequence = synthetic_sequence(count, steps)
+        print(f"\n▶ associação {count} objetos ({steps} frames)")
+        stages = {
+            'association_greedy': replay_association(sequence, _greedy_match),
+            'association_hungarian': replay_association(sequence, _hungarian_match)
+        }
+        for name, stats in stages.items():
+            print(f"  {name:<24} p50 {stats['p50_ms']:>8.3f} ms  p99 {stats['p99_ms']:>8.3f} ms  "
+                  f"trocas de ID {stats['id_switches']:>4}  tracks {stats['tracks_created']:>4}")
+        results[f"association {count}"] = stages
+    return results
+
+
+def run_filter_benchmark(count):
+    """Filtros do SDK em frames ao vivo de cada RealSense conectada
+
+    Para cada frame: tempo da cadeia DepthFilterChain, detect_objects no
+    depth bruto com morfologia (limpeza em Python) e no depth filtrado sem
+    morfologia (limpeza no SDK), e a fração de pixels válidos em cada um.
+    """
+    results = {}
+    for device in rs.context().query_devices():
+        name = device.get_info(rs.camera_info.name)
+        serial = device.get_info(rs.camera_info.serial_number)
+        sensor = 'L515' if 'L515' in name else 'D435'
+        print(f"\n▶ filtros {sensor} ({serial}, {count} frames)")
+
+        pipeline = rs.pipeline()
+        config = rs.config()
+        config.enable_device(serial)
+        config.enable_stream(rs.stream.depth)
+        profile = pipeline.start(config)
+        depth_scale = profile.get_device().first_depth_sensor().get_depth_scale()
+        chain = DepthFilterChain(sensor)
+        raw_tracker = ObjectTracker()
+        filtered_tracker = ObjectTracker(morphology=False)
+        samples = {'sdk_filter_chain': [], 'detect_objects_raw': [], 'detect_objects_filtered': []}
+        valid = {'raw': [], 'filtered': []}
+        try:
+            for index in range(count + 5):
+                depth_frame = pipeline.wait_for_frames(timeout_ms=2000).get_depth_frame()
+                start = time.perf_counter()
+                filtered_frame = chain.process(depth_frame)
+                filter_time = time.perf_counter() - start
+
+                raw = np.asanyarray(depth_frame.get_data())
+                filtered = np.asanyarray(filtered_frame.get_data())
+                start = time.perf_counter()
+                raw_tracker.detect_objects(raw, depth_scale)
+                raw_time = time.perf_counter() - start
+                start = time.perf_counter()
+                filtered_tracker.detect_objects(filtered, depth_scale)
+                filtered_time = time.perf_counter() - start
+
+                if index < 5:
+                    continue  # aquecimento (filtro temporal ainda convergindo)
+                samples['sdk_filter_chain'].append(filter_time)
+                samples['detect_objects_raw'].append(raw_time)
+                samples['detect_objects_filtered'].append(filtered_time)
+                valid['raw'].append(np.count_nonzero(raw) / raw.size)
+                valid['filtered'].append(np.count_nonzero(filtered) / filtered.size)
+        finally:
+            pipeline.stop()
+
+        stages = {stage: latency_stats(values) for stage, values in samples.items()}
+        stages['valid_fraction'] = {kind: round(float(np.mean(values)), 4) for kind, values in valid.items()}
+        stages['filters'] = chain.names()
+        for stage in samples:
+            stats = stages[stage]
+            print(f"  {stage:<24} p50 {stats['p50_ms']:>8.3f} ms  p99 {stats['p99_ms']:>8.3f} ms  {stats['fps']:>8} FPS")
+        print(f"  pixels válidos: bruto {stages['valid_fraction']['raw']:.1%}  "
+              f"filtrado {stages['valid_fraction']['filtered']:.1%}")
+        results[f"filters {sensor}"] = stages
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    """Imprime a variação do p50 de cada etapa em relação a um resultado salvo"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n=== Comparação com {baseline_path} (commit {baseline.get('commit')}) ===")
+    for group, stages in results['groups'].items():
+        base_stages = baseline.get('groups', {}).get(group)
+        if not base_stages:
+            continue
+        print(f"▶ {group}")
+        for name, stats in stages.items():
+            base = base_stages.get(name)
+            if not base or 'p50_ms' not in stats or not base.get('p50_ms'):
+                continue
+            change = (stats['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100.0
+            flag = "⚠" if change > 10 else " "
+            print(f"  {flag} {name:<24} {base['p50_ms']:>8.3f} → {stats['p50_ms']:>8.3f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho crítico do sensor_loop")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--resolutions', nargs='+', default=DEFAULT_RESOLUTIONS)
+    parser.add_argument('--clients', nargs='+', type=int, default=DEFAULT_CLIENTS)
+    parser.add_argument('--tracks', nargs='+', type=int, default=DEFAULT_TRACKS,
+                        help="números de tracks para o benchmark do banco de Kalman")
+    parser.add_argument('--objects', nargs='+', type=int, default=DEFAULT_OBJECTS,
+                        help="números de objetos para o benchmark de associação")
+    parser.add_argument('--session', help="sessão gravada (robot_replay) no lugar de frames sintéticos")
+    parser.add_argument('--no-yolo', action='store_true', help="não mede a inferência YOLO")
+    parser.add_argument('--live-filters', action='store_true',
+                        help="mede os filtros do SDK em frames ao vivo das RealSense conectadas")
+    parser.add_argument('--output', help="salva os resultados em JSON")
+    parser.add_argument('--compare', help="JSON de um resultado anterior para comparação")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("  BENCHMARK - CAMINHO CRÍTICO DO SENSOR_LOOP")
+    print("=" * 70)
+
+    if args.session:
+        frame_groups = session_frames(args.session, args.frames)
+    else:
+        frame_groups = {}
+        for resolution in args.resolutions:
+            width, height = (int(v) for v in resolution.lower().split('x'))
+            frame_groups[f"synthetic {width}x{height}"] = synthetic_frames(width, height, args.frames)
+
+    use_yolo = YOLO_AVAILABLE and not args.no_yolo
+    if not YOLO_AVAILABLE:
+        print("⚠ ultralytics/robot_tracking_system indisponível - etapas yolo/annotate ignoradas")
+    if not FILTERPY_AVAILABLE:
+        print("⚠ filterpy indisponível - kalman_bank medido sem comparação")
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'source': args.session or 'synthetic',
+        'groups': run_benchmark(frame_groups, args.clients, use_yolo)
+    }
+    results['groups'].update(run_kalman_benchmark(args.tracks, steps=args.frames))
+    results['groups'].update(run_association_benchmark(args.objects, steps=args.frames))
+    if args.live_filters:
+        if REALSENSE_AVAILABLE:
+            results['groups'].update(run_filter_benchmark(args.frames))
+        else:
+            print("⚠ pyrealsense2 indisponível - filtros do SDK não medidos")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Resultados salvos em {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
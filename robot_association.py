@@ -0,0 +1,141 @@
+"""
+Associação detecção ↔ track por atribuição global
+- Matrizes de custo vetorizadas (NumPy) entre todas as detecções e todos os
+  tracks de uma câmera: distância entre centros, IoU e classe
+- Gate: um par só é aceito se os centros estão a menos de max_dist pixels
+  ou se a IoU passa do limiar
+- Atribuição ótima com scipy.optimize.linear_sum_assignment (húngaro), então
+  duas detecções nunca disputam o mesmo track
+- SpatialGrid: índice em grade uniforme para casar centróides por raio em
+  tempo linear (usado pelo ObjectTracker de profundidade)
+"""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+INFEASIBLE = 1e6
+CLASS_PENALTY = 1.0  # custo extra quando a classe da detecção difere da do track
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU entre cada caixa de boxes_a (N, 4) e de boxes_b (M, 4) -> (N, M)"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def box_centers(boxes):
+    b = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return np.stack([(b[:, 0] + b[:, 2]) / 2.0, (b[:, 1] + b[:, 3]) / 2.0], axis=1)
+
+
+def association_cost(det_boxes, det_classes, track_boxes, track_classes,
+                     max_dist, iou_threshold, class_penalty=CLASS_PENALTY):
+    """Custo (D, T) = distância normalizada + (1 - IoU) + penalidade de classe
+
+    Pares fora do gate recebem INFEASIBLE.
+    """
+    det_centers = box_centers(det_boxes)
+    track_centers = box_centers(track_boxes)
+    dist = np.linalg.norm(det_centers[:, None, :] - track_centers[None, :, :], axis=2)
+    overlap = iou_matrix(det_boxes, track_boxes)
+    mismatch = np.asarray(det_classes)[:, None] != np.asarray(track_classes)[None, :]
+
+    cost = dist / max_dist + (1.0 - overlap) + class_penalty * mismatch
+    feasible = (dist < max_dist) | (overlap >= iou_threshold)
+    cost[~feasible] = INFEASIBLE
+    return cost
+
+
+def assign(cost):
+    """Atribuição ótima -> (pares (det, track), dets sem par, tracks sem par)"""
+    n_det, n_track = cost.shape
+    if n_det == 0 or n_track == 0:
+        return [], list(range(n_det)), list(range(n_track))
+
+    rows, cols = linear_sum_assignment(cost)
+    keep = cost[rows, cols] < INFEASIBLE
+    matches = list(zip(rows[keep].tolist(), cols[keep].tolist()))
+
+    matched_det = set(rows[keep].tolist())
+    matched_track = set(cols[keep].tolist())
+    unmatched_det = [d for d in range(n_det) if d not in matched_det]
+    unmatched_track = [t for t in range(n_track) if t not in matched_track]
+    return matches, unmatched_det, unmatched_track
+
+
+class SpatialGrid:
+    """Índice espacial em grade uniforme para pontos 2D
+
+    Com célula do tamanho do raio de busca, cada consulta olha só as 3x3
+    células vizinhas: montar o índice e consultar todos os pontos custa
+    O(n) para densidade limitada, em vez da matriz completa de distâncias.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.points = []
+        self.cells = {}
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def build(self, points):
+        """Indexa uma sequência de (x, y); os resultados são índices nessa sequência"""
+        self.points = [(float(x), float(y)) for x, y in points]
+        self.cells = {}
+        for index, (x, y) in enumerate(self.points):
+            self.cells.setdefault(self._cell(x, y), []).append(index)
+        return self
+
+    def query(self, x, y, radius):
+        """[(índice, distância)] dos pontos a até `radius` de (x, y)"""
+        reach = max(1, int(np.ceil(radius / self.cell_size)))
+        cx, cy = self._cell(x, y)
+        found = []
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                for index in self.cells.get((gx, gy), ()):
+                    px, py = self.points[index]
+                    dist = ((px - x) ** 2 + (py - y) ** 2) ** 0.5
+                    if dist <= radius:
+                        found.append((index, dist))
+        return found
+
+
+def match_by_radius(sources, targets, radius):
+    """Casamento guloso único por menor distância entre dois conjuntos de pontos
+
+    Gera só os pares a até `radius` (via SpatialGrid), ordena por distância e
+    aceita cada par se nenhum dos dois lados já foi usado.
+    Retorna (pares (fonte, alvo), fontes sem par, alvos sem par).
+    """
+    if not sources or not targets:
+        return [], list(range(len(sources))), list(range(len(targets)))
+
+    grid = SpatialGrid(radius).build(targets)
+    pairs = []
+    for s, (x, y) in enumerate(sources):
+        for t, dist in grid.query(x, y, radius):
+            pairs.append((dist, s, t))
+    pairs.sort()
+
+    used_sources, used_targets, matches = set(), set(), []
+    for _, s, t in pairs:
+        if s in used_sources or t in used_targets:
+            continue
+        used_sources.add(s)
+        used_targets.add(t)
+        matches.append((s, t))
+
+    return (matches,
+            [s for s in range(len(sources)) if s not in used_sources],
+            [t for t in range(len(targets)) if t not in used_targets])
@@ -14,11 +14,24 @@ import websockets
 import json
 import cv2
 import base64
+import argparse
+import time
 import open3d as o3d
 from threading import Thread
 from queue import Queue
 from collections import deque
-from scipy.spatial import distance
+from concurrent.futures import ThreadPoolExecutor
+from robot_capture import BufferPool, CaptureThread
+from robot_video import EncoderPool, VideoSubscription, plan_video
+from robot_broadcast import Broadcaster
+from robot_association import match_by_radius
+from robot_mapping import OccupancyGrid, RobotPose, VoxelMap
+from robot_pointcloud import PointCloudEncoder
+from robot_fusion import PolarObstacleHistogram
+from robot_geometry import load_sensor_mounts
+from robot_filters import DepthFilterChain, depth_filters_enabled
+from robot_replay import ReplaySession, SessionRecorder, intrinsics_to_dict
+from robot_metrics import MetricsRegistry, serve_prometheus
 
 # Tenta importar sistema YOLO (opcional)
 try:
@@ -32,20 +45,50 @@ except:
 class RealSenseController:
     """Gerencia os sensores Intel RealSense"""
     
-    def __init__(self):
+    def __init__(self, replay=None):
         self.pipeline_lidar = None
         self.pipeline_camera = None
+        
+        # Replay de sessão gravada (robot_replay.ReplaySession) no lugar dos dispositivos
+        self.replay = replay
+        self.replay_lidar = None
+        self.replay_camera = None
         self.lidar_started = False
         self.camera_started = False
         self.lidar_serial = None
         self.camera_serial = None
         
+        # Threads de captura (uma por dispositivo)
+        self.lidar_capture = None
+        self.camera_capture = None
+        self._last_lidar_seq = 0
+        self._last_camera_seq = 0
+        self.camera_timestamp = None  # instante de captura do último frame lido
+        self.lidar_timestamp = None
+        
+        # Intrínsecos do stream de profundidade (dicionário, ver robot_replay)
+        self.lidar_intrinsics = None
+        self.camera_intrinsics = None
+        self.lidar_depth_scale = 0.00025  # padrão do L515 (lido do dispositivo ao iniciar)
+        
+        # Pós-processamento no SDK (CAMERA_FILTERS em robot_filters.py)
+        self.lidar_filters = None
+        self.camera_filters = None
+        
         # Para reconstrução 3D
         self.point_cloud = o3d.geometry.PointCloud()
         self.mesh = None
         
     def cleanup(self):
         """Libera todos os recursos dos sensores"""
+        self.stop_capture()
+        
+        for source in (self.replay_lidar, self.replay_camera):
+            if source:
+                source.stop()
+        self.replay_lidar = None
+        self.replay_camera = None
+        
         try:
             if self.pipeline_lidar:
                 self.pipeline_lidar.stop()
@@ -144,6 +187,9 @@ class RealSenseController:
         print("\nLimpando recursos anteriores...")
         self.cleanup()
         
+        if self.replay:
+            return self._start_replay()
+        
         if not self.identify_devices():
             print("✗ Nenhum dispositivo RealSense disponível!")
             return False
@@ -162,6 +208,7 @@ class RealSenseController:
                 profile = self.pipeline_lidar.start(config_lidar)
                 
                 print("  ✓ Pipeline iniciado!")
+                self.lidar_depth_scale = profile.get_device().first_depth_sensor().get_depth_scale()
                 
                 depth_stream = profile.get_stream(rs.stream.depth)
                 if depth_stream:
@@ -170,6 +217,7 @@ class RealSenseController:
                     print(f"    Resolução: {vp.width()}x{vp.height()}")
                     print(f"    FPS: {vp.fps()}")
                     print(f"    Formato: {vp.format()}")
+                    self.lidar_intrinsics = intrinsics_to_dict(vp.get_intrinsics())
                 
                 # Testa aquisição de frames
                 print("  Testando aquisição de frames...")
@@ -181,6 +229,10 @@ class RealSenseController:
                     else:
                         print(f"    Frame {i+1}/5: ✗ falhou")
                 
+                self.lidar_filters = DepthFilterChain('L515')
+                if self.lidar_filters.enabled:
+                    print(f"  Filtros de profundidade: {' -> '.join(self.lidar_filters.names())}")
+                
                 self.lidar_started = True
                 print("✓✓✓ LiDAR L515 INICIADO COM SUCESSO!\n")
                 
@@ -225,6 +277,7 @@ class RealSenseController:
                     print(f"    Color: {color_stream.as_video_stream_profile().width()}x{color_stream.as_video_stream_profile().height()}")
                 if depth_stream:
                     print(f"    Depth: {depth_stream.as_video_stream_profile().width()}x{depth_stream.as_video_stream_profile().height()}")
+                    self.camera_intrinsics = intrinsics_to_dict(depth_stream.as_video_stream_profile().get_intrinsics())
                 
                 # Testa frames
                 print("  Testando aquisição de frames...")
@@ -235,6 +288,10 @@ class RealSenseController:
                     else:
                         print(f"    Frame {i+1}/3: ✗")
                 
+                self.camera_filters = DepthFilterChain('D435')
+                if self.camera_filters.enabled:
+                    print(f"  Filtros de profundidade: {' -> '.join(self.camera_filters.names())}")
+                
                 self.camera_started = True
                 print("✓✓✓ CÂMERA D435 INICIADA COM SUCESSO!\n")
                 
@@ -265,6 +322,7 @@ class RealSenseController:
         print(f"{'='*50}\n")
         
         if self.camera_started or self.lidar_started:
+            self.start_capture()
             if self.camera_started:
                 print("✓✓✓ SISTEMA PRONTO PARA NAVEGAÇÃO AUTÔNOMA")
             return True
@@ -272,8 +330,35 @@ class RealSenseController:
             print("✗✗✗ FALHA: Nenhum sensor disponível")
             return False
     
+    def _start_replay(self):
+        """Usa a sessão gravada como LiDAR (L515) e câmera (D435)"""
+        self.replay_lidar = self.replay.camera('L515')
+        self.replay_camera = self.replay.camera('D435')
+        
+        for source in (self.replay_lidar, self.replay_camera):
+            if source:
+                source.start()
+        
+        self.lidar_started = self.replay_lidar is not None
+        self.camera_started = self.replay_camera is not None
+        self.lidar_intrinsics = self.replay_lidar.intrinsics if self.replay_lidar else None
+        if self.replay_lidar:
+            self.lidar_depth_scale = self.replay_lidar.depth_scale
+        self.camera_intrinsics = self.replay_camera.intrinsics if self.replay_camera else None
+        print(f"  LiDAR (replay): {'✓' if self.lidar_started else '✗ não gravado'}")
+        print(f"  Câmera (replay): {'✓' if self.camera_started else '✗ não gravada'}")
+        
+        if self.camera_started or self.lidar_started:
+            self.start_capture()
+            return True
+        return False
+    
     def get_lidar_data(self):
         """Obtém dados do LiDAR"""
+        if self.replay_lidar:
+            _, depth_image, _ = self.replay_lidar.get_frames()
+            return depth_image
+        
         if not self.lidar_started or not self.pipeline_lidar:
             return None
         
@@ -282,6 +367,8 @@ class RealSenseController:
             depth_frame = frames.get_depth_frame()
             if not depth_frame:
                 return None
+            if self.lidar_filters:
+                depth_frame = self.lidar_filters.process(depth_frame)
             
             depth_image = np.asanyarray(depth_frame.get_data())
             return depth_image
@@ -291,6 +378,10 @@ class RealSenseController:
     
     def get_camera_data(self):
         """Obtém dados da câmera"""
+        if self.replay_camera:
+            color_image, depth_image, _ = self.replay_camera.get_frames()
+            return color_image, depth_image
+        
         if not self.camera_started or not self.pipeline_camera:
             return None, None
         
@@ -301,6 +392,8 @@ class RealSenseController:
             
             if not color_frame or not depth_frame:
                 return None, None
+            if self.camera_filters:
+                depth_frame = self.camera_filters.process(depth_frame)
             
             color_image = np.asanyarray(color_frame.get_data())
             depth_image = np.asanyarray(depth_frame.get_data())
@@ -310,6 +403,52 @@ class RealSenseController:
             print(f"Erro ao obter dados da câmera: {e}")
             return None, None
     
+    def start_capture(self):
+        """Inicia uma thread de captura por sensor ativo"""
+        if self.lidar_started and not self.lidar_capture:
+            self.lidar_capture = CaptureThread("L515", self.get_lidar_data)
+            self.lidar_capture.start()
+        
+        if self.camera_started and not self.camera_capture:
+            def grab_camera():
+                color_image, depth_image = self.get_camera_data()
+                if color_image is None:
+                    return None
+                return color_image, depth_image
+            
+            self.camera_capture = CaptureThread("D435", grab_camera)
+            self.camera_capture.start()
+    
+    def stop_capture(self):
+        """Para as threads de captura"""
+        for capture in (self.lidar_capture, self.camera_capture):
+            if capture:
+                capture.stop()
+        self.lidar_capture = None
+        self.camera_capture = None
+    
+    def latest_lidar_data(self):
+        """Retorna o depth mais recente do LiDAR ainda não lido (não bloqueia)"""
+        if not self.lidar_capture:
+            return None
+        entry = self.lidar_capture.slot.latest()
+        if entry is None or entry[0] == self._last_lidar_seq:
+            return None
+        self._last_lidar_seq = entry[0]
+        self.lidar_timestamp = entry[1]
+        return entry[2]
+    
+    def latest_camera_data(self):
+        """Retorna (color, depth) mais recentes da câmera ainda não lidos (não bloqueia)"""
+        if not self.camera_capture:
+            return None, None
+        entry = self.camera_capture.slot.latest()
+        if entry is None or entry[0] == self._last_camera_seq:
+            return None, None
+        self._last_camera_seq = entry[0]
+        self.camera_timestamp = entry[1]
+        return entry[2]
+    
     def stop(self):
         """Para todos os sensores"""
         self.cleanup()
@@ -318,7 +457,9 @@ class RealSenseController:
 class ObjectTracker:
     """Rastreia objetos detectados pela câmera"""
     
-    def __init__(self, max_disappeared=10, min_area=5000, max_distance=2.0, min_distance=0.5):
+    def __init__(self, max_disappeared=10, min_area=5000, max_distance=2.0, min_distance=0.5,
+                 match_distance=100, candidate_tolerance=30, candidate_ttl=5, max_candidates=64,
+                 decimation=2, roi=None, morphology=True):
         self.next_object_id = 0
         self.objects = {}
         self.disappeared = {}
@@ -329,41 +470,99 @@ class ObjectTracker:
         self.min_distance = min_distance
         self.frame_counter = 0
         self.stable_frames = 3
-        self.candidate_objects = {}
-        
+        self.match_distance = match_distance            # px para casar detecção com objeto
+        self.candidate_tolerance = candidate_tolerance  # px para casar detecção com candidato
+        self.candidate_ttl = candidate_ttl              # frames sem ver o candidato até descartar
+        self.max_candidates = max_candidates
+        self.candidate_objects = []  # {'centroid', 'count', 'data', 'last_seen'}
+        
+        # Pirâmide de processamento: detecção em resolução reduzida e só na ROI
+        self.decimation = max(1, int(decimation))  # passo da amostragem (1 = resolução cheia)
+        self.roi = roi                             # (topo, base, esquerda, direita) em fração da imagem
+        self._buffers = {}                         # buffers uint8 reaproveitados por formato
+        self._thresholds = {}                      # depth_scale -> (bruto mínimo, bruto máximo)
+        # Fechamento/abertura em OpenCV; dispensável quando o SDK já filtra (robot_filters)
+        self.morphology = morphology
+        
+    def _roi_bounds(self, shape):
+        """Linhas/colunas (y0, y1, x0, x1) da ROI de navegação"""
+        height, width = shape[:2]
+        if not self.roi:
+            return 0, height, 0, width
+        top, bottom, left, right = self.roi
+        return int(height * top), int(height * bottom), int(width * left), int(width * right)
+    
+    def _raw_range(self, depth_scale):
+        """Faixa bruta [lo, hi] equivalente a min_distance < d < max_distance (metros)"""
+        cached = self._thresholds.get(depth_scale)
+        if cached is None:
+            lo = ObstacleDetector._raw_threshold(self.min_distance, depth_scale) + 1
+            hi = ObstacleDetector._raw_threshold(self.max_distance, depth_scale)
+            if hi * depth_scale >= self.max_distance:
+                hi -= 1
+            cached = self._thresholds[depth_scale] = (lo, hi)
+        return cached
+    
+    def _buffer(self, name, shape):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buffer
+    
     def detect_objects(self, depth_image, depth_scale=0.001):
-        """Detecta objetos usando dados de profundidade"""
+        """Detecta objetos usando dados de profundidade
+        
+        Trabalha sobre uma view decimada da ROI (sem cópia), em uint16/uint8
+        com buffers reaproveitados; kernel, área mínima e contagem de pixels
+        são escalados pela decimação e as bboxes voltam à resolução original.
+        """
         if depth_image is None:
             return []
         
-        depth_meters = depth_image.astype(float) * depth_scale
-        valid_mask = (depth_meters > self.min_distance) & (depth_meters < self.max_distance)
-        
-        if not np.any(valid_mask):
+        step = self.decimation
+        y0, y1, x0, x1 = self._roi_bounds(depth_image.shape)
+        depth = depth_image[y0:y1:step, x0:x1:step]
+        if depth.size == 0:
             return []
         
-        depth_normalized = ((depth_meters - self.min_distance) / 
-                          (self.max_distance - self.min_distance) * 255).astype(np.uint8)
-        depth_normalized[~valid_mask] = 0
+        lo, hi = self._raw_range(depth_scale)
+        valid_mask = cv2.inRange(depth, lo, hi, dst=self._buffer('valid', depth.shape))
+        if not cv2.countNonZero(valid_mask):
+            return []
         
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
-        depth_clean = cv2.morphologyEx(depth_normalized, cv2.MORPH_CLOSE, kernel)
-        depth_clean = cv2.morphologyEx(depth_clean, cv2.MORPH_OPEN, kernel)
+        # (d - min) / (max - min) * 255 direto do uint16, zerado fora da faixa
+        scale = depth_scale * 255.0 / (self.max_distance - self.min_distance)
+        depth_normalized = cv2.convertScaleAbs(depth, dst=self._buffer('normalized', depth.shape),
+                                               alpha=scale, beta=-self.min_distance * 255.0 / (self.max_distance - self.min_distance))
+        cv2.bitwise_and(depth_normalized, valid_mask, dst=depth_normalized)
+        
+        if self.morphology:
+            size = max(3, int(round(7 / step)) | 1)
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+            depth_clean = cv2.morphologyEx(depth_normalized, cv2.MORPH_CLOSE, kernel,
+                                           dst=self._buffer('clean', depth.shape))
+            depth_clean = cv2.morphologyEx(depth_clean, cv2.MORPH_OPEN, kernel, dst=depth_clean)
+        else:
+            depth_clean = depth_normalized
         
-        _, binary = cv2.threshold(depth_clean, 30, 255, cv2.THRESH_BINARY)
+        _, binary = cv2.threshold(depth_clean, 30, 255, cv2.THRESH_BINARY, dst=depth_clean)
         contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
+        area_scale = step * step
+        min_area = self.min_area / area_scale
+        min_pixels = max(1, 100 // area_scale)
+        
         detected = []
         for contour in contours:
             area = cv2.contourArea(contour)
-            if area < self.min_area:
+            if area < min_area:
                 continue
             
             x, y, w, h = cv2.boundingRect(contour)
-            roi = depth_meters[y:y+h, x:x+w]
-            valid_depths = roi[roi > 0]
+            roi = depth[y:y+h, x:x+w]
+            valid_depths = roi[roi > 0] * depth_scale
             
-            if len(valid_depths) < 100:
+            if len(valid_depths) < min_pixels:
                 continue
             if valid_depths.std() > 0.3:
                 continue
@@ -373,6 +572,8 @@ class ObjectTracker:
             if fill_ratio < 0.3:
                 continue
             
+            # De volta às coordenadas da imagem original
+            x, y, w, h = x0 + x * step, y0 + y * step, w * step, h * step
             cx = x + w // 2
             cy = y + h // 2
             avg_depth = np.median(valid_depths)
@@ -381,7 +582,7 @@ class ObjectTracker:
                 'bbox': (x, y, x+w, y+h),
                 'centroid': (cx, cy),
                 'depth': avg_depth,
-                'area': area
+                'area': area * area_scale
             })
         
         return detected
@@ -391,75 +592,67 @@ class ObjectTracker:
         self.frame_counter += 1
         detections = self.detect_objects(depth_image, depth_scale)
         
-        if len(detections) == 0:
-            for object_id in list(self.disappeared.keys()):
-                self.disappeared[object_id] += 1
-                if self.disappeared[object_id] > self.max_disappeared:
-                    del self.objects[object_id]
-                    del self.disappeared[object_id]
-                    del self.centroids[object_id]
-            return
+        object_ids = list(self.objects.keys())
+        matches, unused_detections, unused_objects = match_by_radius(
+            [d['centroid'] for d in detections],
+            [self.centroids[oid] for oid in object_ids],
+            self.match_distance)
+        
+        for col, row in matches:
+            object_id = object_ids[row]
+            detection = detections[col]
+            self.objects[object_id] = detection
+            self.centroids[object_id] = detection['centroid']
+            self.disappeared[object_id] = 0
+        
+        for row in unused_objects:
+            object_id = object_ids[row]
+            self.disappeared[object_id] += 1
+            if self.disappeared[object_id] > self.max_disappeared:
+                del self.objects[object_id]
+                del self.disappeared[object_id]
+                del self.centroids[object_id]
+        
+        self._update_candidates([detections[col] for col in unused_detections])
+    
+    def _update_candidates(self, detections):
+        """Acumula detecções sem objeto em candidatos (casados por tolerância)
         
-        input_centroids = np.array([d['centroid'] for d in detections])
+        Um candidato visto em stable_frames frames vira objeto; candidatos
+        não vistos por candidate_ttl frames são descartados e o total fica
+        limitado a max_candidates (os mais antigos saem primeiro).
+        """
+        matches, new_detections, _ = match_by_radius(
+            [d['centroid'] for d in detections],
+            [c['centroid'] for c in self.candidate_objects],
+            self.candidate_tolerance)
+        
+        promoted = set()
+        for col, index in matches:
+            candidate = self.candidate_objects[index]
+            candidate['count'] += 1
+            candidate['centroid'] = detections[col]['centroid']
+            candidate['data'] = detections[col]
+            candidate['last_seen'] = self.frame_counter
+            if candidate['count'] >= self.stable_frames:
+                self._register(detections[col])
+                promoted.add(index)
+        
+        self.candidate_objects = [
+            c for index, c in enumerate(self.candidate_objects)
+            if index not in promoted and self.frame_counter - c['last_seen'] <= self.candidate_ttl
+        ]
+        for col in new_detections:
+            self.candidate_objects.append({
+                'centroid': detections[col]['centroid'],
+                'count': 1,
+                'data': detections[col],
+                'last_seen': self.frame_counter
+            })
         
-        if len(self.objects) == 0:
-            for detection in detections:
-                centroid = detection['centroid']
-                if centroid not in self.candidate_objects:
-                    self.candidate_objects[centroid] = {'count': 1, 'data': detection}
-                else:
-                    self.candidate_objects[centroid]['count'] += 1
-                    if self.candidate_objects[centroid]['count'] >= self.stable_frames:
-                        self._register(detection)
-                        del self.candidate_objects[centroid]
-        else:
-            object_ids = list(self.objects.keys())
-            object_centroids = np.array([self.centroids[oid] for oid in object_ids])
-            
-            D = distance.cdist(object_centroids, input_centroids)
-            rows = D.min(axis=1).argsort()
-            cols = D.argmin(axis=1)[rows]
-            
-            used_rows = set()
-            used_cols = set()
-            
-            for (row, col) in zip(rows, cols):
-                if row in used_rows or col in used_cols:
-                    continue
-                if D[row, col] > 100:
-                    continue
-                
-                object_id = object_ids[row]
-                detection = detections[col]
-                
-                self.objects[object_id] = detection
-                self.centroids[object_id] = detection['centroid']
-                self.disappeared[object_id] = 0
-                
-                used_rows.add(row)
-                used_cols.add(col)
-            
-            unused_rows = set(range(D.shape[0])) - used_rows
-            for row in unused_rows:
-                object_id = object_ids[row]
-                self.disappeared[object_id] += 1
-                
-                if self.disappeared[object_id] > self.max_disappeared:
-                    del self.objects[object_id]
-                    del self.disappeared[object_id]
-                    del self.centroids[object_id]
-            
-            unused_cols = set(range(D.shape[1])) - used_cols
-            for col in unused_cols:
-                detection = detections[col]
-                centroid = detection['centroid']
-                if centroid not in self.candidate_objects:
-                    self.candidate_objects[centroid] = {'count': 1, 'data': detection}
-                else:
-                    self.candidate_objects[centroid]['count'] += 1
-                    if self.candidate_objects[centroid]['count'] >= self.stable_frames:
-                        self._register(detection)
-                        del self.candidate_objects[centroid]
+        if len(self.candidate_objects) > self.max_candidates:
+            self.candidate_objects.sort(key=lambda c: c['last_seen'])
+            self.candidate_objects = self.candidate_objects[-self.max_candidates:]
     
     def _register(self, detection):
         """Registra novo objeto"""
@@ -483,40 +676,89 @@ class ObjectTracker:
 
 
 class ObstacleDetector:
-    """Detecta obstáculos usando dados dos sensores"""
+    """Detecta obstáculos usando dados dos sensores
+    
+    As imagens de profundidade são analisadas direto em uint16: os limites em
+    metros viram limites em unidades brutas do sensor e os setores saem de uma
+    única redução por coluna, sem converter o frame inteiro para float.
+    """
     
-    def __init__(self, safe_distance=0.5, height_threshold=1.5):
+    SECTOR_NAMES = ('left', 'center', 'right')
+    
+    def __init__(self, safe_distance=0.5, height_threshold=1.5, num_sectors=3):
         self.safe_distance = safe_distance
         self.height_threshold = height_threshold
+        self.num_sectors = num_sectors
+        self._buffers = {}
+        
+    @staticmethod
+    def _raw_threshold(meters, depth_scale):
+        """Maior valor bruto r tal que r * depth_scale <= meters"""
+        raw = int(meters / depth_scale)
+        while (raw + 1) * depth_scale <= meters:
+            raw += 1
+        while raw >= 0 and raw * depth_scale > meters:
+            raw -= 1
+        return min(raw, 65535)
+    
+    @staticmethod
+    def _sector_edges(width, num_sectors):
+        """Colunas iniciais de cada setor (o último absorve o resto)"""
+        num_sectors = max(1, min(num_sectors, width))
+        return np.arange(num_sectors) * (width // num_sectors)
+    
+    def _column_stats(self, depth_image, depth_scale, min_dist, max_dist, count_valid):
+        """Mínimo válido e contagem de válidos por coluna, em unidades brutas
         
-    def analyze_lidar(self, depth_image):
-        """Analisa dados do LiDAR para obstáculos no chão"""
-        if depth_image is None:
-            return None
-        
-        height, width = depth_image.shape
-        depth_meters = depth_image.astype(float) * 0.001
-        
-        third = width // 3
-        left_region = depth_meters[:, :third]
-        center_region = depth_meters[:, third:2*third]
-        right_region = depth_meters[:, 2*third:]
-        
-        def check_region(region):
-            valid = region[(region > 0) & (region < 10)]
-            if len(valid) > 0:
-                min_dist = np.min(valid)
-                return {
-                    'blocked': min_dist < self.safe_distance,
-                    'distance': float(min_dist)
-                }
-            return {'blocked': False, 'distance': 10.0}
-        
-        left_status = check_region(left_region)
-        center_status = check_region(center_region)
-        right_status = check_region(right_region)
-        
-        return {
+        Válido significa min_dist < profundidade < max_dist. Subtraindo
+        (lo + 1) em uint16, valores <= lo dão a volta e ficam enormes, então
+        um único min() por coluna já ignora os inválidos.
+        """
+        lo = self._raw_threshold(min_dist, depth_scale)
+        hi = self._raw_threshold(max_dist, depth_scale)
+        if hi * depth_scale >= max_dist:
+            hi -= 1
+        valid_range = hi - lo - 1  # válido: 0 <= shifted <= valid_range
+        
+        shifted = self._buffers.get(depth_image.shape)
+        if shifted is None:
+            shifted = self._buffers[depth_image.shape] = np.empty(depth_image.shape, dtype=np.uint16)
+        np.subtract(depth_image, np.uint16(lo + 1), out=shifted, casting='unsafe')
+        
+        col_min = shifted.min(axis=0)
+        col_count = np.count_nonzero(shifted <= valid_range, axis=0) if count_valid else None
+        return col_min, col_count, lo + 1, valid_range
+    
+    def _analyze_sectors(self, depth_image, depth_scale, min_dist, max_dist,
+                         min_valid, block_distance, default_distance, sensor):
+        """Analisa setores verticais da imagem de profundidade"""
+        width = depth_image.shape[1]
+        col_min, col_count, offset, valid_range = self._column_stats(
+            depth_image, depth_scale, min_dist, max_dist, count_valid=min_valid > 0)
+        
+        def reduce(num_sectors):
+            edges = self._sector_edges(width, num_sectors)
+            mins = np.minimum.reduceat(col_min, edges)
+            if col_count is not None:
+                counts = np.add.reduceat(col_count, edges)
+                has_data = counts > min_valid
+            else:
+                counts = None
+                has_data = mins <= valid_range
+            sectors = []
+            for idx in range(len(edges)):
+                if has_data[idx]:
+                    distance = float((int(mins[idx]) + offset) * depth_scale)
+                    status = {'blocked': distance < block_distance, 'distance': distance}
+                else:
+                    status = {'blocked': False, 'distance': default_distance}
+                if counts is not None:
+                    status['valid'] = int(counts[idx])
+                sectors.append(status)
+            return sectors
+        
+        left_status, center_status, right_status = reduce(3)
+        result = {
             'left': left_status['blocked'],
             'center': center_status['blocked'],
             'right': right_status['blocked'],
@@ -525,51 +767,38 @@ class ObstacleDetector:
                 'center': center_status['distance'],
                 'right': right_status['distance']
             },
-            'sensor': 'L515'
+            'sensor': sensor
         }
+        if self.num_sectors != 3:
+            result['sectors'] = reduce(self.num_sectors)
+        return result
+        
+    def analyze_lidar(self, depth_image, depth_scale=0.001):
+        """Analisa dados do LiDAR para obstáculos no chão"""
+        if depth_image is None:
+            return None
+        
+        return self._analyze_sectors(depth_image, depth_scale, 0.0, 10.0,
+                                     min_valid=0,
+                                     block_distance=self.safe_distance,
+                                     default_distance=10.0,
+                                     sensor='L515')
     
     def analyze_height(self, depth_image, depth_scale=0.001):
         """Analisa altura dos obstáculos usando câmera"""
         if depth_image is None:
             return None
         
-        height, width = depth_image.shape
-        depth_meters = depth_image.astype(float) * depth_scale
-        
+        height = depth_image.shape[0]
         roi_top = int(height * 0.3)
         roi_bottom = int(height * 0.7)
-        roi = depth_meters[roi_top:roi_bottom, :]
-        
-        third = width // 3
-        left_region = roi[:, :third]
-        center_region = roi[:, third:2*third]
-        right_region = roi[:, 2*third:]
-        
-        def check_height_region(region):
-            valid = region[(region > 0.1) & (region < 3.0)]
-            if len(valid) > 100:
-                min_dist = np.min(valid)
-                return {
-                    'blocked': min_dist < 0.8,
-                    'distance': float(min_dist)
-                }
-            return {'blocked': False, 'distance': 3.0}
-        
-        left_status = check_height_region(left_region)
-        center_status = check_height_region(center_region)
-        right_status = check_height_region(right_region)
+        roi = depth_image[roi_top:roi_bottom, :]
         
-        return {
-            'left': left_status['blocked'],
-            'center': center_status['blocked'],
-            'right': right_status['blocked'],
-            'distances': {
-                'left': left_status['distance'],
-                'center': center_status['distance'],
-                'right': right_status['distance']
-            },
-            'sensor': 'D435'
-        }
+        return self._analyze_sectors(roi, depth_scale, 0.1, 3.0,
+                                     min_valid=100,
+                                     block_distance=0.8,
+                                     default_distance=3.0,
+                                     sensor='D435')
 
 
 class AutonomousNavigator:
@@ -591,22 +820,45 @@ class AutonomousNavigator:
         # Distância de segurança mínima (metros)
         self.safe_distance = 0.8
         
+        # Mapa de ocupação (opcional): lembra obstáculos fora do campo de visão atual
+        self.occupancy_grid = None
+        self.pose = None
+        # Fusão L515 + D435 (opcional): pega obstáculos baixos que a D435 não vê
+        self.fusion = None
+        
     def analyze_depth_distances(self, height_obstacles):
         """
         Analisa as distâncias esquerda/direita dos dados da câmera D435
         Se esquerda está mais perto: gira sentido horário (direita) para se afastar
         Se direita está mais perto: gira sentido anti-horário (esquerda) para se afastar
         Retorna: 'left', 'right', ou None (sem obstáculos)
+        
+        Sem setores da D435/YOLO (ex.: só a L515) o mapa e a fusão ainda
+        decidem sozinhos.
         """
-        if not height_obstacles or 'distances' not in height_obstacles:
+        has_sectors = bool(height_obstacles) and 'distances' in height_obstacles
+        if not has_sectors and self.occupancy_grid is None and self.fusion is None:
             return None
         
-        distances = height_obstacles['distances']
+        distances = height_obstacles['distances'] if has_sectors else {}
         left_dist = distances.get('left', 3.0)
         right_dist = distances.get('right', 3.0)
         
+        if self.occupancy_grid is not None and self.pose is not None:
+            map_distances = self.occupancy_grid.sector_distances(self.pose, max_range=3.0)
+            left_dist = min(left_dist, map_distances['left'])
+            right_dist = min(right_dist, map_distances['right'])
+        
+        # Obstáculo baixo à frente (só a fusão vê): desvia para o lado mais livre
+        center_blocked = False
+        if self.fusion is not None:
+            fused = self.fusion.sector_distances(default=3.0)
+            left_dist = min(left_dist, fused['left'])
+            right_dist = min(right_dist, fused['right'])
+            center_blocked = fused['center'] <= self.safe_distance
+        
         # Se ambos estão longe, não precisa desviar
-        if left_dist > self.safe_distance and right_dist > self.safe_distance:
+        if left_dist > self.safe_distance and right_dist > self.safe_distance and not center_blocked:
             return None
         
         # Decide baseado em qual lado está mais perto
@@ -696,6 +948,7 @@ class RobotController:
     def __init__(self):
         self.serial_port = None
         self.speed = 150
+        self.last_command = (0, 0, 0)  # último (m1, m2, m3) enviado (dead reckoning)
         
     def connect(self, port):
         """Conecta ao Arduino"""
@@ -723,6 +976,7 @@ class RobotController:
             command = f"{m1},{m2},{m3}\n"
             print(f"📤 ENVIANDO PARA ARDUINO: {command.strip()}")
             self.serial_port.write(command.encode())
+            self.last_command = (m1, m2, m3)
             return True
         except Exception as e:
             print(f"✗ Erro ao enviar comando: {e}")
@@ -759,7 +1013,9 @@ class RobotController:
 class WebSocketServer:
     """Servidor WebSocket para comunicação com interface web"""
     
-    def __init__(self, robot_controller, realsense_controller, obstacle_detector, navigator):
+    def __init__(self, robot_controller, realsense_controller, obstacle_detector, navigator,
+                 replay=None, recorder=None, inference_process=False,
+                 point_cloud_points=5000, point_cloud_interval=1.0, encode_workers=2):
         self.robot = robot_controller
         self.sensors = realsense_controller
         self.detector = obstacle_detector
@@ -767,15 +1023,50 @@ class WebSocketServer:
         
         # Tracking
         if YOLO_AVAILABLE:
-            self.yolo_tracker = MultiCameraTracker()
+            self.yolo_tracker = MultiCameraTracker(replay=replay, recorder=recorder,
+                                                   inference_process=inference_process)
             self.use_yolo = False
         else:
             self.yolo_tracker = None
             self.use_yolo = False
         
-        self.basic_tracker = ObjectTracker()
+        # Com os filtros do SDK na D435 a limpeza morfológica em Python é dispensada
+        # (replay grava o depth bruto: mantém a morfologia)
+        self.basic_tracker = ObjectTracker(morphology=replay is not None or not depth_filters_enabled('D435'))
+        # Confiança da profundidade (depth_confidence) dos objetos do YOLO
+        self.min_depth_confidence = 0.2       # abaixo disso o objeto é ignorado
+        self.obstacle_depth_confidence = 0.5  # mínimo para marcar o setor como bloqueado
         
         self.clients = set()
+        self.metrics = MetricsRegistry()
+        self.broadcaster = Broadcaster(metrics=self.metrics)  # Filas de saída limitadas por cliente
+        self.loop_budget = 0.1        # orçamento de cada iteração do sensor_loop (s)
+        self.annotation_buffers = BufferPool()  # imagens anotadas do modo básico
+        self.encoder = EncoderPool(workers=encode_workers)  # JPEG fora do loop asyncio
+        self.metrics_interval = 2.0   # período da mensagem 'metrics' (s)
+        
+        # Mapa de ocupação integrado a cada frame de profundidade
+        self.pose = RobotPose()
+        self.occupancy = OccupancyGrid()
+        self.navigator.occupancy_grid = self.occupancy
+        self.navigator.pose = self.pose
+        
+        # Fusão dos streams de profundidade em um histograma polar no referencial do robô
+        self.fusion = PolarObstacleHistogram()
+        self.navigator.fusion = self.fusion
+        self.map_interval = 1.0       # período da mensagem 'occupancy_grid' (s)
+        
+        # Reconstrução 3D incremental (voxels, memória limitada)
+        self.voxels = VoxelMap()
+        # Uma thread só para os mapas (ocupação e voxels): integração, amostragem e
+        # exportação ficam serializadas e fora do loop asyncio
+        self.map_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mapping')
+        self.map_jobs = {}            # nome -> último job (asyncio.Future)
+        # Canal binário 'point_cloud' (keyframes + deltas quantizados)
+        self.point_cloud_encoder = PointCloudEncoder()
+        self.point_cloud_points = point_cloud_points      # orçamento de pontos por amostra
+        self.point_cloud_interval = point_cloud_interval  # período das atualizações (s)
+        self.point_cloud_voxel = 0.1                      # resolução da amostra enviada (m)
         self.autonomous_mode = False
         self.running = True
         self.tablet_connected = False
@@ -785,20 +1076,78 @@ class WebSocketServer:
     async def register(self, websocket):
         """Registra novo cliente"""
         self.clients.add(websocket)
+        outbox = self.broadcaster.add(websocket)
+        # Até o cliente mandar 'subscribe': todos os streams, tamanho original
+        outbox.video = VideoSubscription(tick_interval=self.loop_budget)
         print(f"✓ Cliente conectado. Total: {len(self.clients)}")
         
     async def unregister(self, websocket):
         """Remove cliente"""
         self.clients.remove(websocket)
+        await self.broadcaster.remove(websocket)
         print(f"✗ Cliente desconectado. Total: {len(self.clients)}")
     
     async def send_to_all(self, message):
-        """Envia mensagem para todos os clientes"""
-        if self.clients:
-            await asyncio.gather(
-                *[client.send(json.dumps(message)) for client in self.clients],
-                return_exceptions=True
-            )
+        """Envia mensagem de controle/status para todos os clientes (nunca descartada)"""
+        self.broadcaster.broadcast(message)
+    
+    def video_wanted(self, stream, now=None):
+        """True se algum cliente assina o stream e tem frame devido neste tick"""
+        now = now if now is not None else time.time()
+        return any(o.video is not None and o.video.due(stream, now)
+                   for o in self.broadcaster.outboxes.values())
+    
+    async def send_sensor_data(self, message, images):
+        """Envia sensor_data com as imagens JPEG na assinatura e no formato de cada cliente
+        
+        images: {stream: imagem BGR anotada}. Cada variante (stream, largura,
+        qualidade) pedida pelos clientes é codificada uma vez; clientes com o
+        mesmo conjunto de variantes e transporte compartilham os bytes
+        serializados. Clientes binários recebem o JSON com a lista 'binary'
+        seguido dos JPEG em frames binários, na mesma ordem; os demais recebem
+        base64 dentro do JSON ('<stream>_image'). Clientes atrasados descartam
+        o frame anterior.
+        """
+        now = time.time()
+        outboxes = list(self.broadcaster.outboxes.values())
+        for outbox in outboxes:
+            # Só o canal do vídeo: mapas e nuvem de pontos não derrubam a qualidade
+            outbox.video.adapt(*outbox.channel_stats('sensor'), now)
+        
+        variants, chosen = plan_video({o: o.video for o in outboxes}, list(images), now)
+        if variants:
+            # Streams em paralelo no pool; o tick não espera além do orçamento do loop
+            with self.metrics.time('encode'):
+                encoded = await self.encoder.encode(images, variants, timeout=self.loop_budget)
+        else:
+            encoded = {}
+        self.metrics.set_gauge('video_variants', len(encoded))
+        self.metrics.set_gauge('encode_dropped', self.encoder.dropped)
+        self.metrics.set_gauge('encode_late', self.encoder.late)
+        
+        groups = {}  # (binário, variantes) -> clientes
+        for outbox in outboxes:
+            groups.setdefault((outbox.binary, chosen[outbox]), []).append(outbox)
+        
+        for (binary, picked), group in groups.items():
+            frames = [(variant, encoded[variant]) for variant in picked if variant in encoded]
+            if binary:
+                header = dict(message)
+                header['binary'] = [
+                    {'stream': stream, 'format': 'jpeg', 'size': len(data),
+                     'width': width, 'quality': quality}
+                    for (stream, width, quality), data in frames
+                ]
+                payloads = [json.dumps(header)] + [data for _, data in frames]
+            else:
+                legacy = dict(message)
+                for (stream, _, _), data in frames:
+                    legacy[f'{stream}_image'] = base64.b64encode(data).decode('utf-8')
+                payloads = [json.dumps(legacy)]
+            self.broadcaster.broadcast_frame(payloads, group)
+            for outbox in group:
+                for (stream, _, _), _ in frames:
+                    outbox.video.mark_sent(stream, now)
     
     async def handle_client(self, websocket):
         """Gerencia comunicação com cliente"""
@@ -806,19 +1155,46 @@ class WebSocketServer:
         try:
             async for message in websocket:
                 data = json.loads(message)
+                if data.get('type') == 'set_frame_transport':
+                    outbox = self.broadcaster.get(websocket)
+                    if outbox:
+                        outbox.binary = data.get('mode') == 'binary'
+                        if outbox.binary:
+                            # Cliente novo precisa de um keyframe da nuvem
+                            self.point_cloud_encoder.request_keyframe()
+                    continue
+                if data.get('type') == 'subscribe':
+                    # Assinatura de vídeo deste cliente: streams, largura, qualidade, fps
+                    outbox = self.broadcaster.get(websocket)
+                    if outbox:
+                        try:
+                            outbox.video = VideoSubscription.from_message(data, self.loop_budget)
+                            reply = {'type': 'video_subscription', **outbox.video.to_dict()}
+                        except ValueError as e:
+                            # Assinatura anterior continua valendo
+                            reply = {'type': 'video_subscription', 'error': str(e)}
+                        outbox.push_control([json.dumps(reply)])
+                    continue
                 await self.process_command(data)
         finally:
             await self.unregister(websocket)
     
     def _convert_tracking_to_obstacles(self, tracked_objects):
-        """Converte objetos rastreados do YOLO em formato de obstáculos"""
+        """Converte objetos rastreados do YOLO em formato de obstáculos
+        
+        Usa a confiança da profundidade de cada objeto: leituras pouco
+        confiáveis (buracos, bordas, fundo) são ignoradas, e só objetos com
+        confiança suficiente marcam o setor como bloqueado. 'confidence'
+        traz a confiança do objeto mais próximo de cada setor.
+        """
         if not tracked_objects:
             return {
                 'type': 'yolo',
                 'left': False,
                 'center': False,
                 'right': False,
-                'distances': {'left': 10.0, 'center': 10.0, 'right': 10.0}
+                'distances': {'left': 10.0, 'center': 10.0, 'right': 10.0},
+                'confidence': {'left': 0.0, 'center': 0.0, 'right': 0.0}
             }
         
         # Divide frame em 3 setores
@@ -831,7 +1207,8 @@ class WebSocketServer:
             'left': False,
             'center': False,
             'right': False,
-            'distances': {'left': 10.0, 'center': 10.0, 'right': 10.0}
+            'distances': {'left': 10.0, 'center': 10.0, 'right': 10.0},
+            'confidence': {'left': 0.0, 'center': 0.0, 'right': 0.0}
         }
         
         for obj in tracked_objects:
@@ -839,6 +1216,9 @@ class WebSocketServer:
             bbox = obj.get('bbox', {})
             center_x = bbox.get('x', 0) + bbox.get('w', 0) // 2
             depth = obj.get('depth', 10.0)
+            confidence = obj.get('depth_confidence', 1.0)
+            if confidence < self.min_depth_confidence:
+                continue
             
             # Determina setor
             if center_x < left_sector:
@@ -851,8 +1231,9 @@ class WebSocketServer:
             # Atualiza distância mínima do setor
             if depth < obstacles['distances'][sector]:
                 obstacles['distances'][sector] = depth
-                # Marca como obstáculo se estiver perto (< 1.5m)
-                if depth < 1.5:
+                obstacles['confidence'][sector] = confidence
+                # Marca como obstáculo se estiver perto (< 1.5m) e a leitura for confiável
+                if depth < 1.5 and confidence >= self.obstacle_depth_confidence:
                     obstacles[sector] = True
         
         return obstacles
@@ -924,15 +1305,31 @@ class WebSocketServer:
         
         elif cmd_type == 'robot_face_heartbeat':
             self.tablet_connected = True
+        
+        elif cmd_type == 'reset_map':
+            self.occupancy.reset()
+            self.map_executor.submit(self.voxels.reset)
+            self.point_cloud_encoder.request_keyframe()
+            self.pose.reset()
+            self._send_occupancy(self.occupancy.to_message(self.pose))
+        
+        elif cmd_type == 'get_broadcast_stats':
+            await self.send_to_all({'type': 'broadcast_stats', 'clients': self.broadcaster.stats()})
     
     async def sensor_loop(self):
         """Loop principal de leitura dos sensores"""
         print("\n🔄 Iniciando loop de sensores...")
         last_tablet_check = asyncio.get_event_loop().time()
+        last_metrics = last_tablet_check
+        last_map = last_tablet_check
+        last_point_cloud = last_tablet_check
+        last_pose_update = time.perf_counter()
+        metrics = self.metrics
         
         while self.running:
             try:
                 loop_start = asyncio.get_event_loop().time()
+                tick_start = time.perf_counter()
                 
                 if loop_start - last_tablet_check > 5:
                     self.tablet_connected = False
@@ -944,24 +1341,43 @@ class WebSocketServer:
                         self.robot_moving = False
                         print("⏸️ Timeout de movimento manual - robô parado")
                 
+                # Dead reckoning: integra o último comando enviado aos motores
+                now_pose = time.perf_counter()
+                if self.robot_moving and self.robot.is_connected():
+                    self.pose.apply_motors(*self.robot.last_command, now_pose - last_pose_update)
+                last_pose_update = now_pose
+                
                 message = {
                     'type': 'sensor_data',
                     'timestamp': loop_start,
                     'tablet_connected': self.tablet_connected,
                     'robot_moving': self.robot_moving
                 }
+                images = {}  # stream -> imagem anotada (codificada por assinatura no envio)
                 
                 # MODO YOLO
                 if self.use_yolo and self.yolo_tracker:
                     try:
-                        camera_frames = self.yolo_tracker.process_frame()
-                        tracked_objects = self.yolo_tracker.get_tracked_objects()
+                        with metrics.time('perception'):
+                            now = time.time()
+                            annotate = {camera.name for camera in self.yolo_tracker.cameras
+                                        if self.video_wanted(camera.name.lower(), now)}
+                            camera_frames = self.yolo_tracker.process_frame(annotate=annotate)
+                            tracked_objects = self.yolo_tracker.get_tracked_objects()
+                        for stage, seconds in self.yolo_tracker.timings.items():
+                            metrics.observe(stage, seconds)
+                        metrics.set_gauge('detection_stride_frames', self.yolo_tracker.scheduler.stride_frames())
                         
+                        now = time.time()
                         for camera_name, data in camera_frames.items():
-                            annotated = data['annotated']
-                            _, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                            image_b64 = base64.b64encode(buffer).decode('utf-8')
-                            message[f'{camera_name.lower()}_image'] = image_b64
+                            if data.get('timestamp'):
+                                metrics.observe('capture_age', now - data['timestamp'])
+                            if data['annotated'] is not None:
+                                images[camera_name.lower()] = data['annotated']
+                            # Cor por pixel do depth só existe com o depth alinhado
+                            color = data['color'] if data.get('aligned', True) else None
+                            self._update_map(data['depth'], data['depth_scale'], data.get('intrinsics'),
+                                             camera_name, color=color, timestamp=data.get('timestamp'))
                         
                         message['tracked_objects'] = tracked_objects
                         message['tracking_mode'] = 'yolo'
@@ -981,30 +1397,50 @@ class WebSocketServer:
                 # MODO BÁSICO
                 else:
                     if self.sensors.camera_started:
-                        color_image, depth_image = self.sensors.get_camera_data()
+                        # Leitura não bloqueante: a thread de captura mantém o frame mais recente
+                        color_image, depth_image = self.sensors.latest_camera_data()
                         
                         if color_image is not None:
-                            self.basic_tracker.update(depth_image, 0.001)
+                            if self.sensors.camera_timestamp:
+                                metrics.observe('capture_age', time.time() - self.sensors.camera_timestamp)
+                            with metrics.time('perception'):
+                                self.basic_tracker.update(depth_image, 0.001)
                             tracked = self.basic_tracker.get_tracked_objects()
                             
-                            annotated = color_image.copy()
-                            for obj in tracked:
-                                x1, y1, x2, y2 = obj['bbox']
-                                cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                label = f"ID:{obj['id']} {obj['depth']:.2f}m"
-                                cv2.putText(annotated, label, (x1, y1-10),
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                            
-                            _, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                            message['camera_image'] = base64.b64encode(buffer).decode('utf-8')
+                            # Anota num buffer do pool (o frame do SDK não é tocado), só se alguém assiste
+                            if self.video_wanted('camera'):
+                                annotated = self.annotation_buffers.copy_of('camera', color_image)
+                                for obj in tracked:
+                                    x1, y1, x2, y2 = obj['bbox']
+                                    cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                                    label = f"ID:{obj['id']} {obj['depth']:.2f}m"
+                                    cv2.putText(annotated, label, (x1, y1-10),
+                                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                                images['camera'] = annotated
                             message['tracked_objects'] = tracked
                         
                         if depth_image is not None:
-                            height_obstacles = self.detector.analyze_height(depth_image, 0.001)
+                            with metrics.time('obstacles'):
+                                height_obstacles = self.detector.analyze_height(depth_image, 0.001)
                             message['height_obstacles'] = height_obstacles
+                            self._update_map(depth_image, 0.001, self.sensors.camera_intrinsics, 'D435',
+                                             color=color_image, timestamp=self.sensors.camera_timestamp)
+                    
+                    if self.sensors.lidar_started:
+                        lidar_depth = self.sensors.latest_lidar_data()
+                        if lidar_depth is not None:
+                            with metrics.time('obstacles'):
+                                message['ground_obstacles'] = self.detector.analyze_lidar(
+                                    lidar_depth, self.sensors.lidar_depth_scale)
+                            self._update_map(lidar_depth, self.sensors.lidar_depth_scale,
+                                             self.sensors.lidar_intrinsics, 'L515',
+                                             timestamp=self.sensors.lidar_timestamp)
                     
                     message['tracking_mode'] = 'basic'
                 
+                # Modelo único de obstáculos (todos os sensores, leituras vencidas ignoradas)
+                message['fused_obstacles'] = self.fusion.to_obstacles(self.navigator.safe_distance)
+                
                 # NAVEGAÇÃO AUTÔNOMA
                 if self.autonomous_mode and self.robot.is_connected():
                     height_obstacles = message.get('height_obstacles', None)
@@ -1023,10 +1459,30 @@ class WebSocketServer:
                         self.robot.move('stop', 0)
                         self.robot_moving = False
                 
-                await self.send_to_all(message)
+                with metrics.time('broadcast'):
+                    await self.send_sensor_data(message, images)
+                
+                # Orçamento do loop: tempo de trabalho desta iteração
+                work_time = time.perf_counter() - tick_start
+                metrics.observe('loop', work_time)
+                if work_time > self.loop_budget:
+                    metrics.increment('loop_budget_overruns')
+                
+                if loop_start - last_metrics >= self.metrics_interval:
+                    last_metrics = loop_start
+                    await self.send_metrics()
+                
+                if loop_start - last_map >= self.map_interval:
+                    last_map = loop_start
+                    asyncio.ensure_future(self._send_occupancy_snapshot())
+                    self._run_map_job('open3d', self.voxels.to_open3d, self.sensors.point_cloud)
+                
+                if loop_start - last_point_cloud >= self.point_cloud_interval:
+                    last_point_cloud = loop_start
+                    asyncio.ensure_future(self._send_point_cloud())
                 
                 elapsed = asyncio.get_event_loop().time() - loop_start
-                sleep_time = max(0.05, 0.1 - elapsed)
+                sleep_time = max(0.05, self.loop_budget - elapsed)
                 await asyncio.sleep(sleep_time)
                 
             except KeyboardInterrupt:
@@ -1039,36 +1495,183 @@ class WebSocketServer:
                 traceback.print_exc()
                 await asyncio.sleep(0.5)
     
-    async def start_server(self, host='127.0.0.1', port=8765):
-        """Inicia servidor WebSocket"""
+    def _update_map(self, depth, depth_scale, intrinsics, sensor, color=None, timestamp=None):
+        """Integra um frame de profundidade na fusão, no mapa de ocupação e na nuvem de voxels
+        
+        A fusão (lida pelo navegador no mesmo tick) roda aqui; os mapas vão
+        para a thread do mapa.
+        """
+        if depth is None or not intrinsics:
+            return
+        try:
+            with self.metrics.time('fusion'):
+                self.fusion.update(sensor, depth, depth_scale, intrinsics, timestamp)
+        except Exception as e:
+            print(f"⚠ Erro ao atualizar fusão ({sensor}): {e}")
+        self._run_map_job(f'map:{sensor}', self._integrate_maps, depth, depth_scale,
+                          intrinsics, sensor, self.pose.copy(), color)
+    
+    def _integrate_maps(self, depth, depth_scale, intrinsics, sensor, pose, color):
+        """Integra um frame na grade de ocupação e na nuvem de voxels (thread do mapa)"""
+        with self.metrics.time('mapping'):
+            self.occupancy.integrate_depth(depth, depth_scale, intrinsics, sensor, pose)
+        with self.metrics.time('reconstruction'):
+            self.voxels.integrate_depth(depth, depth_scale, intrinsics, sensor, pose, color)
+        self.metrics.set_gauge('voxels', len(self.voxels))
+    
+    def _run_map_job(self, name, fn, *args):
+        """Roda fn(*args) na thread do mapa e retorna um asyncio.Future
+        
+        Se o job anterior com o mesmo nome ainda não terminou, este é
+        descartado (retorna None): com a thread atrasada fica só o frame em
+        andamento por sensor, em vez de uma fila crescente.
+        """
+        job = self.map_jobs.get(name)
+        if job is not None and not job.done():
+            self.metrics.increment('map_jobs_skipped')
+            return None
+        job = asyncio.wrap_future(self.map_executor.submit(self._guarded_map_job, name, fn, *args))
+        self.map_jobs[name] = job
+        return job
+    
+    @staticmethod
+    def _guarded_map_job(name, fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"⚠ Erro no mapa ({name}): {e}")
+            return None
+    
+    async def _send_occupancy_snapshot(self):
+        """Snapshot da grade de ocupação gerado na thread do mapa"""
+        job = self._run_map_job('occupancy', self.occupancy.to_message, self.pose.copy())
+        message = await job if job is not None else None
+        if message is not None:
+            self._send_occupancy(message)
+    
+    def _send_occupancy(self, message):
+        """'occupancy_grid' no slot 'map' de cada cliente: um cliente lento recebe
+        só o mapa mais novo, em vez de acumular snapshots velhos na fila de controle
+        """
+        self.broadcaster.broadcast_frame([json.dumps(message)], channel='map')
+    
+    def _sample_point_cloud(self):
+        with self.metrics.time('point_cloud'):
+            return self.voxels.sample(self.point_cloud_voxel, self.point_cloud_points)
+    
+    async def _send_point_cloud(self):
+        """Envia a amostra da nuvem de voxels aos clientes binários ('pc16')
+        
+        A amostra é feita na thread do mapa. Keyframes vão pela fila de
+        controle (nunca descartados); deltas vão no slot 'point_cloud', que
+        um cliente atrasado substitui pelo mais novo sem atrasar os frames
+        de vídeo.
+        """
+        outboxes = [o for o in self.broadcaster.outboxes.values() if o.binary]
+        if not outboxes:
+            return
+        job = self._run_map_job('point_cloud', self._sample_point_cloud)
+        sample = await job if job is not None else None
+        if sample is None:
+            return
+        keys, points, colors = sample
+        outboxes = [o for o in self.broadcaster.outboxes.values() if o.binary]
+        header, payload = self.point_cloud_encoder.encode(keys, points, colors, self.pose)
+        payloads = [json.dumps(header), payload]
+        if header['keyframe']:
+            self.broadcaster.broadcast_payloads(payloads, outboxes)
+        else:
+            self.broadcaster.broadcast_frame(payloads, outboxes, channel='point_cloud')
+    
+    async def send_metrics(self):
+        """Envia o snapshot das métricas para os clientes"""
+        clients = self.broadcaster.stats()
+        self.metrics.set_gauge('clients', len(clients))
+        snapshot = self.metrics.snapshot()
+        snapshot['type'] = 'metrics'
+        snapshot['loop_budget_ms'] = self.loop_budget * 1000
+        snapshot['clients'] = clients
+        await self.send_to_all(snapshot)
+    
+    def render_prometheus(self):
+        """Métricas no formato de texto do Prometheus"""
+        return self.metrics.to_prometheus(clients=self.broadcaster.stats())
+    
+    async def start_server(self, host='127.0.0.1', port=8765, metrics_port=None):
+        """Inicia servidor WebSocket (e o endpoint /metrics, se metrics_port for informado)"""
         print(f"\n🚀 Iniciando servidor WebSocket em {host}:{port}")
+        if metrics_port:
+            await serve_prometheus(self.render_prometheus, host, metrics_port)
         sensor_task = asyncio.create_task(self.sensor_loop())
         async with websockets.serve(self.handle_client, host, port):
             print(f"✓ Servidor WebSocket ativo!")
             await asyncio.Future()
 
 
+def parse_args():
+    """Argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Sistema de navegação autônoma - robô tri-omni")
+    parser.add_argument('--record', metavar='DIR',
+                        help="grava os framesets das câmeras (modo YOLO) nesta pasta")
+    parser.add_argument('--replay', metavar='DIR',
+                        help="usa uma sessão gravada no lugar das câmeras RealSense")
+    parser.add_argument('--replay-rate', choices=['realtime', 'fast'], default='realtime',
+                        help="velocidade do replay: tempo real ou o mais rápido possível")
+    parser.add_argument('--no-loop', action='store_true',
+                        help="não reinicia o replay ao chegar ao fim da sessão")
+    parser.add_argument('--metrics-port', type=int, default=9108,
+                        help="porta HTTP do endpoint Prometheus /metrics (0 desativa)")
+    parser.add_argument('--inference-process', action='store_true',
+                        help="roda o YOLO em um processo separado (tracking/anotação não esperam a inferência)")
+    parser.add_argument('--extrinsics', metavar='JSON',
+                        help="montagem dos sensores no robô (x, y, z em m; yaw, pitch em graus) por sensor")
+    parser.add_argument('--point-cloud-points', type=int, default=5000,
+                        help="máximo de pontos por atualização da nuvem 3D enviada à interface")
+    parser.add_argument('--point-cloud-hz', type=float, default=1.0,
+                        help="atualizações por segundo da nuvem 3D (0 desativa)")
+    parser.add_argument('--encode-workers', type=int, default=2,
+                        help="threads de codificação JPEG (uma por câmera codifica tudo em paralelo)")
+    return parser.parse_args()
+
+
 def main():
     """Função principal"""
+    args = parse_args()
+    
     print("\n" + "="*70)
     print("  SISTEMA DE NAVEGAÇÃO AUTÔNOMA - ROBÔ TRI-OMNI")
     print("  Intel RealSense L515 + D435")
     if YOLO_AVAILABLE:
         print("  YOLO Tracking Disponível")
+    if args.replay:
+        print(f"  REPLAY: {args.replay} ({args.replay_rate})")
     print("="*70)
     
+    if args.extrinsics:
+        load_sensor_mounts(args.extrinsics)
+    
+    replay = ReplaySession(args.replay, args.replay_rate, loop=not args.no_loop) if args.replay else None
+    recorder = SessionRecorder(args.record) if args.record and not replay else None
+    
     # NÃO usamos mais RealSenseController para iniciar câmeras,
     # porque o código da Intel está dando o erro "bad optional access".
     # Em vez disso, deixamos o próprio módulo YOLO (MultiCameraTracker)
     # cuidar de encontrar e iniciar L515 e D435, exatamente como no
     # script que você mandou.
-    realsense = RealSenseController()  # mantido apenas para futura integração de LiDAR
+    realsense = RealSenseController(replay=replay)  # mantido apenas para futura integração de LiDAR
     detector = ObstacleDetector()
     navigator = AutonomousNavigator()
     robot = RobotController()
-    server = WebSocketServer(robot, realsense, detector, navigator)
+    server = WebSocketServer(robot, realsense, detector, navigator, replay=replay, recorder=recorder,
+                             inference_process=args.inference_process,
+                             point_cloud_points=args.point_cloud_points,
+                             point_cloud_interval=1.0 / args.point_cloud_hz if args.point_cloud_hz > 0 else float('inf'),
+                             encode_workers=max(1, args.encode_workers))
     
     try:
+        if replay:
+            # Sem hardware: o modo básico também consome a sessão gravada
+            realsense.start()
         print("\n📡 Sensores RealSense serão iniciados pelo módulo YOLO quando você ativar o tracking na interface.")
         
         print(f"\n{'='*70}")
@@ -1080,7 +1683,7 @@ def main():
             print(f"  - YOLO Tracking (L515 + D435) será iniciado ao ativar o switch de YOLO")
         print(f"{'='*70}\n")
         
-        asyncio.run(server.start_server())
+        asyncio.run(server.start_server(metrics_port=args.metrics_port or None))
         
     except KeyboardInterrupt:
         print("\n\n⚠️  Interrompido pelo usuário")
@@ -1089,6 +1692,10 @@ def main():
         realsense.cleanup()
         if server.yolo_tracker:
             server.yolo_tracker.cleanup()
+        server.encoder.close()
+        server.map_executor.shutdown(wait=False, cancel_futures=True)
+        if recorder:
+            recorder.close()
         if robot.is_connected():
             robot.move('stop', 0)
         print("✓ Sistema encerrado\n")
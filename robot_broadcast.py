@@ -0,0 +1,173 @@
+"""
+Camada de broadcast do servidor WebSocket
+- Cada mensagem é serializada uma única vez e os mesmos bytes vão para todos
+- Cada cliente tem uma fila de saída limitada, drenada por uma task própria
+- Frames de sensores são "último vence": se o cliente está atrasado, o frame
+  pendente é substituído (e contado como descartado). Cada canal ('sensor',
+  'map', 'point_cloud') tem seu próprio slot, então um não descarta o outro,
+  e latência de envio e descartes também são medidos por canal
+- Mensagens de controle/status nunca são descartadas
+"""
+
+import json
+import asyncio
+import time
+from collections import deque
+
+
+class ClientOutbox:
+    """Fila de saída de um cliente WebSocket"""
+
+    def __init__(self, websocket, max_control=256, metrics=None):
+        self.websocket = websocket
+        self.metrics = metrics   # MetricsRegistry opcional (etapa 'send')
+        self.max_control = max_control
+        self.control = deque()   # itens de controle/status (sempre entregues)
+        self.frames = {}         # canal -> frame pendente (último vence)
+        self.binary = False      # recebe imagens em frames binários
+        self.video = None        # VideoSubscription (robot_video) do cliente
+        self.sent = 0
+        self.dropped_frames = 0
+        self.last_send_latency = 0.0
+        # Por canal ('control', 'sensor', 'map', ...): a adaptação do vídeo
+        # olha só o canal 'sensor', sem sofrer com envios de mapa/nuvem
+        self.channel_dropped = {}
+        self.channel_latency = {}
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    @property
+    def name(self):
+        address = getattr(self.websocket, 'remote_address', None)
+        if isinstance(address, tuple) and len(address) >= 2:
+            return f"{address[0]}:{address[1]}"
+        return str(id(self.websocket))
+
+    def depth(self):
+        """Itens aguardando envio"""
+        return len(self.control) + len(self.frames)
+
+    def push_control(self, payloads):
+        """Enfileira item que deve ser entregue (lista de payloads enviados em ordem)"""
+        if self.closed:
+            return
+        if len(self.control) >= self.max_control:
+            # Cliente não consome nem mensagens de controle: desconecta
+            print(f"⚠ Cliente {self.name} com {len(self.control)} mensagens pendentes - desconectando")
+            self.closed = True
+            asyncio.ensure_future(self.websocket.close())
+            return
+        self.control.append(payloads)
+        self._wakeup.set()
+
+    def push_frame(self, payloads, channel='sensor'):
+        """Substitui o frame pendente do canal pelo mais novo"""
+        if self.closed:
+            return
+        if channel in self.frames:
+            self.dropped_frames += 1
+            self.channel_dropped[channel] = self.channel_dropped.get(channel, 0) + 1
+        self.frames[channel] = payloads
+        self._wakeup.set()
+
+    def _next_item(self):
+        """(canal, payloads): controle primeiro, depois sensores (vídeo) e então os demais canais"""
+        if self.control:
+            return 'control', self.control.popleft()
+        channel = 'sensor' if 'sensor' in self.frames else next(iter(self.frames))
+        return channel, self.frames.pop(channel)
+
+    def channel_stats(self, channel):
+        """(última latência de envio em s, frames descartados) de um canal"""
+        return self.channel_latency.get(channel, 0.0), self.channel_dropped.get(channel, 0)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self.closed = True
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Drena a fila: controle primeiro, depois os frames mais recentes"""
+        try:
+            while not self.closed:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self.control or self.frames:
+                    channel, item = self._next_item()
+                    start = time.perf_counter()
+                    for payload in item:
+                        await self.websocket.send(payload)
+                    self.last_send_latency = time.perf_counter() - start
+                    self.channel_latency[channel] = self.last_send_latency
+                    self.sent += 1
+                    if self.metrics:
+                        self.metrics.observe('send', self.last_send_latency)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Conexão encerrada: handle_client cuida do unregister
+            self.closed = True
+
+    def stats(self):
+        return {
+            'client': self.name,
+            'binary': self.binary,
+            'queue_depth': self.depth(),
+            'sent': self.sent,
+            'dropped_frames': self.dropped_frames,
+            'send_latency_ms': round(self.last_send_latency * 1000, 2),
+            'video': self.video.to_dict() if self.video else None
+        }
+
+
+class Broadcaster:
+    """Distribui mensagens serializadas uma vez para as filas dos clientes"""
+
+    def __init__(self, max_control=256, metrics=None):
+        self.max_control = max_control
+        self.metrics = metrics
+        self.outboxes = {}  # websocket -> ClientOutbox
+
+    def add(self, websocket):
+        outbox = ClientOutbox(websocket, self.max_control, self.metrics)
+        self.outboxes[websocket] = outbox
+        outbox.start()
+        return outbox
+
+    async def remove(self, websocket):
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox:
+            await outbox.stop()
+
+    def get(self, websocket):
+        return self.outboxes.get(websocket)
+
+    def broadcast(self, message):
+        """Mensagem de controle/status: serializa uma vez e entrega a todos"""
+        if not self.outboxes:
+            return
+        payloads = [json.dumps(message)]
+        for outbox in self.outboxes.values():
+            outbox.push_control(payloads)
+
+    def broadcast_payloads(self, payloads, outboxes=None):
+        """Payloads já serializados (JSON + binários) entregues sem descarte"""
+        for outbox in (outboxes if outboxes is not None else self.outboxes.values()):
+            outbox.push_control(payloads)
+
+    def broadcast_frame(self, payloads, outboxes=None, channel='sensor'):
+        """Frame já serializado: último vence em cada cliente, por canal"""
+        for outbox in (outboxes if outboxes is not None else self.outboxes.values()):
+            outbox.push_frame(payloads, channel)
+
+    def stats(self):
+        return [outbox.stats() for outbox in self.outboxes.values()]
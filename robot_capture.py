@@ -0,0 +1,187 @@
+"""
+Captura de frames em threads dedicadas
+Cada dispositivo RealSense ganha uma thread própria que bloqueia em
+wait_for_frames() e publica o frameset mais recente num slot "último vence".
+O loop asyncio apenas lê o slot, sem nunca bloquear esperando o USB.
+
+Os framesets circulam sem cópia (FrameHandle): as imagens são views sobre
+os buffers do SDK, e quem segura uma view segura o frame. A vida útil é a
+contagem de referências do próprio Python; ninguém deve guardar as imagens
+além do tick em que as usa, para não prender o pool de frames do
+librealsense. Imagens de saída (anotação) usam buffers reaproveitados
+(BufferPool).
+"""
+
+import time
+import threading
+import numpy as np
+
+
+class FrameHandle:
+    """Frameset capturado sem cópia
+
+    color/depth são views NumPy sobre os buffers do SDK (ou do memmap do
+    replay) e `sdk` guarda o frame rs que os sustenta. Não há contagem
+    própria: cada view mantém o frame do SDK vivo, então o buffer só volta
+    ao pool do librealsense quando a última referência (slot de captura,
+    camera_frames do tick, lote em inferência, detecções, job do mapa)
+    deixa de existir. Quem precisar dos pixels por mais tempo deve copiá-los.
+    """
+
+    __slots__ = ('name', 'color', 'depth', 'sdk', 'timestamp')
+
+    def __init__(self, name, color, depth, sdk=None, timestamp=None):
+        self.name = name
+        self.color = color
+        self.depth = depth
+        self.sdk = sdk
+        self.timestamp = timestamp
+
+
+class BufferPool:
+    """Buffers de saída reaproveitados em anel, um anel por chave
+
+    Evita alocar uma imagem nova a cada tick para desenhar anotações. Cada
+    anel tem `depth` buffers: um buffer só é reescrito após `depth - 1` usos
+    seguintes da mesma chave, o que cobre a imagem ainda sendo codificada.
+    """
+
+    def __init__(self, depth=3):
+        self.depth = depth
+        self._rings = {}  # chave -> (buffers, próximo índice)
+
+    def get(self, key, shape, dtype=np.uint8):
+        """Próximo buffer do anel da chave (recriado se a forma mudar)"""
+        ring = self._rings.get(key)
+        if ring is None or ring[0][0].shape != tuple(shape) or ring[0][0].dtype != dtype:
+            ring = ([np.empty(shape, dtype=dtype) for _ in range(self.depth)], 0)
+        buffers, index = ring
+        self._rings[key] = (buffers, (index + 1) % self.depth)
+        return buffers[index]
+
+    def copy_of(self, key, image):
+        """Cópia de `image` num buffer do anel (sem alocação)"""
+        buffer = self.get(key, image.shape, image.dtype)
+        np.copyto(buffer, image)
+        return buffer
+
+
+class LatestFrameSlot:
+    """Slot lock-free com o frame mais recente publicado
+
+    A publicação é uma única atribuição de referência (atômica sob o GIL),
+    então produtor e consumidor nunca esperam um pelo outro. Frames que não
+    forem lidos a tempo são simplesmente sobrescritos.
+    """
+
+    def __init__(self):
+        self._entry = None  # (seq, timestamp, data)
+        self._seq = 0
+
+    def publish(self, data, timestamp=None):
+        """Publica um novo frame (chamado apenas pela thread de captura)"""
+        self._seq += 1
+        self._entry = (self._seq, timestamp if timestamp is not None else time.time(), data)
+
+    def latest(self):
+        """Retorna (seq, timestamp, data) do último frame ou None"""
+        return self._entry
+
+    def clear(self):
+        """Descarta o frame publicado"""
+        self._entry = None
+
+
+class CaptureThread(threading.Thread):
+    """Thread que chama grab() em loop e publica o resultado no slot"""
+
+    def __init__(self, name, grab, slot=None, idle_sleep=0.005):
+        super().__init__(name=f"capture-{name}", daemon=True)
+        self.source_name = name
+        self.grab = grab
+        self.slot = slot if slot is not None else LatestFrameSlot()
+        self.idle_sleep = idle_sleep
+        self.frames_captured = 0
+        self.errors = 0
+        self._running = threading.Event()
+
+    def start(self):
+        self._running.set()
+        super().start()
+
+    def run(self):
+        while self._running.is_set():
+            try:
+                data = self.grab()
+            except Exception as e:
+                self.errors += 1
+                print(f"    Erro na captura de {self.source_name}: {e}")
+                time.sleep(0.1)
+                continue
+
+            if data is None:
+                # Evita busy-loop quando a fonte não entrega frames
+                time.sleep(self.idle_sleep)
+                continue
+
+            self.slot.publish(data)
+            self.frames_captured += 1
+
+    def stop(self, timeout=2.0):
+        """Sinaliza parada e aguarda a thread terminar"""
+        self._running.clear()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+class CaptureSource:
+    """Mixin para fontes com get_frames() -> (color, depth, frame do SDK)
+
+    Fornece a thread de captura, a leitura não bloqueante do frame mais novo
+    (FrameHandle) e o gancho de gravação usado por Camera e pelas fontes de
+    replay.
+    """
+
+    capture = None
+    recorder = None
+    projector = None  # DepthProjector dos intrínsecos, criado no start()
+    aligned = True    # depth alinhado à cor; False = depth bruto + mapper
+    depth_intrinsics = None
+    mapper = None     # ColorToDepthMapper quando o depth não é alinhado
+    _last_seq = 0
+
+    def start_capture(self):
+        """Inicia a thread de captura que publica o frameset mais recente"""
+        if self.capture:
+            return
+
+        def grab():
+            color, depth, sdk_frame = self.get_frames()
+            if color is None or depth is None:
+                return None
+            if self.recorder:
+                self.recorder.write(self.name, color, depth)
+            return FrameHandle(self.name, color, depth, sdk_frame, time.time())
+
+        self.capture = CaptureThread(self.name, grab)
+        self.capture.start()
+
+    def read_latest(self):
+        """FrameHandle do frame mais novo ainda não lido (não bloqueia; None se não há)"""
+        if not self.capture:
+            return None
+        entry = self.capture.slot.latest()
+        if entry is None:
+            return None
+        seq, _, handle = entry
+        if seq == self._last_seq:
+            return None
+        self._last_seq = seq
+        return handle
+
+    def stop_capture(self):
+        """Para a thread de captura"""
+        if self.capture:
+            self.capture.stop()
+            self.capture.slot.clear()
+            self.capture = None
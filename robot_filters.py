@@ -0,0 +1,102 @@
+"""
+Pós-processamento de profundidade dentro do SDK da RealSense
+- Cadeia de filtros por câmera configurada em um só lugar (CAMERA_FILTERS):
+  decimation -> threshold -> [disparity] -> spatial -> temporal ->
+  [profundidade] -> hole_filling, na ordem recomendada pela Intel
+- Roda em código nativo na thread de captura, antes do frame chegar ao
+  Python; com spatial/hole_filling ativos a limpeza morfológica em OpenCV
+  do ObjectTracker fica desnecessária (ver depth_filters_enabled)
+- O filtro temporal guarda estado: uma cadeia por câmera/stream
+
+Cada filtro é omitido quando sua entrada é None/False. Para frames
+alinhados à cor (MultiCameraTracker) a decimação é ignorada, porque mudaria
+a resolução do depth e quebraria a correspondência pixel a pixel.
+"""
+
+import pyrealsense2 as rs
+
+CAMERA_FILTERS = {
+    # D435 (estéreo): suavização no domínio da disparidade
+    'D435': {
+        'decimation': None,              # 2 = metade da resolução (só depth não alinhado)
+        'threshold': (0.15, 6.0),        # m
+        'disparity': True,
+        'spatial': {'magnitude': 2, 'alpha': 0.5, 'delta': 20, 'holes_fill': 0},
+        'temporal': {'alpha': 0.4, 'delta': 20, 'persistence': 3},
+        'hole_filling': 1,               # 0 esquerda, 1 mais distante, 2 mais próximo
+    },
+    # L515 (LiDAR): sem transformação de disparidade
+    'L515': {
+        'decimation': 2,
+        'threshold': (0.1, 9.0),
+        'disparity': False,
+        'spatial': {'magnitude': 2, 'alpha': 0.5, 'delta': 20, 'holes_fill': 0},
+        'temporal': {'alpha': 0.4, 'delta': 20, 'persistence': 3},
+        'hole_filling': 1,
+    },
+}
+
+
+def depth_filters_enabled(name):
+    """True se a cadeia do sensor já preenche buracos/suaviza (spatial ou hole_filling)"""
+    config = CAMERA_FILTERS.get((name or '').upper(), {})
+    return bool(config.get('spatial') or config.get('hole_filling') is not None)
+
+
+class DepthFilterChain:
+    """Filtros do SDK aplicados em sequência a um depth_frame"""
+
+    def __init__(self, name, config=None, aligned=False):
+        self.name = name
+        config = CAMERA_FILTERS.get(name.upper(), {}) if config is None else config
+        self.filters = []  # (nome, filtro)
+
+        if config.get('decimation') and not aligned:
+            decimation = rs.decimation_filter()
+            decimation.set_option(rs.option.filter_magnitude, config['decimation'])
+            self.filters.append(('decimation', decimation))
+
+        if config.get('threshold'):
+            min_dist, max_dist = config['threshold']
+            self.filters.append(('threshold', rs.threshold_filter(min_dist, max_dist)))
+
+        disparity = config.get('disparity') and (config.get('spatial') or config.get('temporal'))
+        if disparity:
+            self.filters.append(('to_disparity', rs.disparity_transform(True)))
+
+        if config.get('spatial'):
+            options = config['spatial']
+            spatial = rs.spatial_filter()
+            spatial.set_option(rs.option.filter_magnitude, options.get('magnitude', 2))
+            spatial.set_option(rs.option.filter_smooth_alpha, options.get('alpha', 0.5))
+            spatial.set_option(rs.option.filter_smooth_delta, options.get('delta', 20))
+            spatial.set_option(rs.option.holes_fill, options.get('holes_fill', 0))
+            self.filters.append(('spatial', spatial))
+
+        if config.get('temporal'):
+            options = config['temporal']
+            temporal = rs.temporal_filter()
+            temporal.set_option(rs.option.filter_smooth_alpha, options.get('alpha', 0.4))
+            temporal.set_option(rs.option.filter_smooth_delta, options.get('delta', 20))
+            temporal.set_option(rs.option.holes_fill, options.get('persistence', 3))
+            self.filters.append(('temporal', temporal))
+
+        if disparity:
+            self.filters.append(('to_depth', rs.disparity_transform(False)))
+
+        if config.get('hole_filling') is not None:
+            self.filters.append(('hole_filling', rs.hole_filling_filter(config['hole_filling'])))
+
+    @property
+    def enabled(self):
+        return bool(self.filters)
+
+    def names(self):
+        return [name for name, _ in self.filters]
+
+    def process(self, depth_frame):
+        """depth_frame filtrado (o original se a cadeia estiver vazia)"""
+        frame = depth_frame
+        for _, depth_filter in self.filters:
+            frame = depth_filter.process(frame)
+        return frame.as_depth_frame() if frame is not depth_frame else depth_frame
@@ -0,0 +1,120 @@
+"""
+Fusão de sensores em um modelo único de obstáculos
+- Cada stream de profundidade (L515, D435, câmeras do modo YOLO) é deprojetado
+  e levado ao referencial do robô pelas extrínsecas de robot_geometry
+  (SENSOR_MOUNTS, configuráveis por arquivo), então alturas de montagem e
+  escalas de profundidade diferentes deixam de importar
+- Pontos entre min_height e max_height (acima do chão, até a altura do robô)
+  viram um histograma polar: menor distância por setor angular, por sensor
+- Cada sensor guarda o instante da leitura; leituras mais velhas que max_age
+  são ignoradas na fusão (sensor parado não "congela" um obstáculo)
+- Consultas vetorizadas sobre o histograma fundido: distância em qualquer
+  conjunto de ângulos e por setor (mesmas chaves do ObstacleDetector)
+
+Referencial do robô: x para frente, y para a esquerda; ângulo 0 = frente,
+positivo para a esquerda (graus).
+"""
+
+import time
+import numpy as np
+
+from robot_geometry import camera_to_robot, deproject_depth, sensor_mount
+from robot_mapping import NAV_SECTORS
+
+
+class PolarObstacleHistogram:
+    """Histograma polar de obstáculos com uma camada por sensor"""
+
+    def __init__(self, bin_deg=2.0, max_range=5.0, min_height=0.05, max_height=0.6,
+                 max_age=0.5, min_points=3, depth_step=4):
+        self.bin_deg = bin_deg
+        self.num_bins = int(round(360.0 / bin_deg))
+        self.max_range = max_range
+        self.min_height = min_height    # abaixo disso é chão
+        self.max_height = max_height    # acima disso o robô passa por baixo
+        self.max_age = max_age          # s
+        self.min_points = min_points    # pontos por setor para aceitar a leitura (ruído)
+        self.depth_step = depth_step
+        self.centers = (np.arange(self.num_bins) + 0.5) * bin_deg - 180.0
+        self.layers = {}                # sensor -> (distâncias por setor, timestamp)
+
+    def reset(self):
+        self.layers = {}
+
+    def _bins(self, angles_deg):
+        idx = np.floor((np.asarray(angles_deg, dtype=np.float64) + 180.0) / self.bin_deg).astype(np.intp)
+        return idx % self.num_bins
+
+    def update(self, sensor, depth, depth_scale, intrinsics, timestamp=None, mount=None):
+        """Substitui a camada do sensor pela leitura deste frame de profundidade"""
+        points = deproject_depth(depth, depth_scale, intrinsics, step=self.depth_step,
+                                 max_range=self.max_range)
+        robot = camera_to_robot(points, mount or sensor_mount(sensor))
+        self.update_points(sensor, robot, timestamp)
+
+    def update_points(self, sensor, points, timestamp=None):
+        """Camada a partir de pontos (N, 3) já no referencial do robô"""
+        height = points[:, 2]
+        obstacle = points[(height > self.min_height) & (height < self.max_height)]
+        distances = np.full(self.num_bins, np.inf, dtype=np.float32)
+
+        if len(obstacle):
+            ranges = np.hypot(obstacle[:, 0], obstacle[:, 1])
+            bins = self._bins(np.degrees(np.arctan2(obstacle[:, 1], obstacle[:, 0])))
+            # Menor distância por setor: ordena por (setor, distância) e pega o primeiro
+            order = np.lexsort((ranges, bins))
+            bins, ranges = bins[order], ranges[order]
+            first = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+            counts = np.diff(np.r_[first, len(bins)])
+            keep = counts >= self.min_points
+            distances[bins[first[keep]]] = ranges[first[keep]]
+
+        self.layers[sensor] = (distances, timestamp if timestamp is not None else time.time())
+
+    def sensor_status(self, now=None):
+        """Idade (s) e se está vencida cada camada"""
+        now = now if now is not None else time.time()
+        return {sensor: {'age': round(now - stamp, 3), 'stale': now - stamp > self.max_age}
+                for sensor, (_, stamp) in self.layers.items()}
+
+    def fused(self, now=None):
+        """Menor distância por setor entre as camadas não vencidas (inf = livre/sem dados)"""
+        now = now if now is not None else time.time()
+        result = np.full(self.num_bins, np.inf, dtype=np.float32)
+        for distances, stamp in self.layers.values():
+            if now - stamp <= self.max_age:
+                np.minimum(result, distances, out=result)
+        return result
+
+    def distances(self, angles_deg, now=None):
+        """Distância fundida (m) em cada ângulo do array"""
+        return self.fused(now)[self._bins(angles_deg)]
+
+    def sector_distances(self, sectors=NAV_SECTORS, now=None, default=None):
+        """Menor distância em cada setor {nome: (ângulo_min, ângulo_max)}"""
+        fused = self.fused(now)
+        default = self.max_range if default is None else default
+        result = {}
+        for name, (low, high) in sectors.items():
+            inside = fused[(self.centers >= low) & (self.centers < high)]
+            nearest = float(inside.min()) if inside.size else np.inf
+            result[name] = nearest if np.isfinite(nearest) else default
+        return result
+
+    def to_obstacles(self, block_distance, now=None):
+        """Resumo no formato de height_obstacles (setores left/center/right)"""
+        now = now if now is not None else time.time()
+        distances = self.sector_distances(now=now)
+        fused = self.fused(now)
+        return {
+            'type': 'fusion',
+            'left': distances['left'] < block_distance,
+            'center': distances['center'] < block_distance,
+            'right': distances['right'] < block_distance,
+            'distances': distances,
+            'sensors': self.sensor_status(now),
+            'histogram': {
+                'bin_deg': self.bin_deg,
+                'ranges': np.round(np.where(np.isfinite(fused), fused, 0.0), 2).tolist(),
+            },
+        }
@@ -0,0 +1,284 @@
+"""
+Geometria dos sensores
+- Intrínsecos em dicionário (mesmo formato de robot_replay.intrinsics_to_dict)
+- DepthProjector: raios por pixel pré-calculados a partir dos intrínsecos,
+  então deprojetar pixels ou uma imagem inteira é uma multiplicação NumPy
+  (equivalente a rs2_deproject_pixel_to_point, sem chamadas ao SDK)
+- Deprojeção vetorizada de imagens de profundidade em nuvens de pontos
+- Profundidade robusta de caixas (percentil sobre a caixa interna), em lote
+- ColorToDepthMapper: leva pixels da imagem de cor ao depth bruto pelas
+  extrínsecas em cache, para não alinhar o frame inteiro (rs.align) quando
+  só os pixels das detecções precisam de profundidade
+- Montagem dos sensores no robô (extrínsecas, configuráveis por JSON) e
+  conversão câmera -> robô
+
+Convenções:
+    câmera: x para a direita, y para baixo, z para frente (RealSense)
+    robô:   x para frente, y para a esquerda, z para cima, origem no centro
+            do robô ao nível do chão
+"""
+
+import json
+import math
+import numpy as np
+
+# Posição (m), guinada (graus, positivo = para a esquerda) e inclinação
+# (graus, positivo = para baixo) de cada sensor no robô
+SENSOR_MOUNTS = {
+    'D435': {'x': 0.10, 'y': 0.0, 'z': 0.30, 'yaw': 0.0, 'pitch': 0.0},
+    'L515': {'x': 0.10, 'y': 0.0, 'z': 0.35, 'yaw': 0.0, 'pitch': 0.0},
+}
+DEFAULT_MOUNT = {'x': 0.0, 'y': 0.0, 'z': 0.30, 'yaw': 0.0, 'pitch': 0.0}
+
+
+def sensor_mount(name):
+    """Montagem do sensor pelo nome (ex.: 'L515', 'd435', 'camera')"""
+    key = (name or '').upper()
+    if key == 'CAMERA':
+        key = 'D435'
+    return SENSOR_MOUNTS.get(key, DEFAULT_MOUNT)
+
+
+class DepthProjector:
+    """Tabelas de raios (x/z, y/z) para cada pixel da imagem
+
+    Construído uma vez a partir dos intrínsecos (dicionário de
+    intrinsics_to_dict). Para o modelo Inverse Brown-Conrady (D400) aplica a
+    mesma correção de rs2_deproject_pixel_to_point; demais modelos são
+    tratados como pinhole (coeficientes ~0 no depth das RealSense).
+    """
+
+    def __init__(self, intrinsics, width=None, height=None):
+        width = int(width or intrinsics['width'])
+        height = int(height or intrinsics['height'])
+        # Intrínsecos se referem à resolução nativa: escala se a imagem difere
+        sx = width / float(intrinsics['width'])
+        sy = height / float(intrinsics['height'])
+        self.width, self.height = width, height
+
+        u = np.arange(width, dtype=np.float64)
+        v = np.arange(height, dtype=np.float64)
+        x = ((u - intrinsics['ppx'] * sx) / (intrinsics['fx'] * sx))[None, :].repeat(height, 0)
+        y = ((v - intrinsics['ppy'] * sy) / (intrinsics['fy'] * sy))[:, None].repeat(width, 1)
+
+        coeffs = list(intrinsics.get('coeffs') or [0.0] * 5)
+        if 'inverse_brown_conrady' in str(intrinsics.get('model', '')).lower() and any(coeffs):
+            r2 = x * x + y * y
+            f = 1 + coeffs[0] * r2 + coeffs[1] * r2 * r2 + coeffs[4] * r2 * r2 * r2
+            ux = x * f + 2 * coeffs[2] * x * y + coeffs[3] * (r2 + 2 * x * x)
+            uy = y * f + 2 * coeffs[3] * x * y + coeffs[2] * (r2 + 2 * y * y)
+            x, y = ux, uy
+
+        self.ray_x = x.astype(np.float32)
+        self.ray_y = y.astype(np.float32)
+
+    def deproject_pixels(self, u, v, z):
+        """Pontos (N, 3) para pixels (u, v) inteiros com profundidades z em metros"""
+        u = np.clip(np.asarray(u, dtype=np.intp), 0, self.width - 1)
+        v = np.clip(np.asarray(v, dtype=np.intp), 0, self.height - 1)
+        z = np.asarray(z, dtype=np.float32)
+        points = np.empty((z.size, 3), dtype=np.float32)
+        points[:, 0] = self.ray_x[v, u] * z
+        points[:, 1] = self.ray_y[v, u] * z
+        points[:, 2] = z
+        return points
+
+    def deproject_image(self, depth, depth_scale, step=1, min_range=0.1, max_range=5.0,
+                        return_pixels=False):
+        """Pontos (N, 3) da imagem de profundidade inteira, 1 a cada `step` pixels"""
+        z = depth[::step, ::step].astype(np.float32) * depth_scale
+        valid = (z > min_range) & (z < max_range)
+        z = z[valid]
+
+        points = np.empty((len(z), 3), dtype=np.float32)
+        points[:, 0] = self.ray_x[::step, ::step][valid] * z
+        points[:, 1] = self.ray_y[::step, ::step][valid] * z
+        points[:, 2] = z
+        if return_pixels:
+            rows, cols = np.nonzero(valid)
+            return points, (rows * step, cols * step)
+        return points
+
+
+_projectors = {}
+
+
+def projector_for(intrinsics, width=None, height=None):
+    """DepthProjector em cache para os intrínsecos e a resolução dados"""
+    key = (intrinsics['width'], intrinsics['height'], intrinsics['fx'], intrinsics['fy'],
+           intrinsics['ppx'], intrinsics['ppy'], str(intrinsics.get('model', '')),
+           tuple(intrinsics.get('coeffs') or ()), width, height)
+    projector = _projectors.get(key)
+    if projector is None:
+        if len(_projectors) >= 16:
+            _projectors.clear()
+        projector = _projectors[key] = DepthProjector(intrinsics, width, height)
+    return projector
+
+
+class ColorToDepthMapper:
+    """Profundidade do depth bruto (não alinhado) em pixels da imagem de cor
+
+    Mesma busca de rs2_project_color_pixel_to_depth_pixel, em lote: para cada
+    pixel de cor testa profundidades candidatas ao longo do raio (uniformes
+    em 1/z), leva cada ponto ao referencial do depth pelas extrínsecas
+    (dicionário de extrinsics_to_dict), projeta no depth e fica com a leitura
+    que melhor concorda com o candidato. Custa O(pixels x candidatos), contra
+    o frame inteiro reprojetado por rs.align.
+    """
+
+    def __init__(self, color_intrinsics, depth_intrinsics, extrinsics, depth_scale,
+                 min_depth=0.1, max_depth=10.0, candidates=32):
+        self.color = projector_for(color_intrinsics)
+        self.depth_intrinsics = depth_intrinsics
+        self.depth_scale = depth_scale
+        # rotation da RealSense é column-major
+        self.rotation = np.array(extrinsics['rotation'], dtype=np.float32).reshape(3, 3).T
+        self.translation = np.array(extrinsics['translation'], dtype=np.float32)
+        inverse = np.linspace(1.0 / min_depth, 1.0 / max_depth, candidates)
+        self.candidates = (1.0 / inverse).astype(np.float32)
+        self.inverse_step = abs(inverse[1] - inverse[0]) if candidates > 1 else np.inf
+
+    def depth_at(self, depth, u, v):
+        """Profundidade (m) nos pixels de cor (u, v); NaN sem correspondência válida"""
+        u = np.asarray(u)
+        shape = u.shape
+        u = np.clip(u.ravel().astype(np.intp), 0, self.color.width - 1)
+        v = np.clip(np.asarray(v).ravel().astype(np.intp), 0, self.color.height - 1)
+        if depth is None or u.size == 0:
+            return np.full(shape, np.nan, dtype=np.float32)
+
+        # Ponto candidato no depth: z * (R @ raio) + t, projetado por candidato (N, K)
+        rays = np.stack([self.color.ray_x[v, u], self.color.ray_y[v, u], np.ones(u.size, np.float32)], axis=1)
+        directions = rays @ self.rotation.T
+        zc = self.candidates[None, :]
+        x = directions[:, 0:1] * zc + self.translation[0]
+        y = directions[:, 1:2] * zc + self.translation[1]
+        z = directions[:, 2:3] * zc + self.translation[2]
+
+        height, width = depth.shape[:2]
+        intr = self.depth_intrinsics
+        sx = width / float(intr['width'])
+        sy = height / float(intr['height'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            du = np.rint(x / z * (intr['fx'] * sx) + intr['ppx'] * sx)
+            dv = np.rint(y / z * (intr['fy'] * sy) + intr['ppy'] * sy)
+        inside = (z > 0) & (du >= 0) & (du < width) & (dv >= 0) & (dv < height)
+        du = np.where(inside, du, 0).astype(np.intp)
+        dv = np.where(inside, dv, 0).astype(np.intp)
+
+        readings = depth[dv, du].astype(np.float32) * self.depth_scale
+        readings[~inside] = 0.0
+        # Erro em 1/z: os candidatos são uniformes nessa escala
+        with np.errstate(divide='ignore', invalid='ignore'):
+            error = np.abs(1.0 / readings - 1.0 / z)
+        error[readings <= 0] = np.inf
+        best = np.argmin(error, axis=1)
+        rows = np.arange(len(best))
+        result = readings[rows, best]
+        result[~(error[rows, best] <= self.inverse_step)] = np.nan
+        return result.reshape(shape)
+
+
+def load_sensor_mounts(path):
+    """Atualiza SENSOR_MOUNTS a partir de um JSON {"L515": {"z": 0.12, "pitch": 20}, ...}"""
+    with open(path) as f:
+        mounts = json.load(f)
+    for name, values in mounts.items():
+        mount = dict(SENSOR_MOUNTS.get(name.upper(), DEFAULT_MOUNT))
+        mount.update({key: float(value) for key, value in values.items()})
+        SENSOR_MOUNTS[name.upper()] = mount
+    return SENSOR_MOUNTS
+
+
+def deproject_depth(depth, depth_scale, intrinsics, step=4, min_range=0.1, max_range=5.0,
+                    return_pixels=False):
+    """Pontos 3D (N, 3) float32 no referencial da câmera
+
+    Usa uma amostra decimada (1 a cada `step` pixels) e descarta profundidades
+    fora de [min_range, max_range], com as tabelas de raios em cache
+    (projector_for). Com return_pixels=True devolve também (linhas, colunas)
+    de cada ponto na imagem original, para amostrar a cor.
+    """
+    if depth is None or not intrinsics:
+        empty = np.empty((0, 3), dtype=np.float32)
+        if return_pixels:
+            return empty, (np.empty(0, np.intp), np.empty(0, np.intp))
+        return empty
+
+    projector = projector_for(intrinsics, depth.shape[1], depth.shape[0])
+    return projector.deproject_image(depth, depth_scale, step, min_range, max_range, return_pixels)
+
+
+def sample_box_depths(depth, depth_scale, boxes, shrink=0.5, grid=7, percentile=40,
+                      min_range=0.1, max_range=10.0, tolerance=0.1, min_valid=3, mapper=None):
+    """Distância (m) e confiança [0, 1] de cada caixa (x1, y1, x2, y2), em lote
+
+    Amostra uma grade grid x grid na caixa interna (fração `shrink` da largura
+    e altura, em torno do centro), descarta buracos e leituras fora de
+    [min_range, max_range] e usa o percentil `percentile` das amostras
+    válidas: abaixo da mediana para favorecer o objeto quando a caixa pega
+    fundo. A confiança é a fração das amostras da grade que concorda com a
+    estimativa (até `tolerance` relativa, mínimo 5 cm), então buracos, bordas
+    e fundo misturado a reduzem. Caixas com menos de min_valid amostras
+    válidas recebem distância NaN e confiança 0.
+
+    Caixas em pixels da cor sobre um depth não alinhado: passe o
+    ColorToDepthMapper da câmera e só as amostras da grade são mapeadas.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    count = len(boxes)
+    if count == 0 or depth is None:
+        return np.full(count, np.nan, dtype=np.float32), np.zeros(count, dtype=np.float32)
+
+    height, width = (mapper.color.height, mapper.color.width) if mapper else depth.shape[:2]
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2.0
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2.0
+    half_w = (boxes[:, 2] - boxes[:, 0]) * shrink / 2.0
+    half_h = (boxes[:, 3] - boxes[:, 1]) * shrink / 2.0
+
+    # Grade de amostras (N, grid*grid) com uma única indexação
+    steps = np.linspace(-1.0, 1.0, grid, dtype=np.float32)
+    offset_x, offset_y = np.meshgrid(steps, steps)
+    u = np.clip(np.round(cx[:, None] + offset_x.ravel()[None, :] * half_w[:, None]), 0, width - 1).astype(np.intp)
+    v = np.clip(np.round(cy[:, None] + offset_y.ravel()[None, :] * half_h[:, None]), 0, height - 1).astype(np.intp)
+    if mapper is not None:
+        samples = mapper.depth_at(depth, u, v)
+    else:
+        samples = depth[v, u].astype(np.float32) * depth_scale
+
+    samples[~((samples > min_range) & (samples < max_range))] = np.inf  # NaN do mapper também
+    samples.sort(axis=1)
+    n_valid = np.isfinite(samples).sum(axis=1)
+    rank = np.clip(np.floor((n_valid - 1) * percentile / 100.0), 0, None).astype(np.intp)
+    distances = samples[np.arange(count), rank]
+
+    margin = np.maximum(distances * tolerance, 0.05)
+    with np.errstate(invalid='ignore'):  # inf - inf nas caixas sem amostras válidas
+        agree = (np.abs(samples - distances[:, None]) <= margin[:, None]).sum(axis=1)
+    confidence = agree / float(samples.shape[1])
+
+    invalid = n_valid < min_valid
+    distances[invalid] = np.nan
+    confidence[invalid] = 0.0
+    return distances, confidence.astype(np.float32)
+
+
+def camera_to_robot(points, mount):
+    """Converte pontos (N, 3) da câmera para o referencial do robô"""
+    yaw = math.radians(mount.get('yaw', 0.0))
+    pitch = math.radians(mount.get('pitch', 0.0))
+    forward = points[:, 2]
+    left = -points[:, 0]
+    up = -points[:, 1]
+    if pitch:
+        # Câmera inclinada para baixo: o eixo óptico aponta abaixo do horizonte
+        forward, up = (forward * math.cos(pitch) + up * math.sin(pitch),
+                       up * math.cos(pitch) - forward * math.sin(pitch))
+
+    result = np.empty_like(points)
+    cos_yaw, sin_yaw = math.cos(yaw), math.sin(yaw)
+    result[:, 0] = forward * cos_yaw - left * sin_yaw + mount.get('x', 0.0)
+    result[:, 1] = forward * sin_yaw + left * cos_yaw + mount.get('y', 0.0)
+    result[:, 2] = up + mount.get('z', 0.0)
+    return result
@@ -0,0 +1,92 @@
+"""
+Banco de filtros de Kalman vetorizado
+Todos os objetos rastreados compartilham arrays empilhados (struct-of-arrays):
+    x: (N, 4)     estado [cx, cy, vx, vy] em pixels e pixels/frame
+    P: (N, 4, 4)  covariância
+predict/update rodam para todos os tracks (ou um subconjunto) em uma única
+operação NumPy, em vez de um filterpy.KalmanFilter por objeto.
+
+Mesmo modelo do filtro por objeto usado antes (velocidade constante,
+P0 = 50·I, R = 1·I, Q = 0.01·I) e mesma atualização na forma de Joseph,
+então os resultados coincidem com o filterpy dentro da tolerância numérica
+(ver benchmark_perception.py, etapa kalman_bank).
+"""
+
+import numpy as np
+
+DIM_X = 4
+DIM_Z = 2
+
+
+class KalmanBank:
+    """Estados e covariâncias de todos os tracks em arrays empilhados"""
+
+    def __init__(self, capacity=32, p0=50.0, r=1.0, q=0.01):
+        self.F = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=np.float64)
+        self.H = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], dtype=np.float64)
+        self.Q = np.eye(DIM_X) * q
+        self.R = np.eye(DIM_Z) * r
+        self.p0 = p0
+        self._I = np.eye(DIM_X)
+
+        self.x = np.zeros((capacity, DIM_X))
+        self.P = np.zeros((capacity, DIM_X, DIM_X))
+        self.active = np.zeros(capacity, dtype=bool)
+        self._free = list(range(capacity - 1, -1, -1))
+
+    @property
+    def capacity(self):
+        return len(self.active)
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    def _grow(self):
+        old = self.capacity
+        new = max(1, old * 2)
+        self.x = np.concatenate([self.x, np.zeros((new - old, DIM_X))])
+        self.P = np.concatenate([self.P, np.zeros((new - old, DIM_X, DIM_X))])
+        self.active = np.concatenate([self.active, np.zeros(new - old, dtype=bool)])
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def allocate(self, cx, cy):
+        """Reserva um slot para um novo track centrado em (cx, cy)"""
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self.x[slot] = (cx, cy, 0.0, 0.0)
+        self.P[slot] = self._I * self.p0
+        self.active[slot] = True
+        return slot
+
+    def release(self, slot):
+        """Devolve o slot de um track removido"""
+        if self.active[slot]:
+            self.active[slot] = False
+            self._free.append(slot)
+
+    def predict(self, slots=None):
+        """x = F·x, P = F·P·Fᵀ + Q para os slots dados (padrão: todos ativos)"""
+        idx = np.flatnonzero(self.active) if slots is None else np.asarray(slots, dtype=np.intp)
+        if idx.size == 0:
+            return
+        self.x[idx] = self.x[idx] @ self.F.T
+        self.P[idx] = self.F @ self.P[idx] @ self.F.T + self.Q
+
+    def update(self, slots, measurements):
+        """Atualização em lote com medições (k, 2) de centro, forma de Joseph"""
+        idx = np.asarray(slots, dtype=np.intp)
+        if idx.size == 0:
+            return
+        z = np.asarray(measurements, dtype=np.float64).reshape(-1, DIM_Z)
+        x = self.x[idx]
+        P = self.P[idx]
+
+        y = z - x @ self.H.T                       # (k, 2) inovação
+        PHT = P @ self.H.T                         # (k, 4, 2)
+        S = self.H @ PHT + self.R                  # (k, 2, 2)
+        K = PHT @ np.linalg.inv(S)                 # (k, 4, 2)
+
+        self.x[idx] = x + (K @ y[..., None])[..., 0]
+        IKH = self._I - K @ self.H                 # (k, 4, 4)
+        self.P[idx] = IKH @ P @ IKH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
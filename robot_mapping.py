@@ -0,0 +1,609 @@
+"""
+Mapa de ocupação 2.5D a partir da profundidade das câmeras (L515 e D435)
+- RobotPose: pose estimada (x, y, θ) por dead reckoning dos comandos de motor
+  (o robô não tem odômetro; a calibração fica em LINEAR/ANGULAR_SPEED_PER_UNIT)
+- OccupancyGrid: grade de log-odds centrada no robô, com tamanho fixo
+  (rola quando o robô se afasta do centro, então a memória é constante)
+  * Cada frame vira uma varredura polar (menor distância de obstáculo por
+    ângulo) e as células são atualizadas com raios amostrados em NumPy:
+    livre ao longo do raio, ocupado no ponto final
+  * Guarda também a maior altura observada em cada célula (2.5D)
+  * Consultas baratas: distâncias por setor para o navegador e lista
+    compacta de células ocupadas para o frontend
+- VoxelMap: reconstrução 3D incremental em voxels guardados em slots de
+  arrays pré-alocados (com pilha de slots livres) e indexados por chave
+  int64 numa tabela de espalhamento com endereçamento aberto (VoxelIndex,
+  sondagem linear vetorizada). Média móvel de posição/cor por voxel,
+  descarte dos voxels fora de um raio em torno do robô e snapshots
+  reduzidos (Open3D) para a visualização 3D
+"""
+
+import math
+import threading
+import numpy as np
+
+try:
+    import open3d as o3d
+    OPEN3D_AVAILABLE = True
+except ImportError:
+    OPEN3D_AVAILABLE = False
+
+from robot_geometry import camera_to_robot, deproject_depth, sensor_mount
+
+# Calibração aproximada do dead reckoning (velocidade por unidade de PWM)
+LINEAR_SPEED_PER_UNIT = 0.002    # m/s  (PWM 100 ≈ 0,2 m/s)
+ANGULAR_SPEED_PER_UNIT = 0.01    # rad/s (PWM 60 ≈ 34°/s)
+
+# Decomposição de (m1, m2, m3) nos comandos básicos do RobotController:
+# frente (-1, 0, 1), esquerda (0, -1, 1) e giro anti-horário (-1, -1, -1)
+_MOTOR_BASIS = np.array([[-1, 0, -1],
+                         [0, -1, -1],
+                         [1, 1, -1]], dtype=np.float64)
+_MOTOR_BASIS_INV = np.linalg.inv(_MOTOR_BASIS)
+
+# Setores consultados pelo navegador (graus, positivo = esquerda)
+NAV_SECTORS = {
+    'left': (15.0, 45.0),
+    'center': (-15.0, 15.0),
+    'right': (-45.0, -15.0),
+}
+
+
+class RobotPose:
+    """Pose estimada do robô no referencial do mapa"""
+
+    def __init__(self):
+        self.x = 0.0
+        self.y = 0.0
+        self.theta = 0.0
+
+    def reset(self):
+        self.x = self.y = self.theta = 0.0
+
+    def copy(self):
+        pose = RobotPose()
+        pose.x, pose.y, pose.theta = self.x, self.y, self.theta
+        return pose
+
+    def apply_motors(self, m1, m2, m3, dt):
+        """Integra dt segundos com os motores no comando (m1, m2, m3)"""
+        if dt <= 0 or (m1 == 0 and m2 == 0 and m3 == 0):
+            return
+        forward, left, rotation = _MOTOR_BASIS_INV @ np.array([m1, m2, m3], dtype=np.float64)
+        vx = forward * LINEAR_SPEED_PER_UNIT
+        vy = left * LINEAR_SPEED_PER_UNIT
+        omega = rotation * ANGULAR_SPEED_PER_UNIT
+
+        heading = self.theta + omega * dt / 2.0
+        self.x += (vx * math.cos(heading) - vy * math.sin(heading)) * dt
+        self.y += (vx * math.sin(heading) + vy * math.cos(heading)) * dt
+        self.theta = (self.theta + omega * dt + math.pi) % (2 * math.pi) - math.pi
+
+    def to_dict(self):
+        return {'x': round(self.x, 3), 'y': round(self.y, 3), 'theta': round(self.theta, 3)}
+
+
+class OccupancyGrid:
+    """Grade de ocupação (log-odds) de tamanho fixo que acompanha o robô
+
+    A integração roda na thread do mapa e as consultas no loop asyncio:
+    `lock` mantém grade e origem consistentes entre as duas.
+    """
+
+    def __init__(self, resolution=0.05, size=12.0, max_range=5.0,
+                 min_height=0.05, max_height=1.5, l_occ=0.85, l_free=-0.4,
+                 l_min=-4.0, l_max=4.0, occupied_threshold=0.6, angle_step=1.0,
+                 depth_step=4):
+        self.resolution = resolution
+        self.cells = int(round(size / resolution))
+        self.max_range = max_range
+        self.min_height = min_height        # abaixo disso é chão (espaço livre)
+        self.max_height = max_height        # acima disso não bloqueia o robô
+        self.l_occ = l_occ
+        self.l_free = l_free
+        self.l_min = l_min
+        self.l_max = l_max
+        self.occupied_logodds = math.log(occupied_threshold / (1 - occupied_threshold))
+        self.angle_step = math.radians(angle_step)
+        self.depth_step = depth_step
+
+        self.logodds = np.zeros((self.cells, self.cells), dtype=np.float32)
+        self.heights = np.zeros((self.cells, self.cells), dtype=np.float16)
+        # Canto (x, y) da célula [0, 0] no referencial do mapa
+        self.origin = np.array([-size / 2.0, -size / 2.0])
+        self.updates = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.logodds.fill(0)
+            self.heights.fill(0)
+            self.origin = np.array([-self.cells * self.resolution / 2.0] * 2)
+            self.updates = 0
+
+    # ---- Janela rolante -------------------------------------------------
+
+    def _recenter(self, pose):
+        """Rola a grade quando o robô se afasta mais de 1/4 do centro"""
+        half = self.cells * self.resolution / 2.0
+        center = self.origin + half
+        if abs(pose.x - center[0]) < half / 2 and abs(pose.y - center[1]) < half / 2:
+            return
+        shift_x = int(round((pose.x - center[0]) / self.resolution))
+        shift_y = int(round((pose.y - center[1]) / self.resolution))
+        self.logodds = self._shift(self.logodds, shift_x, shift_y)
+        self.heights = self._shift(self.heights, shift_x, shift_y)
+        self.origin = self.origin + np.array([shift_x, shift_y]) * self.resolution
+
+    def _shift(self, grid, shift_x, shift_y):
+        """Desloca o conteúdo (índices [y, x]) e preenche o que entra com 0"""
+        n = self.cells
+        shifted = np.zeros_like(grid)
+        if abs(shift_x) >= n or abs(shift_y) >= n:
+            return shifted
+        src_x = slice(max(shift_x, 0), n + min(shift_x, 0))
+        dst_x = slice(max(-shift_x, 0), n + min(-shift_x, 0))
+        src_y = slice(max(shift_y, 0), n + min(shift_y, 0))
+        dst_y = slice(max(-shift_y, 0), n + min(-shift_y, 0))
+        shifted[dst_y, dst_x] = grid[src_y, src_x]
+        return shifted
+
+    def _to_cells(self, wx, wy):
+        ix = np.floor((wx - self.origin[0]) / self.resolution).astype(np.intp)
+        iy = np.floor((wy - self.origin[1]) / self.resolution).astype(np.intp)
+        return ix, iy
+
+    # ---- Integração ------------------------------------------------------
+
+    def integrate_depth(self, depth, depth_scale, intrinsics, sensor, pose):
+        """Deprojeta um frame de profundidade e integra no mapa"""
+        points = deproject_depth(depth, depth_scale, intrinsics, step=self.depth_step,
+                                 max_range=self.max_range)
+        if len(points) == 0:
+            return 0
+        mount = sensor_mount(sensor)
+        self.integrate_points(camera_to_robot(points, mount), pose, (mount['x'], mount['y']))
+        return len(points)
+
+    def integrate_points(self, points, pose, sensor_xy=(0.0, 0.0)):
+        """Integra pontos (N, 3) no referencial do robô
+
+        Os pontos viram uma varredura polar em torno do sensor: por ângulo, a
+        menor distância de obstáculo (altura entre min_height e max_height)
+        ou, sem obstáculo, a maior distância de chão visto (espaço livre).
+        """
+        with self.lock:
+            self._integrate_points(points, pose, sensor_xy)
+
+    def _integrate_points(self, points, pose, sensor_xy):
+        self._recenter(pose)
+
+        dx = points[:, 0] - sensor_xy[0]
+        dy = points[:, 1] - sensor_xy[1]
+        heights = points[:, 2]
+        ranges = np.hypot(dx, dy)
+        angles = np.arctan2(dy, dx)
+
+        bins = np.floor(angles / self.angle_step).astype(np.intp)
+        offset = bins.min()
+        bins -= offset
+        n_bins = int(bins.max()) + 1
+
+        obstacle = (heights > self.min_height) & (heights < self.max_height) & (ranges < self.max_range)
+        floor = heights <= self.min_height
+
+        hit_range = np.full(n_bins, np.inf)
+        np.minimum.at(hit_range, bins[obstacle], ranges[obstacle])
+        hit_height = np.zeros(n_bins)
+        free_range = np.zeros(n_bins)
+        np.maximum.at(free_range, bins[floor], ranges[floor])
+
+        has_hit = np.isfinite(hit_range)
+        if has_hit.any():
+            # Altura do obstáculo mais próximo em cada ângulo
+            near = obstacle & (ranges <= hit_range[bins] + self.resolution)
+            np.maximum.at(hit_height, bins[near], heights[near])
+
+        ray_length = np.where(has_hit, hit_range, np.minimum(free_range, self.max_range))
+        active = ray_length > 0
+        if not active.any():
+            return
+
+        ray_angles = ((np.flatnonzero(active) + offset) + 0.5) * self.angle_step
+        ray_length = ray_length[active]
+        ray_hit = has_hit[active]
+        ray_height = hit_height[active]
+
+        # Referencial do mapa
+        cos_t, sin_t = math.cos(pose.theta), math.sin(pose.theta)
+        sx = pose.x + sensor_xy[0] * cos_t - sensor_xy[1] * sin_t
+        sy = pose.y + sensor_xy[0] * sin_t + sensor_xy[1] * cos_t
+        world_angles = ray_angles + pose.theta
+
+        # Amostras livres ao longo dos raios (até meia célula antes do fim)
+        steps = np.arange(0.0, self.max_range, self.resolution)
+        samples = steps[None, :] < (ray_length[:, None] - self.resolution / 2)
+        sample_r = np.broadcast_to(steps[None, :], samples.shape)[samples]
+        sample_a = np.broadcast_to(world_angles[:, None], samples.shape)[samples]
+        free_x, free_y = self._to_cells(sx + sample_r * np.cos(sample_a), sy + sample_r * np.sin(sample_a))
+        self._add(free_x, free_y, self.l_free)
+
+        # Pontos finais com obstáculo
+        hit_r = ray_length[ray_hit]
+        hit_a = world_angles[ray_hit]
+        hit_x, hit_y = self._to_cells(sx + hit_r * np.cos(hit_a), sy + hit_r * np.sin(hit_a))
+        flat = self._add(hit_x, hit_y, self.l_occ)
+        if flat is not None and len(flat):
+            inside = self._inside(hit_x, hit_y)
+            np.maximum.at(self.heights.reshape(-1), hit_y[inside] * self.cells + hit_x[inside],
+                          ray_height[ray_hit][inside].astype(np.float16))
+
+        np.clip(self.logodds, self.l_min, self.l_max, out=self.logodds)
+        self.updates += 1
+
+    def _inside(self, ix, iy):
+        return (ix >= 0) & (ix < self.cells) & (iy >= 0) & (iy < self.cells)
+
+    def _add(self, ix, iy, value):
+        """Soma `value` uma vez em cada célula tocada"""
+        inside = self._inside(ix, iy)
+        if not inside.any():
+            return None
+        flat = np.unique(iy[inside] * self.cells + ix[inside])
+        self.logodds.reshape(-1)[flat] += value
+        return flat
+
+    # ---- Consultas -------------------------------------------------------
+
+    def probabilities(self):
+        return 1.0 / (1.0 + np.exp(-self.logodds))
+
+    def ray_distances(self, pose, angles, max_range=None):
+        """Distância até a primeira célula ocupada em cada ângulo (relativo ao robô)"""
+        max_range = max_range or self.max_range
+        angles = np.asarray(angles, dtype=np.float64) + pose.theta
+        steps = np.arange(self.resolution, max_range, self.resolution / 2)
+        wx = pose.x + steps[None, :] * np.cos(angles)[:, None]
+        wy = pose.y + steps[None, :] * np.sin(angles)[:, None]
+        ix, iy = self._to_cells(wx, wy)
+        inside = self._inside(ix, iy)
+        occupied = np.zeros(ix.shape, dtype=bool)
+        occupied[inside] = self.logodds[iy[inside], ix[inside]] > self.occupied_logodds
+        first = np.where(occupied.any(axis=1), occupied.argmax(axis=1), -1)
+        return np.where(first >= 0, steps[np.maximum(first, 0)], max_range)
+
+    def sector_distances(self, pose, sectors=NAV_SECTORS, rays_per_sector=7, max_range=None):
+        """Menor distância ocupada em cada setor (mesmas chaves do ObstacleDetector)"""
+        result = {}
+        with self.lock:
+            for name, (start, end) in sectors.items():
+                angles = np.radians(np.linspace(start, end, rays_per_sector))
+                result[name] = round(float(self.ray_distances(pose, angles, max_range).min()), 2)
+        return result
+
+    def to_message(self, pose, max_cells=4000):
+        """Células ocupadas para o frontend: [x, y, altura] em metros"""
+        with self.lock:
+            iy, ix = np.nonzero(self.logodds > self.occupied_logodds)
+            if len(ix) > max_cells:
+                order = np.argsort(-self.logodds[iy, ix])[:max_cells]
+                iy, ix = iy[order], ix[order]
+            x = self.origin[0] + (ix + 0.5) * self.resolution
+            y = self.origin[1] + (iy + 0.5) * self.resolution
+            h = self.heights[iy, ix].astype(np.float32)
+        cells = np.round(np.stack([x, y, h], axis=1), 2)
+        return {
+            'type': 'occupancy_grid',
+            'resolution': self.resolution,
+            'size': self.cells * self.resolution,
+            'pose': pose.to_dict(),
+            'cells': cells.tolist()
+        }
+
+
+# Empacotamento de (ix, iy, iz) em um int64: 21 bits por eixo, com offset
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+# Marcadores da tabela de espalhamento (chaves válidas são >= 0)
+_EMPTY = -1
+_DELETED = -2
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class VoxelIndex:
+    """Tabela de espalhamento chave -> slot com endereçamento aberto, vetorizada
+
+    Sondagem linear feita em lote com NumPy: cada rodada trata todas as
+    chaves que ainda não encontraram a sua posição. Remoções deixam
+    marcadores (_DELETED) para não quebrar as cadeias de sondagem; a tabela
+    é reconstruída quando ocupados + marcadores passam de metade.
+    """
+
+    def __init__(self, capacity=16384):
+        self.count = 0
+        self._allocate(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, capacity):
+        size = 1 << max(4, int(2 * capacity - 1).bit_length())  # carga <= 1/2
+        self.table_keys = np.full(size, _EMPTY, dtype=np.int64)
+        self.table_slots = np.zeros(size, dtype=np.int64)
+        self.filled = 0   # posições ocupadas ou com marcador
+        self.shift = np.uint64(64 - (size.bit_length() - 1))
+
+    def _hash(self, keys):
+        # Hash multiplicativo (Fibonacci): bits altos do produto módulo 2^64
+        return ((keys.astype(np.uint64) * _HASH_MULTIPLIER) >> self.shift).astype(np.int64)
+
+    def _find(self, keys):
+        """Posição na tabela de cada chave (-1 se ausente)"""
+        mask = len(self.table_keys) - 1
+        found = np.full(len(keys), -1, dtype=np.int64)
+        todo = np.arange(len(keys))
+        pos = self._hash(keys)
+        while len(todo):
+            stored = self.table_keys[pos]
+            hit = stored == keys[todo]
+            found[todo[hit]] = pos[hit]
+            more = ~hit & (stored != _EMPTY)
+            todo, pos = todo[more], (pos[more] + 1) & mask
+        return found
+
+    def lookup(self, keys):
+        """Slot de cada chave (-1 se ausente)"""
+        pos = self._find(keys)
+        return np.where(pos >= 0, self.table_slots[pos], -1)
+
+    def insert(self, keys, slots):
+        """Insere chaves únicas que ainda não estão na tabela"""
+        if 2 * (self.filled + len(keys)) > len(self.table_keys):
+            self._rebuild(self.count + len(keys))
+        mask = len(self.table_keys) - 1
+        todo = np.arange(len(keys))
+        pos = self._hash(keys)
+        while len(todo):
+            free = np.flatnonzero(self.table_keys[pos] == _EMPTY)
+            # Várias chaves na mesma posição livre: a primeira fica, as outras seguem sondando
+            _, first = np.unique(pos[free], return_index=True)
+            won = free[first]
+            self.table_keys[pos[won]] = keys[todo[won]]
+            self.table_slots[pos[won]] = slots[todo[won]]
+            rest = np.ones(len(todo), dtype=bool)
+            rest[won] = False
+            todo, pos = todo[rest], (pos[rest] + 1) & mask
+        self.count += len(keys)
+        self.filled += len(keys)
+
+    def remove(self, keys):
+        pos = self._find(keys)
+        pos = pos[pos >= 0]
+        self.table_keys[pos] = _DELETED
+        self.count -= len(pos)
+
+    def _rebuild(self, capacity):
+        live = self.table_keys >= 0
+        keys, slots = self.table_keys[live], self.table_slots[live]
+        self._allocate(max(capacity, 2 * len(keys)))
+        self.count = 0
+        self.insert(keys, slots)
+
+
+class VoxelMap:
+    """Nuvem de pontos acumulada em voxels com memória limitada
+
+    Cada voxel guarda a média das posições e cores dos pontos que caíram
+    nele (contagem saturada em max_weight, para o voxel continuar se
+    adaptando). Voxels a mais de `radius` do robô são descartados e o total
+    fica limitado a `max_voxels`, então a memória não cresce com a exploração.
+
+    Os voxels ficam em slots de arrays pré-alocados (`used` marca os
+    ocupados); `index` (VoxelIndex) mapeia chave -> slot e os slots
+    liberados pela evicção voltam para uma pilha de livres. Integrar um
+    frame custa proporcional aos voxels do frame, não ao tamanho do mapa.
+    """
+
+    def __init__(self, voxel_size=0.05, radius=6.0, max_voxels=200000, max_weight=50,
+                 depth_step=4, max_range=5.0, evict_every=10, initial_capacity=16384):
+        self.voxel_size = voxel_size
+        self.radius = radius
+        self.max_voxels = max_voxels
+        self.max_weight = max_weight
+        self.depth_step = depth_step
+        self.max_range = max_range
+        self.evict_every = evict_every
+        self.evict_low_water = 0.9
+        self.initial_capacity = initial_capacity
+        self.reset()
+
+    def reset(self):
+        capacity = self.initial_capacity
+        self.index = VoxelIndex(capacity)                      # chave -> slot
+        self.keys = np.zeros(capacity, dtype=np.int64)
+        self.points = np.zeros((capacity, 3), dtype=np.float32)  # média por voxel (mapa)
+        self.colors = np.zeros((capacity, 3), dtype=np.float32)  # média RGB 0..1
+        self.weights = np.zeros(capacity, dtype=np.uint16)
+        self.used = np.zeros(capacity, dtype=bool)
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int64)  # pilha de slots livres
+        self.free_count = capacity
+        self.integrations = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def _keys(self, points, voxel_size=None):
+        idx = np.floor(points / (voxel_size or self.voxel_size)).astype(np.int64) + _KEY_OFFSET
+        idx &= _KEY_MASK
+        return (idx[:, 0] << (2 * _KEY_BITS)) | (idx[:, 1] << _KEY_BITS) | idx[:, 2]
+
+    def _active(self):
+        """Slots ocupados, em ordem crescente"""
+        return np.flatnonzero(self.used)
+
+    def _grow(self, needed):
+        """Dobra a capacidade (ou mais, se `needed` slots novos não couberem)"""
+        capacity = len(self.used)
+        new_capacity = max(2 * capacity, len(self.index) + needed)
+        for name in ('keys', 'points', 'colors', 'weights', 'used'):
+            old = getattr(self, name)
+            grown = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:capacity] = old
+            setattr(self, name, grown)
+        free = np.empty(new_capacity, dtype=np.int64)
+        free[:self.free_count] = self.free[:self.free_count]
+        added = new_capacity - capacity
+        free[self.free_count:self.free_count + added] = np.arange(new_capacity - 1, capacity - 1, -1)
+        self.free = free
+        self.free_count += added
+
+    def _allocate(self, count):
+        if count > self.free_count:
+            self._grow(count)
+        self.free_count -= count
+        return self.free[self.free_count:self.free_count + count].copy()
+
+    def _release(self, slots):
+        self.index.remove(self.keys[slots])
+        self.used[slots] = False
+        self.weights[slots] = 0
+        self.free[self.free_count:self.free_count + len(slots)] = slots
+        self.free_count += len(slots)
+
+    def integrate_depth(self, depth, depth_scale, intrinsics, sensor, pose, color=None):
+        """Deprojeta um frame (cor opcional, alinhada ao depth) e integra no mapa"""
+        points, (rows, cols) = deproject_depth(depth, depth_scale, intrinsics, step=self.depth_step,
+                                               max_range=self.max_range, return_pixels=True)
+        if len(points) == 0:
+            return 0
+        robot = camera_to_robot(points, sensor_mount(sensor))
+
+        colors = None
+        if color is not None and color.shape[:2] == depth.shape[:2]:
+            # BGR (OpenCV) -> RGB 0..1
+            colors = color[rows, cols][:, ::-1].astype(np.float32) / 255.0
+
+        self.integrate_points(robot, pose, colors)
+        return len(points)
+
+    def integrate_points(self, points, pose, colors=None):
+        """Integra pontos (N, 3) no referencial do robô"""
+        cos_t, sin_t = math.cos(pose.theta), math.sin(pose.theta)
+        world = np.empty_like(points, dtype=np.float32)
+        world[:, 0] = pose.x + points[:, 0] * cos_t - points[:, 1] * sin_t
+        world[:, 1] = pose.y + points[:, 0] * sin_t + points[:, 1] * cos_t
+        world[:, 2] = points[:, 2]
+        if colors is None:
+            # Sem cor: tons de cinza pela altura
+            shade = np.clip(0.3 + points[:, 2] / 3.0, 0.3, 1.0).astype(np.float32)
+            colors = np.repeat(shade[:, None], 3, axis=1)
+
+        # Médias por voxel dentro do frame
+        keys, inverse, counts = np.unique(self._keys(world), return_inverse=True, return_counts=True)
+        frame_points = np.stack([np.bincount(inverse, world[:, i], len(keys)) for i in range(3)], axis=1)
+        frame_colors = np.stack([np.bincount(inverse, colors[:, i], len(keys)) for i in range(3)], axis=1)
+        frame_points /= counts[:, None]
+        frame_colors /= counts[:, None]
+
+        # Voxels já existentes: média móvel ponderada pela contagem
+        slots = self.index.lookup(keys)
+        existing = slots >= 0
+        if existing.any():
+            at = slots[existing]
+            old_w = self.weights[at].astype(np.float64)
+            new_w = counts[existing].astype(np.float64)
+            alpha = (new_w / (old_w + new_w))[:, None]
+            self.points[at] += (alpha * (frame_points[existing] - self.points[at])).astype(np.float32)
+            self.colors[at] += (alpha * (frame_colors[existing] - self.colors[at])).astype(np.float32)
+            self.weights[at] = np.minimum(old_w + new_w, self.max_weight).astype(np.uint16)
+
+        # Voxels novos: slots da pilha de livres
+        new = ~existing
+        if new.any():
+            new_keys = keys[new]
+            at = self._allocate(len(new_keys))
+            self.keys[at] = new_keys
+            self.points[at] = frame_points[new]
+            self.colors[at] = frame_colors[new]
+            self.weights[at] = np.minimum(counts[new], self.max_weight)
+            self.used[at] = True
+            self.index.insert(new_keys, at)
+
+        self.integrations += 1
+        if self.integrations % self.evict_every == 0 or len(self.index) > self.max_voxels:
+            self.evict(pose)
+
+    def evict(self, pose):
+        """Descarta voxels fora do raio e, acima do limite, os de menor peso
+
+        Acima de max_voxels corta até `evict_low_water` do limite, para o
+        corte (O(N)) não se repetir a cada frame com o mapa cheio.
+        """
+        slots = self._active()
+        points = self.points[slots]
+        dist = np.hypot(points[:, 0] - pose.x, points[:, 1] - pose.y)
+        keep = dist <= self.radius
+        if keep.sum() > self.max_voxels:
+            # Mantém os mais observados (desempate: mais próximos; dist <= radius << 1000)
+            target = int(self.max_voxels * self.evict_low_water)
+            score = np.where(keep, self.weights[slots] * 1000.0 - dist, -np.inf)
+            keep = np.zeros(len(slots), dtype=bool)
+            keep[np.argpartition(-score, target)[:target]] = True
+        if not keep.all():
+            self._release(slots[~keep])
+
+    def snapshot(self, max_points=20000, voxel_size=None, cloud=None):
+        """Pontos/cores (float32) reduzidos para exportação
+
+        Com Open3D usa voxel_down_sample (sobre `cloud`, se já preenchida por
+        to_open3d); senão amostra os voxels mais observados.
+        """
+        slots = self._active()
+        points, colors = self.points[slots], self.colors[slots]
+        downsampled = False
+        if OPEN3D_AVAILABLE and voxel_size and len(points):
+            cloud = (cloud if cloud is not None else self.to_open3d()).voxel_down_sample(voxel_size)
+            points = np.asarray(cloud.points, dtype=np.float32)
+            colors = np.asarray(cloud.colors, dtype=np.float32)
+            downsampled = True
+        if len(points) > max_points:
+            if not downsampled:
+                order = np.argsort(-self.weights[slots].astype(np.int64), kind='stable')[:max_points]
+            else:
+                order = np.linspace(0, len(points) - 1, max_points).astype(np.intp)
+            points, colors = points[order], colors[order]
+        return points, colors
+
+    def sample(self, voxel_size=0.1, max_points=5000):
+        """Amostra em voxels maiores com identidade estável (streaming)
+
+        Retorna (chaves ordenadas, pontos, cores): média dos voxels em cada
+        célula de `voxel_size`. Acima de max_points ficam as células mais
+        observadas. As chaves permitem enviar só as diferenças entre amostras.
+        """
+        if not len(self.index):
+            return np.empty(0, np.int64), np.empty((0, 3), np.float32), np.empty((0, 3), np.float32)
+        slots = self._active()
+        voxel_points = self.points[slots]
+        voxel_colors = self.colors[slots]
+        keys, inverse = np.unique(self._keys(voxel_points, voxel_size), return_inverse=True)
+        weight = np.bincount(inverse, self.weights[slots], len(keys))
+        points = np.stack([np.bincount(inverse, voxel_points[:, i], len(keys)) for i in range(3)], axis=1)
+        colors = np.stack([np.bincount(inverse, voxel_colors[:, i], len(keys)) for i in range(3)], axis=1)
+        counts = np.bincount(inverse, minlength=len(keys))[:, None]
+        points, colors = points / counts, colors / counts
+        if len(keys) > max_points:
+            keep = np.sort(np.argpartition(-weight, max_points)[:max_points])
+            keys, points, colors = keys[keep], points[keep], colors[keep]
+        return keys, points.astype(np.float32), colors.astype(np.float32)
+
+    def to_open3d(self, cloud=None):
+        """Preenche (ou cria) um o3d.geometry.PointCloud com os voxels"""
+        if cloud is None:
+            cloud = o3d.geometry.PointCloud()
+        slots = self._active()
+        cloud.points = o3d.utility.Vector3dVector(self.points[slots].astype(np.float64))
+        cloud.colors = o3d.utility.Vector3dVector(np.clip(self.colors[slots], 0, 1).astype(np.float64))
+        return cloud
@@ -0,0 +1,175 @@
+"""
+Métricas de latência do servidor
+- RollingHistogram: janela circular (NumPy) com as últimas N amostras de
+  uma etapa, com percentis calculados só quando alguém pede o snapshot
+- MetricsRegistry: timers por etapa, contadores e gauges
+- Exposição como mensagem WebSocket 'metrics' (snapshot) e como texto no
+  formato Prometheus, servido por um HTTP mínimo em asyncio
+"""
+
+import asyncio
+import time
+import numpy as np
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class RollingHistogram:
+    """Últimas `size` amostras (segundos) de uma etapa + totais acumulados"""
+
+    def __init__(self, size=512):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.size = size
+        self.index = 0
+        self.filled = 0
+        self.count = 0      # total desde o início (para Prometheus)
+        self.total = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.samples[self.index] = seconds
+        self.index = (self.index + 1) % self.size
+        if self.filled < self.size:
+            self.filled += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def quantiles(self, qs=QUANTILES):
+        if self.filled == 0:
+            return [0.0 for _ in qs]
+        return [float(v) for v in np.quantile(self.samples[:self.filled], qs)]
+
+
+class _StageTimer:
+    """Context manager leve: mede o bloco e registra na etapa"""
+
+    __slots__ = ('registry', 'stage', 'start')
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """Registro de latências por etapa, contadores e gauges"""
+
+    def __init__(self, window=512, prefix='robot'):
+        self.window = window
+        self.prefix = prefix
+        self.stages = {}     # etapa -> RollingHistogram
+        self.counters = {}   # nome -> int
+        self.gauges = {}     # nome -> float
+        self.started = time.time()
+
+    def time(self, stage):
+        """with metrics.time('encode'): ..."""
+        return _StageTimer(self, stage)
+
+    def observe(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = RollingHistogram(self.window)
+        histogram.add(seconds)
+
+    def increment(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        """Resumo em ms para a mensagem WebSocket 'metrics'"""
+        stages = {}
+        # list(): a thread do mapa registra etapas enquanto outra lê
+        for stage, histogram in list(self.stages.items()):
+            p50, p90, p99 = histogram.quantiles()
+            stages[stage] = {
+                'last_ms': round(histogram.last * 1000, 3),
+                'p50_ms': round(p50 * 1000, 3),
+                'p90_ms': round(p90 * 1000, 3),
+                'p99_ms': round(p99 * 1000, 3),
+                'count': histogram.count
+            }
+        return {
+            'uptime': round(time.time() - self.started, 1),
+            'stages': stages,
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges)
+        }
+
+    def to_prometheus(self, clients=None):
+        """Texto no formato de exposição do Prometheus"""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_latency_seconds Latência por etapa do loop de sensores",
+            f"# TYPE {p}_stage_latency_seconds summary"
+        ]
+        for stage, histogram in list(self.stages.items()):
+            for q, value in zip(QUANTILES, histogram.quantiles()):
+                lines.append(f'{p}_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{p}_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+            lines.append(f'{p}_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        for counter, value in list(self.counters.items()):
+            lines.append(f"# TYPE {p}_{counter}_total counter")
+            lines.append(f"{p}_{counter}_total {value}")
+
+        for gauge, value in list(self.gauges.items()):
+            lines.append(f"# TYPE {p}_{gauge} gauge")
+            lines.append(f"{p}_{gauge} {value}")
+
+        if clients:
+            lines.append(f"# TYPE {p}_client_queue_depth gauge")
+            for client in clients:
+                lines.append(f'{p}_client_queue_depth{{client="{client["client"]}"}} {client["queue_depth"]}')
+            lines.append(f"# TYPE {p}_client_dropped_frames_total counter")
+            for client in clients:
+                lines.append(f'{p}_client_dropped_frames_total{{client="{client["client"]}"}} {client["dropped_frames"]}')
+
+        return "\n".join(lines) + "\n"
+
+
+async def serve_prometheus(render, host='0.0.0.0', port=9108):
+    """Servidor HTTP mínimo: GET /metrics devolve render() em texto"""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Descarta os cabeçalhos
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if not line or line in (b'\r\n', b'\n'):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                body = render().encode('utf-8')
+                status = '200 OK'
+            else:
+                body = b'not found\n'
+                status = '404 Not Found'
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"✓ Métricas Prometheus em http://{host}:{port}/metrics")
+    return server
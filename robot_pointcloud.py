@@ -0,0 +1,119 @@
+"""
+Streaming binário da nuvem de pontos para a interface (canal 'point_cloud')
+- XYZ quantizados em int16 (1 cm, relativos à origem do keyframe) e cor
+  opcional em RGB565: 8 bytes por ponto, contra ~40 em listas JSON
+- Keyframe: conjunto completo; delta: pontos novos + índices do keyframe que
+  sumiram, sempre em relação ao último keyframe. Um delta descartado por um
+  cliente atrasado não corrompe os seguintes
+- Identidade dos pontos = chave do voxel (VoxelMap.sample), então pontos
+  que continuam no mapa não são reenviados
+
+Formato 'pc16' (little-endian), um frame binário logo após o cabeçalho JSON:
+    int16[count, 3]   XYZ: ponto = origin + xyz * scale
+    uint16[count]     RGB565 (só se header['color'])
+    uint32[removed]   índices do keyframe removidos (só em deltas)
+"""
+
+import numpy as np
+
+INT16_LIMIT = 32767
+
+
+def rgb565(colors):
+    """Cores RGB 0..1 (N, 3) -> uint16 RGB565"""
+    c = np.clip(colors, 0.0, 1.0)
+    r = np.round(c[:, 0] * 31).astype(np.uint16)
+    g = np.round(c[:, 1] * 63).astype(np.uint16)
+    b = np.round(c[:, 2] * 31).astype(np.uint16)
+    return (r << 11) | (g << 5) | b
+
+
+class PointCloudEncoder:
+    """Codifica amostras sucessivas da nuvem em keyframes e deltas 'pc16'"""
+
+    def __init__(self, scale=0.01, keyframe_every=10, max_delta_ratio=0.5, color=True):
+        self.scale = scale
+        self.keyframe_every = keyframe_every      # deltas entre keyframes
+        self.max_delta_ratio = max_delta_ratio    # delta maior que isso vira keyframe
+        self.color = color
+        self.keyframe_id = 0
+        self.keys = None                          # chaves do keyframe (ordenadas)
+        self.origin = np.zeros(3)
+        self.deltas = 0
+        self._force = True
+
+    def request_keyframe(self):
+        """Próxima atualização será um keyframe (cliente novo, mapa limpo)"""
+        self._force = True
+
+    def _quantize(self, points):
+        q = np.round((points - self.origin) / self.scale)
+        if len(q) and np.abs(q).max() > INT16_LIMIT:
+            return None
+        return q.astype('<i2')
+
+    def encode(self, keys, points, colors=None, pose=None):
+        """(cabeçalho, bytes) para a amostra atual
+
+        keys: chaves int64 ordenadas (uma por ponto); points: (N, 3) no
+        referencial do mapa; colors: (N, 3) RGB 0..1 ou None.
+        """
+        keyframe = self._force or self.keys is None or self.deltas >= self.keyframe_every
+        added = removed = None
+
+        if not keyframe:
+            # Diferença de conjuntos entre chaves ordenadas
+            pos = np.searchsorted(self.keys, keys)
+            known = pos < len(self.keys)
+            known[known] = self.keys[pos[known]] == keys[known]
+            added = np.flatnonzero(~known)
+            kept = np.zeros(len(self.keys), dtype=bool)
+            kept[pos[known]] = True
+            removed = np.flatnonzero(~kept).astype('<u4')
+            if len(added) + len(removed) > self.max_delta_ratio * max(len(keys), 1):
+                keyframe = True
+
+        xyz = None
+        if not keyframe:
+            xyz = self._quantize(points[added])
+            keyframe = xyz is None  # robô se afastou demais da origem do keyframe
+
+        if keyframe:
+            self.keyframe_id += 1
+            self.keys = np.array(keys, dtype=np.int64)
+            self.origin = np.array([points[:, 0].mean(), points[:, 1].mean(), 0.0]).round(2) \
+                if len(points) else np.zeros(3)
+            self.deltas = 0
+            self._force = False
+            added = np.arange(len(keys))
+            removed = np.empty(0, dtype='<u4')
+            xyz = self._quantize(points)
+            if xyz is None:
+                xyz = np.clip(np.round((points - self.origin) / self.scale),
+                              -INT16_LIMIT, INT16_LIMIT).astype('<i2')
+        else:
+            self.deltas += 1
+
+        with_color = self.color and colors is not None
+        parts = [xyz.tobytes()]
+        if with_color:
+            parts.append(rgb565(colors[added]).astype('<u2').tobytes())
+        parts.append(removed.tobytes())
+        payload = b''.join(parts)
+
+        header = {
+            'type': 'point_cloud',
+            'format': 'pc16',
+            'keyframe': bool(keyframe),
+            'keyframe_id': self.keyframe_id,
+            'origin': [float(v) for v in self.origin],
+            'scale': self.scale,
+            'count': int(len(xyz)),
+            'removed': int(len(removed)),
+            'color': bool(with_color),
+            'total': int(len(keys)),
+            'binary': [{'stream': 'point_cloud', 'format': 'pc16', 'size': len(payload)}],
+        }
+        if pose is not None:
+            header['pose'] = pose.to_dict()
+        return header, payload
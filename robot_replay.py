@@ -0,0 +1,292 @@
+"""
+Gravação e replay de sessões RealSense sem hardware
+- SessionRecorder grava framesets (color/depth, alinhados ou com o depth
+  bruto + extrínsecas cor -> depth), timestamps, intrínsecos e escala de
+  profundidade em arrays .npy em blocos, escritos
+  via memmap (np.lib.format.open_memmap)
+- ReplaySession/ReplayCamera leem esses blocos por memmap e implementam a
+  mesma interface de Camera (start/get_frames/stop + captura em thread), em
+  tempo real ou o mais rápido possível
+
+Layout da sessão:
+    sessao/session.json
+    sessao/<CAMERA>/color_00000.npy   (N, H, W, 3) uint8
+    sessao/<CAMERA>/depth_00000.npy   (N, H, W)    uint16
+    sessao/<CAMERA>/timestamps_00000.npy (N,)      float64
+"""
+
+import os
+import json
+import time
+import threading
+import numpy as np
+
+from robot_capture import CaptureSource
+from robot_geometry import ColorToDepthMapper, DepthProjector
+
+SESSION_FILE = "session.json"
+DEFAULT_CHUNK_SIZE = 300  # ~10 s a 30 FPS por bloco
+
+
+def intrinsics_to_dict(intrinsics):
+    """Converte rs.intrinsics em dicionário serializável"""
+    return {
+        'width': intrinsics.width,
+        'height': intrinsics.height,
+        'fx': intrinsics.fx,
+        'fy': intrinsics.fy,
+        'ppx': intrinsics.ppx,
+        'ppy': intrinsics.ppy,
+        'model': str(intrinsics.model),
+        'coeffs': list(intrinsics.coeffs)
+    }
+
+
+def extrinsics_to_dict(extrinsics):
+    """Converte rs.extrinsics em dicionário serializável (rotation column-major, m)"""
+    return {
+        'rotation': list(extrinsics.rotation),
+        'translation': list(extrinsics.translation)
+    }
+
+
+def _chunk_path(directory, kind, index):
+    return os.path.join(directory, f"{kind}_{index:05d}.npy")
+
+
+class _CameraWriter:
+    """Escreve os blocos memmap de uma câmera"""
+
+    def __init__(self, directory, chunk_size):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.chunk_counts = []
+        self.color_shape = None
+        self.depth_shape = None
+        self._color = None
+        self._depth = None
+        self._timestamps = None
+        self._filled = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_chunk(self, color, depth):
+        index = len(self.chunk_counts)
+        self._color = np.lib.format.open_memmap(
+            _chunk_path(self.directory, 'color', index), mode='w+',
+            dtype=color.dtype, shape=(self.chunk_size,) + color.shape)
+        self._depth = np.lib.format.open_memmap(
+            _chunk_path(self.directory, 'depth', index), mode='w+',
+            dtype=depth.dtype, shape=(self.chunk_size,) + depth.shape)
+        self._timestamps = np.zeros(self.chunk_size, dtype=np.float64)
+        self._filled = 0
+        self.chunk_counts.append(0)
+
+    def write(self, color, depth, timestamp):
+        if self.color_shape is None:
+            self.color_shape = color.shape
+            self.depth_shape = depth.shape
+        elif color.shape != self.color_shape or depth.shape != self.depth_shape:
+            return False
+
+        if self._color is None:
+            self._open_chunk(color, depth)
+
+        self._color[self._filled] = color
+        self._depth[self._filled] = depth
+        self._timestamps[self._filled] = timestamp
+        self._filled += 1
+        self.chunk_counts[-1] = self._filled
+
+        if self._filled == self.chunk_size:
+            self._close_chunk()
+        return True
+
+    def _close_chunk(self):
+        if self._color is None:
+            return
+        index = len(self.chunk_counts) - 1
+        filled = self._filled
+        self._color.flush()
+        self._depth.flush()
+        np.save(_chunk_path(self.directory, 'timestamps', index), self._timestamps[:filled])
+
+        trimmed = None
+        if filled < self.chunk_size:
+            # Último bloco parcial: regrava apenas a parte preenchida
+            trimmed = {'color': np.array(self._color[:filled]), 'depth': np.array(self._depth[:filled])}
+
+        # Libera os memmaps antes de regravar os arquivos
+        self._color = None
+        self._depth = None
+        self._timestamps = None
+        self._filled = 0
+
+        if trimmed:
+            for kind, data in trimmed.items():
+                np.save(_chunk_path(self.directory, kind, index), data)
+
+    def close(self):
+        self._close_chunk()
+        if self.chunk_counts and self.chunk_counts[-1] == 0:
+            self.chunk_counts.pop()
+
+
+class SessionRecorder:
+    """Grava framesets de uma ou mais câmeras em disco"""
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.cameras = {}   # nome -> metadados
+        self.writers = {}   # nome -> _CameraWriter
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def add_camera(self, name, depth_scale, intrinsics=None, depth_intrinsics=None, extrinsics=None):
+        """Registra uma câmera (escala de profundidade e intrínsecos)
+
+        Sem depth_intrinsics o depth é o alinhado à cor (intrinsics); com eles
+        e as extrínsecas cor -> depth, o depth gravado é o bruto.
+        """
+        with self._lock:
+            self.cameras[name] = {
+                'depth_scale': depth_scale,
+                'intrinsics': intrinsics,
+                'aligned': depth_intrinsics is None,
+                'depth_intrinsics': depth_intrinsics,
+                'extrinsics': extrinsics
+            }
+            self.writers[name] = _CameraWriter(os.path.join(self.path, name), self.chunk_size)
+        print(f"  ⏺ Gravando {name} em {self.path}")
+
+    def write(self, name, color, depth, timestamp=None):
+        """Grava um frameset (chamado pela thread de captura da câmera)"""
+        writer = self.writers.get(name)
+        if writer is None:
+            return False
+        return writer.write(color, depth, timestamp if timestamp is not None else time.time())
+
+    def close(self):
+        """Fecha os blocos abertos e escreve session.json"""
+        with self._lock:
+            for name, writer in self.writers.items():
+                writer.close()
+                self.cameras[name].update({
+                    'color_shape': list(writer.color_shape) if writer.color_shape else None,
+                    'depth_shape': list(writer.depth_shape) if writer.depth_shape else None,
+                    'chunks': writer.chunk_counts,
+                    'frames': int(sum(writer.chunk_counts))
+                })
+            with open(os.path.join(self.path, SESSION_FILE), 'w') as f:
+                json.dump({'version': 1, 'cameras': self.cameras}, f, indent=2)
+        total = sum(meta.get('frames', 0) for meta in self.cameras.values())
+        print(f"  ✓ Sessão gravada em {self.path} ({total} framesets)")
+
+
+class ReplayCamera(CaptureSource):
+    """Fonte de replay com a mesma interface de Camera"""
+
+    def __init__(self, path, name, meta, rate='realtime', loop=True):
+        self.path = path
+        self.name = name
+        self.meta = meta
+        self.rate = rate          # 'realtime' ou 'fast'
+        self.loop = loop
+        self.depth_scale = meta['depth_scale']
+        self.intrinsics = meta.get('intrinsics')
+        self.pipeline = None
+        self.frames = meta.get('frames', 0)
+        self._chunks = []
+        self._chunk = 0
+        self._offset = 0
+        self._clock_start = None
+        self._first_timestamp = None
+
+    def start(self):
+        """Abre os blocos da sessão por memmap"""
+        directory = os.path.join(self.path, self.name)
+        self._chunks = []
+        for index, count in enumerate(self.meta.get('chunks', [])):
+            if count == 0:
+                continue
+            self._chunks.append((
+                np.load(_chunk_path(directory, 'color', index), mmap_mode='r'),
+                np.load(_chunk_path(directory, 'depth', index), mmap_mode='r'),
+                np.load(_chunk_path(directory, 'timestamps', index)),
+                count
+            ))
+        if self.intrinsics:
+            self.projector = DepthProjector(self.intrinsics)
+        if not self.meta.get('aligned', True) and self.intrinsics and self.meta.get('extrinsics'):
+            self.aligned = False
+            self.depth_intrinsics = self.meta['depth_intrinsics']
+            self.mapper = ColorToDepthMapper(self.intrinsics, self.depth_intrinsics,
+                                             self.meta['extrinsics'], self.depth_scale)
+        self._rewind()
+        print(f"  ✓ Replay {self.name}: {self.frames} framesets, escala de profundidade: {self.depth_scale}")
+
+    def _rewind(self):
+        self._chunk = 0
+        self._offset = 0
+        self._clock_start = None
+        self._first_timestamp = None
+
+    def get_frames(self):
+        """Próximo frameset gravado -> (color, depth, None)"""
+        if not self._chunks:
+            return None, None, None
+
+        if self._chunk >= len(self._chunks):
+            if not self.loop:
+                time.sleep(0.05)
+                return None, None, None
+            self._rewind()
+
+        color_chunk, depth_chunk, timestamps, count = self._chunks[self._chunk]
+        timestamp = timestamps[self._offset]
+
+        if self.rate == 'realtime':
+            now = time.perf_counter()
+            if self._clock_start is None:
+                self._clock_start = now
+                self._first_timestamp = timestamp
+            delay = (timestamp - self._first_timestamp) - (now - self._clock_start)
+            if delay > 0:
+                time.sleep(delay)
+
+        color = color_chunk[self._offset]
+        depth = depth_chunk[self._offset]
+
+        self._offset += 1
+        if self._offset >= count:
+            self._chunk += 1
+            self._offset = 0
+        return color, depth, None
+
+    def stop(self):
+        self.stop_capture()
+        self._chunks = []
+
+
+class ReplaySession:
+    """Sessão gravada em disco"""
+
+    def __init__(self, path, rate='realtime', loop=True):
+        self.path = path
+        self.rate = rate
+        self.loop = loop
+        with open(os.path.join(path, SESSION_FILE)) as f:
+            self.meta = json.load(f)
+
+    def camera_names(self):
+        return list(self.meta['cameras'].keys())
+
+    def camera(self, name):
+        """ReplayCamera para o nome gravado (ex.: 'L515', 'D435') ou None"""
+        meta = self.meta['cameras'].get(name)
+        if meta is None:
+            return None
+        return ReplayCamera(self.path, name, meta, self.rate, self.loop)
+
+    def cameras(self):
+        return [self.camera(name) for name in self.camera_names()]
@@ -6,25 +6,286 @@ Integração com L515 e D435 para tracking avançado
 import time
 import math
 import uuid
+import queue
+import threading
+import multiprocessing as mp
 import numpy as np
 import cv2
 import pyrealsense2 as rs
 from ultralytics import YOLO
-from filterpy.kalman import KalmanFilter
+from robot_kalman import KalmanBank
+from robot_association import association_cost, assign
+from robot_capture import BufferPool, CaptureSource
+from robot_geometry import ColorToDepthMapper, DepthProjector, sample_box_depths
+from robot_filters import DepthFilterChain
+from robot_replay import extrinsics_to_dict, intrinsics_to_dict
 
 # Configurações do sistema
 MODEL_PATH = "yolov8n.pt"
-DETECTION_INTERVAL = 6
+DETECTION_DUTY = 0.5        # fração do tempo em que o detector (thread) pode ficar ocupado
+DETECTION_DUTY_PROCESS = 1.0  # worker em processo separado não disputa o GIL
 MIN_DIST = 0.25
 MAX_DIST = 5.0
 IOU_MATCH_THRESHOLD = 0.4
-MAX_MISSED = 10
+MAX_MISSED = 10                # lotes de detecção sem associação antes de remover o track
 TRACKER_DIST_THRESHOLD_PIX = 120
+HISTORY_CAPACITY = 64          # últimas observações guardadas por track
+HISTORY_VELOCITY_ALPHA = 0.3   # suavização (EMA) da velocidade
+MAX_WORKER_RESTARTS = 3        # reinícios do worker de inferência antes de voltar à thread
+# 'lazy': depth bruto, só os pixels das detecções são levados ao depth
+# (ColorToDepthMapper); 'always': rs.align do frame inteiro a cada frameset
+ALIGN_MODE = 'lazy'
 
-class Camera:
+def extract_boxes(results, names):
+    """Converte os resultados do YOLO em listas de (bbox, cls, conf, class_name) por imagem
+    
+    Copia cada tensor para a CPU uma vez por imagem, não uma vez por caixa.
+    """
+    batches = []
+    for r in results:
+        boxes = r.boxes
+        if boxes is None or len(boxes) == 0:
+            batches.append([])
+            continue
+        xyxy = boxes.xyxy.cpu().numpy().astype(int)
+        classes = boxes.cls.cpu().numpy().astype(int)
+        confs = boxes.conf.cpu().numpy()
+        batches.append([
+            ((int(x1), int(y1), int(x2), int(y2)), int(cls), float(conf), names[int(cls)])
+            for (x1, y1, x2, y2), cls, conf in zip(xyxy, classes, confs)
+        ])
+    return batches
+
+
+def _inference_worker_main(model_path, requests, responses):
+    """Processo de inferência: carrega o YOLO e atende lotes até receber None"""
+    model = YOLO(model_path)
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        batch_id, images = item
+        try:
+            start = time.perf_counter()
+            results = model(images, verbose=False)
+            responses.put((batch_id, extract_boxes(results, model.names), time.perf_counter() - start, None))
+        except Exception as e:
+            responses.put((batch_id, None, 0.0, str(e)))
+
+
+class DetectorThread(threading.Thread):
+    """YOLO numa thread do próprio processo
+    
+    Mesma interface do InferenceWorker (submit/poll/busy/close): um lote por
+    vez, resultado coletado por poll() num tick seguinte do process_frame.
+    """
+    
+    def __init__(self, model):
+        super().__init__(name="detector", daemon=True)
+        self.model = model
+        self.pending = None      # camera_frames do lote em inferência
+        self._request = None     # imagens aguardando a thread
+        self._result = None      # (camera_frames, caixas, tempo) pronto para poll()
+        self._wakeup = threading.Event()
+        self._running = True
+        self.start()
+    
+    @property
+    def busy(self):
+        return self.pending is not None
+    
+    def submit(self, camera_frames):
+        if self.busy:
+            return False
+        self.pending = dict(camera_frames)
+        self._request = [data['color'] for data in self.pending.values()]
+        self._wakeup.set()
+        return True
+    
+    def poll(self):
+        result, self._result = self._result, None
+        if result is None:
+            return None
+        self.pending = None
+        return result
+    
+    def run(self):
+        while self._running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            images, self._request = self._request, None
+            if images is None:
+                continue
+            camera_frames = self.pending
+            try:
+                start = time.perf_counter()
+                results = self.model(images, verbose=False)
+                batches = extract_boxes(results, self.model.names)
+                self._result = (camera_frames, batches, time.perf_counter() - start)
+            except Exception as e:
+                print(f"    Erro na detecção YOLO: {e}")
+                self._result = (camera_frames, [[] for _ in images], 0.0)
+    
+    def close(self):
+        self._running = False
+        self._wakeup.set()
+        self.join(timeout=3)
+
+
+class DetectionScheduler:
+    """Passo adaptativo da detecção a partir da latência medida
+    
+    Um novo lote só é disparado quando o detector está livre e já passou
+    latência / duty desde o último envio; com duty 0.5 o detector fica
+    ocupado no máximo metade do tempo. Latência e período do loop são
+    médias móveis exponenciais.
+    """
+    
+    def __init__(self, duty=DETECTION_DUTY, alpha=0.2):
+        self.duty = duty
+        self.alpha = alpha
+        self.latency = None        # s por lote (EMA)
+        self.frame_period = None   # s entre process_frame (EMA)
+        self.last_frame = None
+        self.last_submit = 0.0
+    
+    def _ema(self, current, value):
+        return value if current is None else current + self.alpha * (value - current)
+    
+    def observe_frame(self, now):
+        if self.last_frame is not None:
+            self.frame_period = self._ema(self.frame_period, now - self.last_frame)
+        self.last_frame = now
+    
+    def observe_inference(self, seconds):
+        if seconds > 0:
+            self.latency = self._ema(self.latency, seconds)
+    
+    def period(self):
+        """Intervalo mínimo (s) entre lotes"""
+        return (self.latency or 0.0) / self.duty
+    
+    def due(self, now, busy):
+        return not busy and now - self.last_submit >= self.period()
+    
+    def submitted(self, now):
+        self.last_submit = now
+    
+    def stride_frames(self):
+        """Passo atual equivalente em frames (antigo DETECTION_INTERVAL)"""
+        if not self.frame_period:
+            return 1
+        return max(1, int(round(max(self.period(), self.latency or 0.0) / self.frame_period)))
+    
+    def lag_frames(self, seconds):
+        """Converte um atraso em segundos para frames do loop"""
+        if not self.frame_period:
+            return 0.0
+        return seconds / self.frame_period
+    
+    def stats(self):
+        return {
+            'latency_ms': round((self.latency or 0.0) * 1000, 2),
+            'period_ms': round(self.period() * 1000, 2),
+            'stride_frames': self.stride_frames()
+        }
+
+
+class InferenceWorker:
+    """YOLO em um processo separado (fora do GIL do loop principal)
+    
+    Um lote por vez: enquanto o worker infere, o processo principal continua
+    rastreando e anotando; o resultado é coletado por poll() num tick seguinte.
+    Se o processo morre (OOM, erro de CUDA, falha ao carregar o modelo), o
+    lote pendente é descartado e o worker é reiniciado até max_restarts
+    vezes; depois disso `failed` fica True e o chamador volta à thread.
+    """
+    
+    def __init__(self, model_path, max_restarts=MAX_WORKER_RESTARTS):
+        self.model_path = model_path
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.failed = False
+        self.next_batch_id = 0
+        self.pending = None  # (batch_id, camera_frames) do lote em inferência
+        self._start()
+    
+    def _start(self):
+        ctx = mp.get_context('spawn')
+        self.requests = ctx.Queue(maxsize=1)
+        self.responses = ctx.Queue()
+        self.process = ctx.Process(target=_inference_worker_main,
+                                   args=(self.model_path, self.requests, self.responses),
+                                   daemon=True)
+        self.process.start()
+        print(f"  ✓ Worker de inferência iniciado (PID {self.process.pid})")
+    
+    def _check_alive(self):
+        """True se o worker está vivo; senão descarta o lote e reinicia (ou desiste)"""
+        if self.process.is_alive():
+            return True
+        print(f"    ✗ Worker de inferência (PID {self.process.pid}) encerrou "
+              f"(exitcode {self.process.exitcode}); lote descartado")
+        self.pending = None
+        # Ninguém vai consumir a fila antiga: não espera o feeder ao sair
+        self.requests.cancel_join_thread()
+        if self.restarts < self.max_restarts:
+            self.restarts += 1
+            print(f"    Reiniciando worker ({self.restarts}/{self.max_restarts})...")
+            self._start()
+        else:
+            self.failed = True
+            print("    ✗ Worker de inferência desativado após reinícios seguidos")
+        return False
+    
+    @property
+    def busy(self):
+        return self.pending is not None
+    
+    def submit(self, camera_frames):
+        """Envia as imagens coloridas das câmeras; ignora se ainda há lote em andamento"""
+        if self.busy or self.failed:
+            return False
+        self.next_batch_id += 1
+        images = [data['color'] for data in camera_frames.values()]
+        self.requests.put((self.next_batch_id, images))
+        self.pending = (self.next_batch_id, dict(camera_frames))
+        return True
+    
+    def poll(self):
+        """Retorna (camera_frames, caixas por imagem, tempo de inferência) se o lote terminou"""
+        if not self.busy:
+            return None
+        try:
+            batch_id, batches, elapsed, error = self.responses.get_nowait()
+        except queue.Empty:
+            self._check_alive()
+            return None
+        pending_id, camera_frames = self.pending
+        self.pending = None
+        if error or batch_id != pending_id:
+            if error:
+                print(f"    Erro na detecção YOLO (worker): {error}")
+            return None
+        return camera_frames, batches, elapsed
+    
+    def close(self):
+        if not self.process.is_alive():
+            return
+        try:
+            self.requests.put(None, timeout=1)
+        except Exception:
+            pass
+        self.process.join(timeout=3)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class Camera(CaptureSource):
     """Gerencia uma câmera RealSense individual"""
     
-    def __init__(self, serial_number, name, depth_width, depth_height, color_width, color_height):
+    def __init__(self, serial_number, name, depth_width, depth_height, color_width, color_height,
+                 align_mode=ALIGN_MODE):
         self.serial_number = serial_number
         self.name = name
         self.depth_width = depth_width
@@ -35,6 +296,10 @@ class Camera:
         self.align = None
         self.depth_scale = None
         self.profile = None
+        self.intrinsics = None  # do stream de cor
+        self.filters = None     # DepthFilterChain (pós-processamento no SDK)
+        self.align_mode = align_mode
+        self.extrinsics = None  # cor -> depth (modo 'lazy')
         
     def start(self):
         """Inicializa a câmera"""
@@ -46,22 +311,49 @@ class Camera:
         
         print(f"  Iniciando {self.name} (S/N: {self.serial_number})...")
         self.profile = self.pipeline.start(config)
-        self.align = rs.align(rs.stream.color)
         self.depth_scale = self.profile.get_device().first_depth_sensor().get_depth_scale()
-        print(f"  ✓ {self.name} - escala de profundidade: {self.depth_scale}")
+        try:
+            color_profile = self.profile.get_stream(rs.stream.color).as_video_stream_profile()
+            self.intrinsics = intrinsics_to_dict(color_profile.get_intrinsics())
+            self.projector = DepthProjector(self.intrinsics)
+        except Exception as e:
+            print(f"    ⚠ Intrínsecos de {self.name} indisponíveis: {e}")
+        
+        # Sem alinhamento: intrínsecos do depth e extrínsecas cor -> depth em cache
+        self.aligned = True
+        if self.align_mode == 'lazy' and self.intrinsics:
+            try:
+                depth_profile = self.profile.get_stream(rs.stream.depth).as_video_stream_profile()
+                self.depth_intrinsics = intrinsics_to_dict(depth_profile.get_intrinsics())
+                self.extrinsics = extrinsics_to_dict(color_profile.get_extrinsics_to(depth_profile))
+                self.mapper = ColorToDepthMapper(self.intrinsics, self.depth_intrinsics,
+                                                 self.extrinsics, self.depth_scale)
+                self.aligned = False
+            except Exception as e:
+                print(f"    ⚠ Extrínsecas de {self.name} indisponíveis, alinhando frames: {e}")
+        self.align = rs.align(rs.stream.color) if self.aligned else None
+        
+        self.filters = DepthFilterChain(self.name, aligned=self.aligned)
+        if self.filters.enabled:
+            print(f"    Filtros de profundidade: {' -> '.join(self.filters.names())}")
+        mode = 'alinhado à cor' if self.aligned else 'bruto (mapeamento por pixel)'
+        print(f"  ✓ {self.name} - escala de profundidade: {self.depth_scale}, depth {mode}")
         
     def get_frames(self):
-        """Obtém frames alinhados da câmera"""
+        """Obtém os frames da câmera (depth alinhado à cor só no modo 'always')"""
         if not self.pipeline:
             return None, None, None
             
         try:
             frames = self.pipeline.wait_for_frames(timeout_ms=1000)
-            aligned_frames = self.align.process(frames)
-            depth_frame = aligned_frames.get_depth_frame()
-            color_frame = aligned_frames.get_color_frame()
+            if self.align:
+                frames = self.align.process(frames)
+            depth_frame = frames.get_depth_frame()
+            color_frame = frames.get_color_frame()
             
             if depth_frame and color_frame:
+                if self.filters and self.filters.enabled:
+                    depth_frame = self.filters.process(depth_frame)
                 color = np.asanyarray(color_frame.get_data())
                 depth = np.asanyarray(depth_frame.get_data())
                 return color, depth, depth_frame
@@ -70,27 +362,114 @@ class Camera:
             
         return None, None, None
     
+    def start_recording(self, recorder):
+        """Grava os framesets capturados em uma sessão de replay"""
+        if self.aligned:
+            recorder.add_camera(self.name, self.depth_scale, self.intrinsics)
+        else:
+            recorder.add_camera(self.name, self.depth_scale, self.intrinsics,
+                                self.depth_intrinsics, self.extrinsics)
+        self.recorder = recorder
+    
     def stop(self):
-        """Para o pipeline da câmera"""
+        """Para a captura e o pipeline da câmera"""
+        self.stop_capture()
         if self.pipeline:
             self.pipeline.stop()
             self.pipeline = None
 
+class TrackHistory:
+    """Histórico de tamanho fixo de um track (buffer circular NumPy)
+    
+    Cada linha guarda (t, cx, cy, w, h). Velocidade (px/s, média móvel),
+    direção e tempo de permanência são atualizados a cada append, sem
+    percorrer o histórico.
+    """
+    
+    __slots__ = ('data', 'capacity', 'index', 'count', 'first_time',
+                 'vx', 'vy', 'distance')
+    
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        self.data = np.zeros((capacity, 5), dtype=np.float64)
+        self.capacity = capacity
+        self.index = 0      # próxima posição de escrita
+        self.count = 0      # observações desde a criação
+        self.first_time = None
+        self.vx = 0.0
+        self.vy = 0.0
+        self.distance = 0.0  # caminho percorrido (px)
+    
+    def __len__(self):
+        return min(self.count, self.capacity)
+    
+    def append(self, timestamp, bbox):
+        x1, y1, x2, y2 = bbox
+        cx = (x1 + x2) / 2.0
+        cy = (y1 + y2) / 2.0
+        
+        if self.count:
+            last = self.data[(self.index - 1) % self.capacity]
+            dt = timestamp - last[0]
+            dx = cx - last[1]
+            dy = cy - last[2]
+            self.distance += math.hypot(dx, dy)
+            if dt > 0:
+                alpha = HISTORY_VELOCITY_ALPHA if self.count > 1 else 1.0
+                self.vx += alpha * (dx / dt - self.vx)
+                self.vy += alpha * (dy / dt - self.vy)
+        else:
+            self.first_time = timestamp
+        
+        self.data[self.index] = (timestamp, cx, cy, x2 - x1, y2 - y1)
+        self.index = (self.index + 1) % self.capacity
+        self.count += 1
+    
+    def entries(self):
+        """Observações guardadas em ordem cronológica, (n, 5)"""
+        n = len(self)
+        if self.count <= self.capacity:
+            return self.data[:n]
+        return np.roll(self.data, -self.index, axis=0)
+    
+    @property
+    def last_time(self):
+        if not self.count:
+            return None
+        return self.data[(self.index - 1) % self.capacity, 0]
+    
+    def dwell_time(self):
+        """Segundos entre a primeira e a última observação"""
+        if not self.count:
+            return 0.0
+        return float(self.last_time - self.first_time)
+    
+    def motion(self):
+        """Vetor de movimento para o frontend"""
+        speed = math.hypot(self.vx, self.vy)
+        return {
+            'vx': round(self.vx, 1),
+            'vy': round(self.vy, 1),
+            'speed': round(speed, 1),
+            'heading': round(math.degrees(math.atan2(self.vy, self.vx)), 1) if speed > 0 else 0.0,
+            'dwell_time': round(self.dwell_time(), 2),
+            'distance': round(self.distance, 1)
+        }
+
+
 class TrackedObject:
     """Objeto rastreado com filtro de Kalman"""
     
-    def __init__(self, bbox, cls, conf, class_name, camera_name=""):
+    __slots__ = ('bank', 'slot', 'bbox', 'cls', 'conf', 'class_name', 'id', 'missed',
+                 'history', 'camera_name', 'depth', 'depth_confidence', 'position_3d')
+    
+    def __init__(self, bbox, cls, conf, class_name, camera_name="", bank=None):
         cx = (bbox[0] + bbox[2]) / 2.0
         cy = (bbox[1] + bbox[3]) / 2.0
         
-        # Filtro de Kalman para suavização
-        self.kf = KalmanFilter(dim_x=4, dim_z=2)
-        self.kf.x = np.array([cx, cy, 0., 0.])
-        self.kf.F = np.array([[1,0,1,0],[0,1,0,1],[0,0,1,0],[0,0,0,1]])
-        self.kf.H = np.array([[1,0,0,0],[0,1,0,0]])
-        self.kf.P *= 50
-        self.kf.R *= 1
-        self.kf.Q *= 0.01
+        # Filtro de Kalman para suavização: um slot do banco compartilhado
+        # (ou de um banco próprio quando o objeto é usado isoladamente)
+        self.bank = bank if bank is not None else KalmanBank(capacity=1)
+        self.slot = self.bank.allocate(cx, cy)
         
         self.bbox = bbox
         self.cls = cls
@@ -98,29 +477,44 @@ class TrackedObject:
         self.class_name = class_name
         self.id = str(uuid.uuid4())[:8]
         self.missed = 0
-        self.history = []
+        self.history = TrackHistory()
         self.camera_name = camera_name
         self.depth = 0.0
+        self.depth_confidence = 0.0  # fração da caixa interna coerente com a distância
         self.position_3d = (0, 0, 0)
+    
+    @property
+    def state(self):
+        """Estado [cx, cy, vx, vy] do filtro"""
+        return self.bank.x[self.slot]
         
     def predict(self):
-        """Predição do filtro de Kalman"""
-        self.kf.predict()
+        """Predição do filtro de Kalman (só deste objeto)"""
+        self.bank.predict([self.slot])
         
     def update(self, bbox, camera_name=""):
         """Atualiza o objeto com nova detecção"""
         cx = (bbox[0] + bbox[2]) / 2.0
         cy = (bbox[1] + bbox[3]) / 2.0
-        self.kf.update(np.array([cx, cy]))
+        self.bank.update([self.slot], [(cx, cy)])
+        self.observe(bbox, camera_name)
+    
+    def observe(self, bbox, camera_name=""):
+        """Registra a detecção associada (o filtro é atualizado em lote pelo banco)"""
         self.bbox = bbox
         self.missed = 0
-        self.history.append((time.time(), bbox))
+        self.history.append(time.time(), bbox)
         if camera_name:
             self.camera_name = camera_name
+    
+    def release(self):
+        """Libera o slot do banco quando o objeto é descartado"""
+        self.bank.release(self.slot)
             
     def current_center(self):
         """Retorna o centro atual do objeto"""
-        return int(self.kf.x[0]), int(self.kf.x[1])
+        x = self.state
+        return int(x[0]), int(x[1])
     
     def current_bbox(self):
         """Retorna a bounding box atual"""
@@ -147,21 +541,39 @@ class TrackedObject:
             'confidence': float(self.conf),
             'camera': self.camera_name,
             'depth': float(self.depth),
+            'depth_confidence': round(float(self.depth_confidence), 2),
             'position_3d': [float(x) for x in self.position_3d],
-            'missed': self.missed
+            'missed': self.missed,
+            'motion': self.history.motion()
         }
 
 class MultiCameraTracker:
     """Sistema de tracking com múltiplas câmeras"""
     
-    def __init__(self, model_path=MODEL_PATH):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path=MODEL_PATH, replay=None, recorder=None, inference_process=False):
+        self.model_path = model_path
+        self.inference_process = inference_process
+        # Com inferência em processo separado o modelo só é carregado no worker
+        self.model = None if inference_process else YOLO(model_path)
+        self.detector = None        # DetectorThread ou InferenceWorker
+        self.scheduler = DetectionScheduler(DETECTION_DUTY_PROCESS if inference_process else DETECTION_DUTY)
         self.trackers = []
+        self.bank = KalmanBank()    # estados de todos os trackers (predict/update em lote)
         self.frame_idx = 0
         self.cameras = []
+        self.replay = replay        # ReplaySession: usa frames gravados em vez das câmeras
+        self.recorder = recorder    # SessionRecorder: grava os framesets capturados
+        self.timings = {}           # duração (s) de cada etapa no último process_frame
+        self.annotation_buffers = BufferPool()
         
     def find_and_start_cameras(self):
         """Encontra e inicializa todas as câmeras RealSense"""
+        if not self.detector:
+            self.detector = InferenceWorker(self.model_path) if self.inference_process else DetectorThread(self.model)
+        
+        if self.replay:
+            return self._start_replay_cameras()
+        
         ctx = rs.context()
         
         for device in ctx.devices:
@@ -179,6 +591,9 @@ class MultiCameraTracker:
                 
             try:
                 camera.start()
+                if self.recorder:
+                    camera.start_recording(self.recorder)
+                camera.start_capture()
                 self.cameras.append(camera)
                 time.sleep(0.5)
             except Exception as e:
@@ -186,81 +601,114 @@ class MultiCameraTracker:
         
         return len(self.cameras) > 0
     
-    def process_frame(self):
-        """Processa frames de todas as câmeras COM TRATAMENTO ROBUSTO DE ERROS"""
+    def _start_replay_cameras(self):
+        """Inicializa as câmeras gravadas na sessão de replay"""
+        for camera in self.replay.cameras():
+            try:
+                camera.start()
+                camera.start_capture()
+                self.cameras.append(camera)
+            except Exception as e:
+                print(f"    ✗ Falha ao abrir replay de {camera.name}: {e}")
+        
+        return len(self.cameras) > 0
+    
+    def process_frame(self, annotate=True):
+        """Processa frames de todas as câmeras COM TRATAMENTO ROBUSTO DE ERROS
+        
+        'color'/'depth' são views sobre os buffers do SDK e prendem o frame
+        enquanto referenciados: o chamador não deve guardá-las além do tick
+        (o lote em inferência e suas detecções as soltam ao serem
+        consumidos). annotate: True, False ou os nomes das câmeras cujo
+        vídeo alguém assiste; nas demais não há cópia nem desenho e
+        'annotated' fica None.
+        """
         all_detections = []
+        batch_applied = False  # chegou um lote de detecções neste tick
         camera_frames = {}
+        timings = {'inference': 0.0}
         
         try:
-            # Coleta frames de todas as câmeras
+            # Coleta o frame mais recente de cada câmera (publicado pelas threads de captura)
             for camera in self.cameras:
                 try:
-                    color, depth, depth_frame = camera.get_frames()
-                    if color is None or depth is None:
+                    frame = camera.read_latest()
+                    if frame is None:
                         continue
                         
                     camera_frames[camera.name] = {
-                        'color': color,
-                        'depth': depth,
-                        'depth_frame': depth_frame,
+                        'color': frame.color,
+                        'depth': frame.depth,
                         'depth_scale': camera.depth_scale,
-                        'annotated': color.copy()
+                        # intrínsecos da imagem de depth (mapa/fusão); cor só se alinhado
+                        'intrinsics': camera.intrinsics if camera.aligned else camera.depth_intrinsics,
+                        'aligned': camera.aligned,
+                        'projector': camera.projector,
+                        'mapper': camera.mapper,
+                        'timestamp': frame.timestamp,
+                        'annotated': None
                     }
-                    
-                    # Detecção YOLO apenas em intervalos
-                    if self.frame_idx % DETECTION_INTERVAL == 0:
-                        try:
-                            results = self.model(color, verbose=False)
-                            for r in results:
-                                for box in r.boxes:
-                                    try:
-                                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                                        cls = int(box.cls[0])
-                                        conf = float(box.conf[0])
-                                        class_name = self.model.names[cls]
-                                        
-                                        all_detections.append({
-                                            'bbox': (int(x1), int(y1), int(x2), int(y2)),
-                                            'cls': cls,
-                                            'class_name': class_name,
-                                            'conf': conf,
-                                            'camera': camera.name,
-                                            'depth': depth,
-                                            'depth_frame': depth_frame,
-                                            'depth_scale': camera.depth_scale
-                                        })
-                                    except Exception as e:
-                                        print(f"      Erro ao processar box: {e}")
-                                        continue
-                        except Exception as e:
-                            print(f"    Erro na detecção YOLO para {camera.name}: {e}")
-                            continue
                 except Exception as e:
                     print(f"  Erro ao obter frames de {camera.name}: {e}")
                     continue
             
-            # Atualiza trackers
-            if self.frame_idx % DETECTION_INTERVAL == 0 and all_detections:
+            # Detecção assíncrona: coleta o lote que ficou pronto e, se o detector
+            # está livre e o passo adaptativo permite, envia os frames mais novos
+            now = time.time()
+            self.scheduler.observe_frame(now)
+            if self.detector:
+                ready = self.detector.poll()
+                if getattr(self.detector, 'failed', False):
+                    # Worker em processo separado não se recupera: YOLO numa thread local
+                    print("  ⚠ Voltando à inferência em thread no processo principal")
+                    self.detector.close()
+                    self.model = self.model or YOLO(self.model_path)
+                    self.detector = DetectorThread(self.model)
+                if ready:
+                    context, batches, elapsed = ready
+                    self.scheduler.observe_inference(elapsed)
+                    timings['inference'] = elapsed
+                    all_detections = self._collect_detections(context, batches, now)
+                    batch_applied = True
+                    timestamps = [data['timestamp'] for data in context.values() if data.get('timestamp')]
+                    if timestamps:
+                        timings['detection_age'] = now - min(timestamps)
+                if camera_frames and self.scheduler.due(now, self.detector.busy):
+                    if self.detector.submit(camera_frames):
+                        self.scheduler.submitted(now)
+            
+            # Kalman prediz a cada frame; detecções são incorporadas quando chegam.
+            # `missed` conta lotes sem associação: predição entre lotes não é perda
+            tracking_start = time.perf_counter()
+            self.bank.predict()
+            if all_detections:
                 try:
                     self._update_trackers(all_detections)
                 except Exception as e:
                     print(f"  Erro ao atualizar trackers: {e}")
-            else:
+            elif batch_applied:
                 for tr in self.trackers:
-                    tr.predict()
                     tr.missed += 1
             
             # Remove trackers perdidos
-            self.trackers = [t for t in self.trackers if t.missed <= MAX_MISSED]
+            self._prune_trackers(MAX_MISSED)
             
-            # Desenha anotações
+            timings['tracking'] = time.perf_counter() - tracking_start
+            
+            # Desenha anotações num buffer do pool, só se alguém assiste o vídeo
+            annotate_start = time.perf_counter()
             for camera_name, data in camera_frames.items():
+                if not (annotate is True or (annotate and camera_name in annotate)):
+                    continue
                 try:
+                    data['annotated'] = self.annotation_buffers.copy_of(camera_name, data['color'])
                     self._draw_annotations(camera_name, data)
                 except Exception as e:
                     print(f"  Erro ao desenhar anotações em {camera_name}: {e}")
+            timings['annotate'] = time.perf_counter() - annotate_start
             
             self.frame_idx += 1
+            self.timings = timings
             
         except Exception as e:
             print(f"ERRO CRÍTICO no process_frame: {e}")
@@ -269,64 +717,138 @@ class MultiCameraTracker:
         
         return camera_frames
     
+    def _collect_detections(self, camera_frames, batches, now):
+        """Distribui as caixas de cada imagem do lote de volta à sua câmera
+        
+        Cada detecção leva o timestamp de captura do seu frame e o atraso
+        equivalente em frames, usado para compensar o movimento na associação.
+        """
+        detections = []
+        for (camera_name, data), boxes in zip(camera_frames.items(), batches):
+            timestamp = data.get('timestamp') or now
+            lag_frames = self.scheduler.lag_frames(now - timestamp)
+            for bbox, cls, conf, class_name in boxes:
+                detections.append({
+                    'bbox': bbox,
+                    'cls': cls,
+                    'class_name': class_name,
+                    'conf': conf,
+                    'camera': camera_name,
+                    'depth': data['depth'],  # view: prende o frame do lote até o fim do tick
+                    'depth_scale': data['depth_scale'],
+                    'projector': data['projector'],
+                    'mapper': data.get('mapper'),
+                    'timestamp': timestamp,
+                    'lag_frames': lag_frames
+                })
+        return detections
+    
+    def _prune_trackers(self, max_missed):
+        """Remove trackers perdidos e devolve seus slots ao banco"""
+        kept = []
+        for tr in self.trackers:
+            if tr.missed <= max_missed:
+                kept.append(tr)
+            else:
+                tr.release()
+        self.trackers = kept
+    
     def _update_trackers(self, detections):
-        """Atualiza trackers com novas detecções"""
-        assigned = set()
+        """Atualiza trackers com novas detecções
         
+        Associação global por câmera: custo vetorizado (distância entre
+        centros, IoU com a caixa predita e classe) resolvido pelo húngaro.
+        """
+        by_camera = {}
         for detection in detections:
-            dbox = detection['bbox']
-            dcls = detection['cls']
-            dconf = detection['conf']
-            dclass_name = detection['class_name']
-            camera_name = detection['camera']
-            depth = detection['depth']
-            depth_scale = detection['depth_scale']
-            depth_frame = detection['depth_frame']
-            
-            cx = (dbox[0] + dbox[2]) // 2
-            cy = (dbox[1] + dbox[3]) // 2
-            
-            # Verifica limites
-            if cx < 0 or cx >= depth.shape[1] or cy < 0 or cy >= depth.shape[0]:
-                continue
-                
-            dist = depth[cy, cx] * depth_scale
-            if math.isnan(dist) or dist <= 0:
-                continue
-            if dist < MIN_DIST or dist > MAX_DIST:
+            by_camera.setdefault(detection['camera'], []).append(detection)
+        
+        # Profundidade robusta (percentil da caixa interna) e posição 3D de todas
+        # as detecções de cada câmera em lote (raios em cache). Com depth não
+        # alinhado só as amostras das caixas passam pelo mapper
+        valid = {}  # câmera -> detecções com profundidade válida
+        for camera_name, camera_detections in by_camera.items():
+            first = camera_detections[0]
+            boxes = np.array([d['bbox'] for d in camera_detections], dtype=np.float32)
+            distances, scores = sample_box_depths(first['depth'], first['depth_scale'], boxes,
+                                                  mapper=first.get('mapper'))
+            keep = np.flatnonzero((distances >= MIN_DIST) & (distances <= MAX_DIST))
+            if keep.size == 0:
                 continue
             
-            # Calcula posição 3D
-            try:
-                depth_intrin = depth_frame.get_profile().as_video_stream_profile().get_intrinsics()
-                pos_3d = rs.rs2_deproject_pixel_to_point(depth_intrin, [cx, cy], dist)
-            except:
-                pos_3d = (0, 0, 0)
+            projector = first['projector']
+            if projector is not None:
+                centers_x = (boxes[keep, 0] + boxes[keep, 2]) // 2
+                centers_y = (boxes[keep, 1] + boxes[keep, 3]) // 2
+                points = projector.deproject_pixels(centers_x, centers_y, distances[keep]).tolist()
+            else:
+                points = [(0, 0, 0)] * keep.size
             
-            # Encontra tracker mais próximo
-            best = None
-            best_dist = TRACKER_DIST_THRESHOLD_PIX + 1
+            kept = []
+            for i, point in zip(keep.tolist(), points):
+                detection = camera_detections[i]
+                detection['distance'] = float(distances[i])
+                detection['depth_confidence'] = float(scores[i])
+                detection['position_3d'] = point
+                kept.append(detection)
+            valid[camera_name] = kept
+        
+        assigned = set()
+        measurements = {}  # slot -> centro medido (atualização em lote no fim)
+        
+        for camera_name, camera_detections in valid.items():
+            tracks = [tr for tr in self.trackers if tr.camera_name == camera_name]
+            lag = camera_detections[0].get('lag_frames', 0.0)
             
-            for tr in self.trackers:
-                if tr.camera_name != camera_name:
-                    continue
-                tx, ty = tr.current_center()
-                d = math.hypot(tx - cx, ty - cy)
-                if d < best_dist:
-                    best_dist = d
-                    best = tr
+            matches, unmatched, _ = [], list(range(len(camera_detections))), []
+            if tracks:
+                # Caixas preditas, voltadas até o instante de captura da detecção
+                track_boxes = []
+                for tr in tracks:
+                    x = tr.state
+                    px = x[0] - x[2] * lag
+                    py = x[1] - x[3] * lag
+                    x1, y1, x2, y2 = tr.bbox
+                    w, h = x2 - x1, y2 - y1
+                    track_boxes.append((px - w / 2.0, py - h / 2.0, px + w / 2.0, py + h / 2.0))
+                
+                cost = association_cost(
+                    [d['bbox'] for d in camera_detections], [d['cls'] for d in camera_detections],
+                    track_boxes, [tr.cls for tr in tracks],
+                    TRACKER_DIST_THRESHOLD_PIX, IOU_MATCH_THRESHOLD)
+                matches, unmatched, _ = assign(cost)
             
-            if best and best_dist < TRACKER_DIST_THRESHOLD_PIX:
-                best.update(dbox, camera_name)
-                best.depth = dist
-                best.position_3d = pos_3d
+            for d, t in matches:
+                detection = camera_detections[d]
+                best = tracks[t]
+                dbox = detection['bbox']
+                if lag:
+                    # Leva a medição do instante de captura até agora
+                    x = best.state
+                    dx = int(round(x[2] * lag))
+                    dy = int(round(x[3] * lag))
+                    dbox = (dbox[0] + dx, dbox[1] + dy, dbox[2] + dx, dbox[3] + dy)
+                measurements[best.slot] = ((dbox[0] + dbox[2]) / 2.0, (dbox[1] + dbox[3]) / 2.0)
+                best.observe(dbox, camera_name)
+                best.conf = detection['conf']
+                best.depth = detection['distance']
+                best.depth_confidence = detection['depth_confidence']
+                best.position_3d = detection['position_3d']
                 assigned.add(id(best))
-            else:
-                newt = TrackedObject(dbox, dcls, dconf, dclass_name, camera_name)
-                newt.depth = dist
-                newt.position_3d = pos_3d
+            
+            for d in unmatched:
+                detection = camera_detections[d]
+                newt = TrackedObject(detection['bbox'], detection['cls'], detection['conf'],
+                                     detection['class_name'], camera_name, self.bank)
+                newt.depth = detection['distance']
+                newt.depth_confidence = detection['depth_confidence']
+                newt.position_3d = detection['position_3d']
+                assigned.add(id(newt))
                 self.trackers.append(newt)
         
+        if measurements:
+            self.bank.update(list(measurements.keys()), list(measurements.values()))
+        
         # Marca não atribuídos
         for tr in self.trackers:
             if id(tr) not in assigned:
@@ -335,7 +857,6 @@ class MultiCameraTracker:
     def _draw_annotations(self, camera_name, data):
         """Desenha anotações nos frames"""
         annotated = data['annotated']
-        depth = data['depth']
         
         for tr in self.trackers:
             if tr.camera_name != camera_name or tr.missed > 3:
@@ -373,14 +894,17 @@ class MultiCameraTracker:
         print("  Parando câmeras...")
         for camera in self.cameras:
             try:
-                if camera.pipeline:
-                    print(f"    Parando {camera.name}...")
-                    camera.stop()
-                    print(f"    ✓ {camera.name} parado")
+                print(f"    Parando {camera.name}...")
+                camera.stop()
+                print(f"    ✓ {camera.name} parado")
             except Exception as e:
                 print(f"    ⚠ Erro ao parar {camera.name}: {e}")
                 # Continua mesmo com erro
         self.cameras = []
+        
+        if self.detector:
+            self.detector.close()
+            self.detector = None
         print("  ✓ Limpeza concluída")
 
 def iou(a, b):
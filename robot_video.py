@@ -0,0 +1,257 @@
+"""
+Vídeo por assinatura para os clientes WebSocket
+- Cada cliente declara (comando 'subscribe') os streams que quer ('camera',
+  'l515', 'd435'), largura máxima, qualidade JPEG e FPS. Sem assinatura o
+  cliente recebe todos os streams no tamanho original a cada tick
+- A qualidade se adapta à latência de envio do canal de vídeo de cada
+  cliente (mapas e nuvem de pontos não contam): cai
+  quando o envio não cabe no intervalo entre frames ou há frames
+  descartados, sobe devagar quando sobra folga (degraus de QUALITY_STEP,
+  para clientes parecidos caírem na mesma variante)
+- O servidor junta as variantes (stream, largura, qualidade) pedidas por
+  todos os clientes e codifica cada uma uma única vez por frame; streams que
+  ninguém assiste não são anotados nem codificados
+- EncoderPool codifica as variantes em threads (cv2.resize/imencode soltam o
+  GIL): L515 e D435 em paralelo, aguardados com run_in_executor, sem
+  bloquear o loop asyncio
+"""
+
+import asyncio
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+DEFAULT_QUALITY = 85
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+QUALITY_STEP = 5
+
+
+def _quantize_quality(quality):
+    quality = int(round(float(quality) / QUALITY_STEP)) * QUALITY_STEP
+    return max(MIN_QUALITY, min(MAX_QUALITY, quality))
+
+
+def _number_field(data, field, default=None, minimum=0.0, maximum=None):
+    """Campo numérico do comando 'subscribe'; ValueError se inválido"""
+    value = data.get(field, default)
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{field}' inválido: {value!r}")
+    if not math.isfinite(number) or number < minimum or (maximum is not None and number > maximum):
+        raise ValueError(f"'{field}' fora do intervalo: {value!r}")
+    return number
+
+
+def resize_to_width(image, width):
+    """Reduz a imagem para `width` (mantendo a proporção); nunca amplia"""
+    if not width or width >= image.shape[1]:
+        return image
+    height = max(1, int(round(image.shape[0] * width / float(image.shape[1]))))
+    return cv2.resize(image, (int(width), height), interpolation=cv2.INTER_AREA)
+
+
+def encode_jpeg(image, quality):
+    """Bytes JPEG da imagem"""
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    return buffer.tobytes()
+
+
+def encode_variants(images, variants):
+    """{(stream, largura, qualidade): bytes JPEG}, cada variante codificada uma vez
+
+    O redimensionamento também é feito uma vez por (stream, largura) e
+    reaproveitado pelas qualidades diferentes. EncoderPool chama esta função
+    em cada job do pool, com as variantes de um (stream, largura).
+    """
+    resized = {}
+    encoded = {}
+    for variant in variants:
+        stream, width, quality = variant
+        image = images.get(stream)
+        if image is None:
+            continue
+        key = (stream, width)
+        if key not in resized:
+            resized[key] = resize_to_width(image, width)
+        encoded[variant] = encode_jpeg(resized[key], quality)
+    return encoded
+
+
+class EncoderPool:
+    """Codificação JPEG em um pool limitado de threads
+
+    Cada (stream, largura) vira um job (redimensiona uma vez, codifica as
+    qualidades pedidas) e os jobs do tick rodam em paralelo; o tempo de
+    codificação por tick tende ao de uma única imagem. Drop-oldest por tick:
+    no início de cada encode() os jobs de chamadas anteriores que ainda não
+    começaram são cancelados (o resultado deles ficaria velho); jobs da
+    própria chamada nunca são cancelados. Com `timeout`, o tick segue com o
+    que ficou pronto; o restante continua no pool e é descartado ao terminar.
+
+    As imagens são lidas pelas threads depois do retorno de encode() só nos
+    jobs que estouraram o timeout: o anel do BufferPool (3 buffers) cobre
+    esse atraso de até dois ticks.
+    """
+
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jpeg')
+        self.workers = workers
+        self.pending = []        # concurrent.futures.Future da última chamada
+        self.dropped = 0         # jobs cancelados antes de rodar
+        self.late = 0            # jobs que não terminaram dentro do timeout
+
+    def _drop_stale(self):
+        """Cancela os jobs de chamadas anteriores que ainda estão na fila"""
+        for future in self.pending:
+            # Future do pool: cancel() só tem efeito (e retorna True) se o job não começou
+            if not future.done() and future.cancel():
+                self.dropped += 1
+        self.pending = []
+
+    async def encode(self, images, variants, timeout=None):
+        """{(stream, largura, qualidade): bytes JPEG} codificados no pool"""
+        self._drop_stale()
+        groups = {}  # (stream, largura) -> variantes
+        for variant in variants:
+            if images.get(variant[0]) is not None:
+                groups.setdefault(variant[:2], []).append(variant)
+        if not groups:
+            return {}
+
+        # Mesmo que run_in_executor, guardando o Future do pool para o cancelamento
+        jobs = []
+        for (stream, _), group in groups.items():
+            future = self.executor.submit(encode_variants, {stream: images[stream]}, group)
+            self.pending.append(future)
+            jobs.append(asyncio.wrap_future(future))
+        done, not_done = await asyncio.wait(jobs, timeout=timeout)
+        self.late += len(not_done)
+
+        encoded = {}
+        for future in done:
+            if not future.cancelled() and future.exception() is None:
+                encoded.update(future.result())
+        return encoded
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': sum(not f.done() for f in self.pending),
+                'dropped': self.dropped, 'late': self.late}
+
+    def close(self):
+        for future in self.pending:
+            future.cancel()
+        self.pending = []
+        self.executor.shutdown(wait=False)
+
+
+class VideoSubscription:
+    """Streams, tamanho, qualidade e FPS de vídeo de um cliente"""
+
+    def __init__(self, streams=None, width=None, quality=DEFAULT_QUALITY, fps=None,
+                 adaptive=True, tick_interval=0.1):
+        self.streams = set(streams) if streams is not None else None  # None = todos
+        self.width = int(width) if width else None
+        self.max_quality = _quantize_quality(quality)
+        self.quality = self.max_quality
+        self.fps = float(fps) if fps else None
+        self.adaptive = adaptive
+        self.tick_interval = tick_interval   # período do sensor_loop (s)
+        self.adapt_interval = 1.0            # s entre ajustes de qualidade
+        self.send_latency = 0.0              # média móvel (s)
+        self.last_sent = {}                  # stream -> instante do último frame
+        self._dropped = 0
+        self._last_adapt = 0.0
+
+    @classmethod
+    def from_message(cls, data, tick_interval=0.1):
+        """Assinatura a partir do comando {'type': 'subscribe', ...}
+
+        Levanta ValueError com a descrição do campo inválido; o servidor a
+        devolve ao cliente e mantém a assinatura anterior.
+        """
+        streams = data.get('streams')
+        if isinstance(streams, str):
+            streams = [streams]
+        if streams is not None and not isinstance(streams, (list, tuple)):
+            raise ValueError(f"'streams' inválido: {streams!r}")
+        width = _number_field(data, 'width')
+        if width is not None and width != int(width):
+            raise ValueError(f"'width' inválido: {data['width']!r}")
+        return cls(streams=[str(s).lower() for s in streams] if streams is not None else None,
+                   width=int(width) if width else None,
+                   quality=_number_field(data, 'quality', DEFAULT_QUALITY, minimum=1, maximum=100),
+                   fps=_number_field(data, 'fps') or None,
+                   adaptive=bool(data.get('adaptive', True)),
+                   tick_interval=tick_interval)
+
+    def wants(self, stream):
+        return self.streams is None or stream in self.streams
+
+    def due(self, stream, now):
+        """True se o stream é assinado e já passou o intervalo do FPS pedido"""
+        if not self.wants(stream):
+            return False
+        if not self.fps:
+            return True
+        # Folga de 10% para o jitter do loop não pular frames
+        return now - self.last_sent.get(stream, float('-inf')) >= 0.9 / self.fps
+
+    def variant(self, stream):
+        return (stream, self.width, self.quality)
+
+    def mark_sent(self, stream, now):
+        self.last_sent[stream] = now
+
+    def frame_budget(self):
+        """Tempo de envio aceitável por frame: metade do intervalo entre frames"""
+        interval = max(1.0 / self.fps, self.tick_interval) if self.fps else self.tick_interval
+        return 0.5 * interval
+
+    def adapt(self, send_latency, dropped_frames, now):
+        """Ajusta a qualidade pela latência de envio e pelos descartes do cliente"""
+        self.send_latency += 0.3 * (send_latency - self.send_latency)
+        dropped = dropped_frames - self._dropped
+        if not self.adaptive or now - self._last_adapt < self.adapt_interval:
+            return
+        self._last_adapt = now
+        self._dropped = dropped_frames
+        budget = self.frame_budget()
+        if dropped > 0 or self.send_latency > budget:
+            self.quality = max(MIN_QUALITY, self.quality - 2 * QUALITY_STEP)
+        elif self.send_latency < budget / 2:
+            self.quality = min(self.max_quality, self.quality + QUALITY_STEP)
+
+    def to_dict(self):
+        return {
+            'streams': sorted(self.streams) if self.streams is not None else None,
+            'width': self.width,
+            'quality': self.quality,
+            'max_quality': self.max_quality,
+            'fps': self.fps,
+            'adaptive': self.adaptive,
+            'send_latency_ms': round(self.send_latency * 1000, 2),
+        }
+
+
+def plan_video(subscriptions, streams, now):
+    """Variantes a codificar neste tick e as que cada cliente recebe
+
+    subscriptions: {cliente: VideoSubscription}; streams: streams com imagem
+    neste tick. Retorna (conjunto de variantes, {cliente: tupla de variantes}).
+    """
+    variants = set()
+    chosen = {}
+    for client, subscription in subscriptions.items():
+        picked = tuple(subscription.variant(stream) for stream in streams
+                       if subscription.due(stream, now))
+        chosen[client] = picked
+        variants.update(picked)
+    return variants, chosen
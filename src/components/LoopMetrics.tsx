@@ -0,0 +1,102 @@
+import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
+import { Badge } from "@/components/ui/badge";
+import { Activity } from "lucide-react";
+
+interface StageMetrics {
+  last_ms: number;
+  p50_ms: number;
+  p90_ms: number;
+  p99_ms: number;
+  count: number;
+}
+
+interface ClientMetrics {
+  client: string;
+  queue_depth: number;
+  dropped_frames: number;
+  send_latency_ms: number;
+}
+
+export interface LoopMetricsData {
+  stages: Record<string, StageMetrics>;
+  counters: Record<string, number>;
+  loop_budget_ms: number;
+  clients?: ClientMetrics[];
+}
+
+interface LoopMetricsProps {
+  metrics?: LoopMetricsData;
+}
+
+// Ordem de exibição das etapas do sensor_loop
+const STAGE_LABELS: Record<string, string> = {
+  loop: "Loop total",
+  capture_age: "Idade do frame",
+  perception: "Percepção",
+  inference: "Inferência YOLO",
+  detection_age: "Idade da detecção",
+  tracking: "Tracking",
+  annotate: "Anotação",
+  obstacles: "Obstáculos",
+  mapping: "Mapa de ocupação",
+  fusion: "Fusão de sensores",
+  reconstruction: "Nuvem de voxels",
+  point_cloud: "Envio da nuvem",
+  encode: "JPEG",
+  broadcast: "Broadcast",
+  send: "Envio",
+};
+
+export const LoopMetrics = ({ metrics }: LoopMetricsProps) => {
+  if (!metrics) return null;
+
+  const loop = metrics.stages.loop;
+  const overruns = metrics.counters.loop_budget_overruns || 0;
+  const degraded = loop ? loop.p99_ms > metrics.loop_budget_ms : false;
+
+  return (
+    <Card>
+      <CardHeader>
+        <CardTitle className="flex items-center justify-between text-lg">
+          <span className="flex items-center gap-2">
+            <Activity className="h-5 w-5" />
+            Desempenho do Loop
+          </span>
+          <Badge variant={degraded ? "destructive" : "default"}>
+            {degraded ? "DEGRADADO" : "OK"}
+          </Badge>
+        </CardTitle>
+      </CardHeader>
+      <CardContent>
+        <div className="space-y-2 text-sm">
+          <div className="flex items-center justify-between p-2 bg-muted rounded-lg">
+            <span className="font-medium">Orçamento estourado</span>
+            <span className="font-mono">{overruns}x (orçamento {metrics.loop_budget_ms} ms)</span>
+          </div>
+          {Object.entries(STAGE_LABELS)
+            .filter(([stage]) => metrics.stages[stage])
+            .map(([stage, label]) => (
+              <div key={stage} className="flex items-center justify-between px-2">
+                <span className="text-muted-foreground">{label}</span>
+                <span className="font-mono">
+                  p50 {metrics.stages[stage].p50_ms.toFixed(1)} · p99 {metrics.stages[stage].p99_ms.toFixed(1)} ms
+                </span>
+              </div>
+            ))}
+          {metrics.clients && metrics.clients.length > 0 && (
+            <div className="pt-2 border-t space-y-1">
+              {metrics.clients.map((client) => (
+                <div key={client.client} className="flex items-center justify-between px-2">
+                  <span className="text-muted-foreground">{client.client}</span>
+                  <span className="font-mono">
+                    fila {client.queue_depth} · descartados {client.dropped_frames} · {client.send_latency_ms} ms
+                  </span>
+                </div>
+              ))}
+            </div>
+          )}
+        </div>
+      </CardContent>
+    </Card>
+  );
+};
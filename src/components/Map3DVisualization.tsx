@@ -1,26 +1,41 @@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
+import { Button } from "@/components/ui/button";
 import { useEffect, useRef } from "react";
+import type { DecodedPointCloud } from "@/lib/pointCloud";
 
-interface Point3D {
-  points: number[][];
-  colors: number[][];
+// Nuvem de voxels decodificada do canal binário 'point_cloud'
+export type PointCloudData = DecodedPointCloud;
+
+// Mapa de ocupação enviado pelo servidor (mensagem 'occupancy_grid')
+export interface OccupancyGridData {
+  resolution: number;
+  size: number;
+  pose: { x: number; y: number; theta: number };
+  cells: number[][]; // [x, y, altura] em metros, referencial do mapa
 }
 
 interface Map3DVisualizationProps {
-  pointCloud?: Point3D;
+  pointCloud?: PointCloudData;
+  occupancy?: OccupancyGridData;
+  onResetMap?: () => void;
 }
 
-const Map3DVisualization = ({ pointCloud }: Map3DVisualizationProps) => {
+const Map3DVisualization = ({ pointCloud, occupancy, onResetMap }: Map3DVisualizationProps) => {
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const animationRef = useRef<number>();
   const rotationRef = useRef({ x: 0, y: 0 });
-  const pointCloudRef = useRef<Point3D | undefined>(pointCloud);
+  const pointCloudRef = useRef<PointCloudData | undefined>(pointCloud);
+  const occupancyRef = useRef<OccupancyGridData | undefined>(occupancy);
 
   // Atualiza referência quando pointCloud mudar
   useEffect(() => {
     pointCloudRef.current = pointCloud;
   }, [pointCloud]);
 
+  useEffect(() => {
+    occupancyRef.current = occupancy;
+  }, [occupancy]);
+
   useEffect(() => {
     if (!canvasRef.current) return;
 
@@ -54,45 +69,69 @@ const Map3DVisualization = ({ pointCloud }: Map3DVisualizationProps) => {
         ctx.stroke();
       }
 
-      // Desenha pontos 3D
+      const cosX = Math.cos(rotationRef.current.x);
+      const sinX = Math.sin(rotationRef.current.x);
+      const cosY = Math.cos(rotationRef.current.y);
+      const sinY = Math.sin(rotationRef.current.y);
+      const project = (x: number, y: number, z: number) => {
+        const y1 = y * cosX - z * sinX;
+        const z1 = y * sinX + z * cosX;
+        const x1 = x * cosY + z1 * sinY;
+        const z2 = -x * sinY + z1 * cosY;
+        const perspective = 400 / (400 + z2);
+        return {
+          x: width / 2 + x1 * scale * perspective,
+          y: height / 2 - y1 * scale * perspective,
+          perspective,
+        };
+      };
+
+      // Mapa de ocupação: células no chão, centradas no robô (frente = profundidade)
+      const grid = occupancyRef.current;
+      if (grid && grid.cells.length > 0) {
+        const { x: rx, y: ry, theta } = grid.pose;
+        const cosT = Math.cos(-theta);
+        const sinT = Math.sin(-theta);
+        grid.cells.forEach(([cx, cy, h]) => {
+          const dx = cx - rx;
+          const dy = cy - ry;
+          const forward = dx * cosT - dy * sinT;
+          const left = dx * sinT + dy * cosT;
+          const p = project(-left, 0, forward);
+          const hue = Math.max(0, 120 - Math.min(h, 1.5) * 80);
+          ctx.fillStyle = `hsl(${hue}, 80%, 50%)`;
+          const size = Math.max(1, grid.resolution * scale * p.perspective);
+          ctx.fillRect(p.x - size / 2, p.y - size / 2, size, size);
+        });
+
+        // Robô na origem
+        const robot = project(0, 0, 0);
+        ctx.fillStyle = 'hsl(var(--primary))';
+        ctx.beginPath();
+        ctx.arc(robot.x, robot.y, 6, 0, Math.PI * 2);
+        ctx.fill();
+      }
+
+      // Desenha pontos 3D (referencial do mapa -> centrado no robô)
       const currentCloud = pointCloudRef.current;
       if (currentCloud && currentCloud.points && currentCloud.points.length > 0) {
-        const centerX = width / 2;
-        const centerY = height / 2;
-
-        // Ordena pontos por profundidade (z) para melhor visualização
-        const sortedPoints = currentCloud.points.map((point, i) => ({
-          point,
-          color: currentCloud.colors[i],
-          z: point[2]
-        })).sort((a, b) => b.z - a.z);
-
-        sortedPoints.forEach(({ point, color }) => {
-          const [x, y, z] = point;
-
-          // Rotação simples
-          const cosX = Math.cos(rotationRef.current.x);
-          const sinX = Math.sin(rotationRef.current.x);
-          const cosY = Math.cos(rotationRef.current.y);
-          const sinY = Math.sin(rotationRef.current.y);
-
-          // Aplica rotação
-          const y1 = y * cosX - z * sinX;
-          const z1 = y * sinX + z * cosX;
-          const x1 = x * cosY + z1 * sinY;
-          const z2 = -x * sinY + z1 * cosY;
-
-          // Projeção perspectiva
-          const perspective = 400 / (400 + z2);
-          const screenX = centerX + x1 * scale * perspective;
-          const screenY = centerY - y1 * scale * perspective;
-
-          // Desenha ponto
-          const size = Math.max(1, 3 * perspective);
-          ctx.fillStyle = `rgb(${color[0] * 255}, ${color[1] * 255}, ${color[2] * 255})`;
-          ctx.beginPath();
-          ctx.arc(screenX, screenY, size, 0, Math.PI * 2);
-          ctx.fill();
+        const { x: rx, y: ry, theta } = currentCloud.pose;
+        const cosT = Math.cos(-theta);
+        const sinT = Math.sin(-theta);
+
+        // Ordena por profundidade para desenhar os mais distantes primeiro
+        const projected = currentCloud.points.map(([px, py, pz], i) => {
+          const dx = px - rx;
+          const dy = py - ry;
+          const forward = dx * cosT - dy * sinT;
+          const left = dx * sinT + dy * cosT;
+          return { p: project(-left, pz, forward), color: currentCloud.colors[i] };
+        }).sort((a, b) => a.p.perspective - b.p.perspective);
+
+        projected.forEach(({ p, color }) => {
+          const size = Math.max(1, 2 * p.perspective);
+          ctx.fillStyle = `rgb(${color[0]}, ${color[1]}, ${color[2]})`;
+          ctx.fillRect(p.x - size / 2, p.y - size / 2, size, size);
         });
       }
 
@@ -157,9 +196,16 @@ const Map3DVisualization = ({ pointCloud }: Map3DVisualizationProps) => {
   return (
     <Card>
       <CardHeader>
-        <CardTitle>Reconstrução 3D do Ambiente</CardTitle>
+        <CardTitle className="flex items-center justify-between">
+          Reconstrução 3D do Ambiente
+          {onResetMap && (
+            <Button variant="outline" size="sm" onClick={onResetMap}>
+              Limpar mapa
+            </Button>
+          )}
+        </CardTitle>
         <CardDescription>
-          Mapa 3D gerado em tempo real pelo LiDAR (arraste para rotacionar)
+          Mapa 3D gerado em tempo real pelas câmeras de profundidade (arraste para rotacionar)
         </CardDescription>
       </CardHeader>
       <CardContent>
@@ -169,7 +215,17 @@ const Map3DVisualization = ({ pointCloud }: Map3DVisualizationProps) => {
           height={400}
           className="w-full border border-border rounded-lg bg-background cursor-move"
         />
-        {!pointCloud && (
+        {occupancy && (
+          <p className="mt-2 text-xs text-muted-foreground">
+            {occupancy.cells.length} células ocupadas · pose ({occupancy.pose.x.toFixed(2)}, {occupancy.pose.y.toFixed(2)}) m
+          </p>
+        )}
+        {pointCloud && (
+          <p className="text-xs text-muted-foreground">
+            {pointCloud.points.length} pontos da nuvem de voxels
+          </p>
+        )}
+        {!pointCloud && !occupancy && (
           <div className="absolute inset-0 flex items-center justify-center">
             <p className="text-muted-foreground">Aguardando dados de reconstrução 3D...</p>
           </div>
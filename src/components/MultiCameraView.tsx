@@ -4,8 +4,8 @@ import { Switch } from "@/components/ui/switch";
 import { Label } from "@/components/ui/label";
 
 interface MultiCameraViewProps {
-  lidarImage?: string;
-  d435Image?: string;
+  lidarImage?: string; // URL da imagem (Blob URL ou data URL)
+  d435Image?: string; // URL da imagem (Blob URL ou data URL)
   trackedObjects?: any[];
   trackingMode?: string;
   yoloEnabled?: boolean;
@@ -66,7 +66,7 @@ export const MultiCameraView = ({
             {lidarImage ? (
               <div className="relative w-full aspect-video bg-black rounded-lg overflow-hidden">
                 <img
-                  src={`data:image/jpeg;base64,${lidarImage}`}
+                  src={lidarImage}
                   alt="LiDAR L515 Feed"
                   className="w-full h-full object-contain"
                 />
@@ -93,7 +93,7 @@ export const MultiCameraView = ({
             {d435Image ? (
               <div className="relative w-full aspect-video bg-black rounded-lg overflow-hidden">
                 <img
-                  src={`data:image/jpeg;base64,${d435Image}`}
+                  src={d435Image}
                   alt="D435 Camera Feed"
                   className="w-full h-full object-contain"
                 />
@@ -133,11 +133,17 @@ export const MultiCameraView = ({
                   </div>
                   <div className="flex items-center gap-3 text-xs text-muted-foreground">
                     {obj.depth && (
-                      <span>Dist: {obj.depth.toFixed(2)}m</span>
+                      <span>
+                        Dist: {obj.depth.toFixed(2)}m
+                        {obj.depth_confidence !== undefined && ` (${(obj.depth_confidence * 100).toFixed(0)}%)`}
+                      </span>
                     )}
                     {obj.confidence && (
                       <span>Conf: {(obj.confidence * 100).toFixed(0)}%</span>
                     )}
+                    {obj.motion && (
+                      <span>{obj.motion.speed.toFixed(0)} px/s · {obj.motion.dwell_time.toFixed(0)}s</span>
+                    )}
                   </div>
                 </div>
               ))}
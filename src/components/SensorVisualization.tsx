@@ -31,7 +31,7 @@ interface TrackedObject {
 }
 
 interface SensorVisualizationProps {
-  cameraImage?: string;
+  cameraImage?: string; // URL da imagem (Blob URL ou data URL)
   groundObstacles?: ObstacleData;
   heightObstacles?: ObstacleData;
   trackedObjects?: TrackedObject[];
@@ -79,7 +79,7 @@ export const SensorVisualization = ({ cameraImage, groundObstacles, heightObstac
           {cameraImage ? (
             <>
               <img 
-                src={`data:image/jpeg;base64,${cameraImage}`} 
+                src={cameraImage} 
                 alt="Camera feed"
                 className="w-full h-full object-cover"
               />
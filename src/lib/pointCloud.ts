@@ -0,0 +1,91 @@
+// Decodificador do canal binário 'point_cloud' (formato 'pc16', ver robot_pointcloud.py)
+//   int16[count * 3]  XYZ: ponto = origin + xyz * scale
+//   uint16[count]     RGB565 (se header.color)
+//   uint32[removed]   índices do keyframe removidos (só em deltas)
+
+export interface PointCloudHeader {
+  keyframe: boolean;
+  keyframe_id: number;
+  origin: number[];
+  scale: number;
+  count: number;
+  removed: number;
+  color: boolean;
+  pose?: { x: number; y: number; theta: number };
+}
+
+export interface DecodedPointCloud {
+  pose: { x: number; y: number; theta: number };
+  points: number[][]; // [x, y, z] em metros, referencial do mapa
+  colors: number[][]; // RGB 0..255
+}
+
+interface Keyframe {
+  id: number;
+  points: number[][];
+  colors: number[][];
+}
+
+const DEFAULT_COLOR = [160, 160, 160];
+
+const readPoints = (header: PointCloudHeader, buffer: ArrayBuffer) => {
+  const view = new DataView(buffer);
+  const points: number[][] = [];
+  const colors: number[][] = [];
+  const [ox, oy, oz] = header.origin;
+  for (let i = 0; i < header.count; i++) {
+    const offset = i * 6;
+    points.push([
+      ox + view.getInt16(offset, true) * header.scale,
+      oy + view.getInt16(offset + 2, true) * header.scale,
+      oz + view.getInt16(offset + 4, true) * header.scale,
+    ]);
+  }
+  let offset = header.count * 6;
+  for (let i = 0; i < header.count; i++) {
+    if (header.color) {
+      const c = view.getUint16(offset + i * 2, true);
+      colors.push([((c >> 11) & 31) * 255 / 31, ((c >> 5) & 63) * 255 / 63, (c & 31) * 255 / 31]);
+    } else {
+      colors.push(DEFAULT_COLOR);
+    }
+  }
+  if (header.color) offset += header.count * 2;
+  const removed = new Set<number>();
+  for (let i = 0; i < header.removed; i++) {
+    removed.add(view.getUint32(offset + i * 4, true));
+  }
+  return { points, colors, removed };
+};
+
+// Mantém o último keyframe e aplica os deltas recebidos sobre ele
+export class PointCloudDecoder {
+  private keyframe?: Keyframe;
+
+  reset() {
+    this.keyframe = undefined;
+  }
+
+  decode(header: PointCloudHeader, buffer: ArrayBuffer): DecodedPointCloud | undefined {
+    const { points, colors, removed } = readPoints(header, buffer);
+    const pose = header.pose ?? { x: 0, y: 0, theta: 0 };
+
+    if (header.keyframe) {
+      this.keyframe = { id: header.keyframe_id, points, colors };
+      return { pose, points, colors };
+    }
+
+    // Delta de um keyframe que não recebemos: aguarda o próximo
+    if (!this.keyframe || this.keyframe.id !== header.keyframe_id) return undefined;
+
+    const keptPoints: number[][] = [];
+    const keptColors: number[][] = [];
+    this.keyframe.points.forEach((point, i) => {
+      if (!removed.has(i)) {
+        keptPoints.push(point);
+        keptColors.push(this.keyframe!.colors[i]);
+      }
+    });
+    return { pose, points: keptPoints.concat(points), colors: keptColors.concat(colors) };
+  }
+}
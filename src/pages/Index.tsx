@@ -8,6 +8,9 @@ import { CameraStatus } from "@/components/CameraStatus";
 import { AutonomousControl } from "@/components/AutonomousControl";
 import { SerialConnectionControl } from "@/components/SerialConnectionControl";
 import { ArduinoTroubleshooting } from "@/components/ArduinoTroubleshooting";
+import { LoopMetrics, LoopMetricsData } from "@/components/LoopMetrics";
+import Map3DVisualization, { OccupancyGridData, PointCloudData } from "@/components/Map3DVisualization";
+import { PointCloudDecoder, type PointCloudHeader } from "@/lib/pointCloud";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { useToast } from "@/hooks/use-toast";
 
@@ -29,7 +32,17 @@ const Index = () => {
   const [yoloEnabled, setYoloEnabled] = useState(false);
   const [navigationStatus, setNavigationStatus] = useState<any>();
   const [availablePorts, setAvailablePorts] = useState<string[]>([]);
+  const [loopMetrics, setLoopMetrics] = useState<LoopMetricsData>();
+  const [occupancyGrid, setOccupancyGrid] = useState<OccupancyGridData>();
+  const [pointCloud, setPointCloud] = useState<PointCloudData>();
   const wsRef = useRef<WebSocket | null>(null);
+  // Descritores dos frames binários anunciados no último cabeçalho JSON
+  const pendingFramesRef = useRef<{ stream: string; format: string; size: number; header?: PointCloudHeader }[]>([]);
+  // Keyframe atual da nuvem 3D; decodificação encadeada para manter a ordem keyframe -> deltas
+  const pointCloudDecoderRef = useRef(new PointCloudDecoder());
+  const pointCloudChainRef = useRef<Promise<void>>(Promise.resolve());
+  // Blob URLs atuais por stream (revogados ao serem substituídos)
+  const frameUrlsRef = useRef<Record<string, string>>({});
   const { toast } = useToast();
 
   // WebSocket connection
@@ -37,9 +50,30 @@ const Index = () => {
     const connectWebSocket = () => {
       console.log('🌐 Tentando conectar ao servidor Python em ws://localhost:8765');
       const ws = new WebSocket('ws://localhost:8765');
+      ws.binaryType = 'blob';
+      
+      const setStreamImage = (stream: string, url: string) => {
+        if (stream === 'camera') {
+          setCameraImage(url);
+          setD435Image(url); // D435 principal
+          setD435Online(true);
+        } else if (stream === 'l515') {
+          setLidarImage(url);
+          setLidarOnline(true);
+        } else if (stream === 'd435') {
+          setD435Image(url);
+          setD435Online(true);
+        }
+      };
       
       ws.onopen = () => {
         console.log('✓✓✓ CONECTADO ao servidor Python com sucesso!');
+        // Recebe JPEG em frames binários em vez de base64 dentro do JSON
+        ws.send(JSON.stringify({ type: 'set_frame_transport', mode: 'binary' }));
+        // Vídeo das três câmeras no tamanho original; a qualidade se adapta à latência do envio
+        ws.send(JSON.stringify({ type: 'subscribe', streams: ['camera', 'l515', 'd435'], quality: 85, fps: 10 }));
+        pendingFramesRef.current = [];
+        pointCloudDecoderRef.current.reset();
         setIsConnected(true);
         toast({
           title: "Conectado",
@@ -48,28 +82,49 @@ const Index = () => {
       };
       
       ws.onmessage = (event) => {
+        // Frame binário: bytes JPEG do próximo stream anunciado no cabeçalho
+        if (typeof event.data !== 'string') {
+          const descriptor = pendingFramesRef.current.shift();
+          if (!descriptor) return;
+          if (descriptor.format === 'pc16' && descriptor.header) {
+            const header = descriptor.header;
+            const blob = event.data as Blob;
+            pointCloudChainRef.current = pointCloudChainRef.current
+              .then(() => blob.arrayBuffer())
+              .then((buffer) => {
+                const cloud = pointCloudDecoderRef.current.decode(header, buffer);
+                if (cloud) setPointCloud(cloud);
+              })
+              .catch((error) => console.error('Erro ao decodificar nuvem de pontos:', error));
+            return;
+          }
+          const url = URL.createObjectURL(new Blob([event.data], { type: 'image/jpeg' }));
+          const previous = frameUrlsRef.current[descriptor.stream];
+          frameUrlsRef.current[descriptor.stream] = url;
+          setStreamImage(descriptor.stream, url);
+          if (previous) URL.revokeObjectURL(previous);
+          return;
+        }
+        
         const data = JSON.parse(event.data);
         console.log('📩 Mensagem recebida do servidor:', data.type);
         
         if (data.type === 'sensor_data') {
-          // Imagens de múltiplas câmeras
-          if (data.camera_image) {
-            setCameraImage(data.camera_image);
-            setD435Image(data.camera_image); // D435 principal
-            setD435Online(true);
-          }
-          if (data.l515_image) {
-            setLidarImage(data.l515_image);
-            setLidarOnline(true);
-          }
-          if (data.d435_image) {
-            setD435Image(data.d435_image);
-            setD435Online(true);
+          // Imagens de múltiplas câmeras: binárias (anunciadas em data.binary) ou base64
+          const binaryStreams = new Set<string>();
+          if (data.binary) {
+            pendingFramesRef.current = [...data.binary];
+            data.binary.forEach((frame: { stream: string }) => binaryStreams.add(frame.stream));
           }
+          ['camera', 'l515', 'd435'].forEach((stream) => {
+            const image = data[`${stream}_image`];
+            if (image) setStreamImage(stream, `data:image/jpeg;base64,${image}`);
+          });
+          const hasStream = (stream: string) => binaryStreams.has(stream) || !!data[`${stream}_image`];
           
           // Atualiza status das câmeras baseado nas imagens recebidas
-          if (!data.l515_image) setLidarOnline(false);
-          if (!data.d435_image && !data.camera_image) setD435Online(false);
+          if (!hasStream('l515')) setLidarOnline(false);
+          if (!hasStream('d435') && !hasStream('camera')) setD435Online(false);
           
           // Dados de obstáculos
           if (data.ground_obstacles) {
@@ -91,6 +146,16 @@ const Index = () => {
           if (data.navigation_status) {
             setNavigationStatus(data.navigation_status);
           }
+        } else if (data.type === 'metrics') {
+          setLoopMetrics(data);
+        } else if (data.type === 'occupancy_grid') {
+          setOccupancyGrid(data);
+        } else if (data.type === 'point_cloud') {
+          // Cabeçalho 'pc16': o frame binário seguinte traz os pontos
+          pendingFramesRef.current = data.binary.map((frame: { stream: string; format: string; size: number }) => ({
+            ...frame,
+            header: data,
+          }));
         } else if (data.type === 'ports_list') {
           console.log('✅ Lista de portas recebida:', data.ports);
           setAvailablePorts(data.ports || []);
@@ -153,6 +218,8 @@ const Index = () => {
       if (wsRef.current) {
         wsRef.current.close();
       }
+      Object.values(frameUrlsRef.current).forEach((url) => URL.revokeObjectURL(url));
+      frameUrlsRef.current = {};
     };
   }, [toast]);
 
@@ -318,6 +385,9 @@ const Index = () => {
           onToggleYolo={handleToggleYolo}
         />
 
+        {/* Latência por etapa do loop de sensores */}
+        <LoopMetrics metrics={loopMetrics} />
+
         {/* Visualização de Sensores (versão simplificada) */}
         <SensorVisualization
           cameraImage={cameraImage || d435Image}
@@ -325,6 +395,13 @@ const Index = () => {
           heightObstacles={heightObstacles}
           trackedObjects={trackedObjects}
         />
+
+        {/* Mapa de ocupação / reconstrução 3D */}
+        <Map3DVisualization
+          occupancy={occupancyGrid}
+          pointCloud={pointCloud}
+          onResetMap={() => wsRef.current?.send(JSON.stringify({ type: 'reset_map' }))}
+        />
       </div>
 
       <Tabs defaultValue="directional" className="w-full">
@@ -19,6 +19,8 @@ const TabletStatus = () => {
 
       ws.onopen = () => {
         console.log('Tablet: WebSocket conectado');
+        // O tablet só mostra o status: não recebe vídeo
+        ws.send(JSON.stringify({ type: 'subscribe', streams: [] }));
         setStatus('stopped');
       };
 
@@ -0,0 +1,145 @@
+"""
+Testes de robot_video (sem hardware): pool de codificação JPEG, plano de
+variantes por assinatura e adaptação de qualidade
+    python -m pytest -q test_robot_video.py
+"""
+
+import asyncio
+import numpy as np
+import pytest
+
+from robot_broadcast import ClientOutbox
+from robot_video import EncoderPool, MIN_QUALITY, QUALITY_STEP, VideoSubscription, plan_video
+
+
+def _image(width=640, height=480, seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+def test_encoder_pool_encodes_every_group_of_the_tick():
+    # Mais grupos (stream, largura) que workers: nenhum job do próprio tick é cancelado
+    images = {'l515': _image(seed=1), 'd435': _image(seed=2)}
+    variants = [(stream, width, 70) for stream in images for width in (None, 320, 160)]
+    pool = EncoderPool(workers=1)
+    try:
+        encoded = asyncio.run(pool.encode(images, variants))
+    finally:
+        pool.close()
+    assert set(encoded) == set(variants)
+    assert all(data[:2] == b'\xff\xd8' for data in encoded.values())
+    assert pool.dropped == 0
+
+
+def test_encoder_pool_drops_only_stale_jobs():
+    big = {name: _image(2048, 1536, seed) for seed, name in enumerate('abcd')}
+    pool = EncoderPool(workers=1)
+
+    async def run():
+        # Timeout curto: sobram jobs na fila, cancelados no início da chamada seguinte
+        first = await pool.encode(big, [(name, None, 90) for name in big], timeout=0.001)
+        second = await pool.encode({'x': _image(seed=9)}, [('x', 160, 60)])
+        return first, second
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        pool.close()
+    assert len(first) < 4 and pool.late >= 1
+    # Um worker: o job em execução não é cancelado nem contado, os da fila sim
+    assert 1 <= pool.dropped <= 3
+    assert set(second) == {('x', 160, 60)}
+
+
+def test_plan_video_shares_variants_between_clients():
+    subscriptions = {
+        'a': VideoSubscription(width=320, quality=70),
+        'b': VideoSubscription(width=320, quality=70),
+        'c': VideoSubscription(streams=['d435'], quality=70),
+    }
+    variants, chosen = plan_video(subscriptions, ['l515', 'd435'], now=0.0)
+    # a e b pedem o mesmo: uma variante por stream, codificada uma vez
+    assert chosen['a'] == chosen['b'] == (('l515', 320, 70), ('d435', 320, 70))
+    assert chosen['c'] == (('d435', None, 70),)
+    assert variants == {('l515', 320, 70), ('d435', 320, 70), ('d435', None, 70)}
+
+
+def test_plan_video_respects_fps():
+    subscription = VideoSubscription(streams=['camera'], fps=5, tick_interval=0.1)
+    sent = []
+    for tick in range(10):
+        now = tick * 0.1
+        _, chosen = plan_video({'a': subscription}, ['camera'], now)
+        if chosen['a']:
+            subscription.mark_sent('camera', now)
+            sent.append(tick)
+    # 5 FPS num loop de 10 Hz: um tick sim, um não
+    assert sent == [0, 2, 4, 6, 8]
+    # Stream não assinado nunca entra no plano
+    assert plan_video({'a': subscription}, ['d435'], 10.0)[1]['a'] == ()
+
+
+def test_adapt_steps_quality_down_on_drops_and_back_up():
+    subscription = VideoSubscription(quality=80, tick_interval=0.1)
+    subscription.adapt(send_latency=0.001, dropped_frames=0, now=1.0)
+    assert subscription.quality == 80  # já no máximo pedido
+
+    subscription.adapt(send_latency=0.001, dropped_frames=3, now=2.0)
+    assert subscription.quality == 80 - 2 * QUALITY_STEP
+    # Dentro do intervalo de adaptação nada muda, mesmo com novos descartes
+    subscription.adapt(send_latency=0.001, dropped_frames=6, now=2.5)
+    assert subscription.quality == 80 - 2 * QUALITY_STEP
+    # Descartes acumulados desde o último ajuste contam no próximo
+    subscription.adapt(send_latency=0.001, dropped_frames=6, now=3.0)
+    assert subscription.quality == 80 - 4 * QUALITY_STEP
+
+    # Sem descartes e com folga: sobe um degrau por ajuste até o máximo pedido
+    subscription.adapt(send_latency=0.001, dropped_frames=6, now=4.0)
+    assert subscription.quality == 80 - 3 * QUALITY_STEP
+    for second in range(5, 10):
+        subscription.adapt(send_latency=0.001, dropped_frames=6, now=float(second))
+    assert subscription.quality == 80
+
+    for second in range(10, 30):
+        subscription.adapt(send_latency=0.001, dropped_frames=second, now=float(second))
+    assert subscription.quality == MIN_QUALITY
+
+
+def test_non_video_drops_and_slow_sends_keep_quality():
+    class Socket:
+        async def send(self, payload):
+            # Snapshot de mapa grande: envio lento
+            await asyncio.sleep(0.08 if payload == 'map' else 0)
+
+    async def run():
+        outbox = ClientOutbox(Socket())
+        outbox.video = VideoSubscription(quality=80, tick_interval=0.1)
+        outbox.start()
+        for _ in range(3):
+            outbox.push_frame(['map'], channel='map')  # 2 substituídos no slot
+        outbox.push_frame(['video'], channel='sensor')
+        await asyncio.sleep(0.2)
+        await outbox.stop()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert outbox.dropped_frames == 2 and outbox.channel_stats('map')[1] == 2
+    outbox.video.adapt(*outbox.channel_stats('sensor'), now=1.0)
+    assert outbox.video.quality == 80
+    # Com os totais do cliente (todos os canais) a qualidade cairia
+    overall = VideoSubscription(quality=80, tick_interval=0.1)
+    overall.adapt(outbox.last_send_latency, outbox.dropped_frames, now=1.0)
+    assert overall.quality < 80
+
+
+def test_subscription_from_message_validates_fields():
+    subscription = VideoSubscription.from_message(
+        {'streams': ['D435'], 'width': '320', 'quality': 72, 'fps': 0})
+    assert subscription.streams == {'d435'}
+    assert subscription.width == 320
+    assert subscription.quality == 70
+    assert subscription.fps is None
+
+    for bad in ({'width': 'auto'}, {'width': 320.5}, {'width': -1}, {'fps': 'fast'},
+                {'fps': float('nan')}, {'quality': 0}, {'quality': True}, {'streams': 5}):
+        with pytest.raises(ValueError):
+            VideoSubscription.from_message(bad)